@@ -25,6 +25,10 @@ Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
 Applied Physics Laboratory, University of Washington
 Seattle, WA  USA
 ---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: Added INVARS, the (empty) list of input variables read by model().
+Python 3 print() in the __main__ block.
 1/18/2010
 """
 
@@ -36,6 +40,10 @@ from numpy import sqrt, exp, log
 from gncfg import *
 from gncore import ExportVar
 
+# Input variables (IN keys) read by model(); it only reads OUT variables
+# from the DIN, DON, PN, DIP, DOP, PP and DSi sub-models.
+INVARS = ()
+
 
 def model():
     """ Calculate ICEP, Gilles Billen's and Josette Garnier's
@@ -65,5 +73,6 @@ def model():
 
 if __name__ == '__main__':
     # main() or this script file can't be called directly
-    print "Error: allformmodel.py can't be run directly. Use globalnews.py instead"
+    import sys
+    print("Error: allformmodel.py can't be run directly. Use globalnews.py instead")
     sys.exit()
@@ -24,6 +24,70 @@ Seattle, WA  USA
 ---------------------------------------
 RECENT MODIFICATION HISTORY
 
+10/18/2026: --graph also lists, for each output variable, the shared intermediates used by
+ the model step that exported it and their IN/OUT variables (gngraph.describe_outputs()).
+10/18/2026: --sweep runs write each output table as one stacked npz archive per chunk of
+ samples, whatever its format; the --sweep-tables option writes one table per sample
+ instead, for sweeps of up to SweepSampleTbls samples (gncfg.py).
+10/18/2026: --incremental float32 runs reuse the unchanged float64 reference units from the
+ run-state store (run_reference()). --incremental and --no-cache are rejected with entry
+ points other than model runs.
+10/18/2026: runsensitivity() checks the sensitivity.cfg outvars with one run at the base
+ factor values, before sampling.
+10/18/2026: A run cache hit also writes the cached accuracy report of a reduced precision
+ run. --incremental and --graph runs do not use the run cache.
+10/18/2026: rungis2tbls() uses the ArcGIS zonal statistics (gngis2tbls.CalcBasinStatsArcGIS())
+ only if a grid is not in a gnraster.py format (eg, ArcInfo grids).
+10/18/2026: rungis2tbls() computes the zonal statistics in memory with numpy
+ (gngis2tbls.CalcBasinStats(), gnraster.py), without ArcGIS.
+10/18/2026: Added the whole-run result cache (run_cache_key()): a model run whose
+ configuration, input column contents and model code match a cached run writes the
+ cached outputs without running the sub-models. --no-cache bypasses it.
+10/18/2026: Added the --incremental option (run_submodels_incremental()): only the
+ nutrient form units whose input columns, constants or code changed are recomputed,
+ the others are reloaded from the run-state store (gnecode/gnstate.py).
+10/18/2026: The dominant source outputs (YS1Max, YS2Max) are int8 codes, with per-form
+ code tables (YS1MAX_LABELS, YS2MAX_LABELS); labels are looked up at write time.
+10/18/2026: Added the --precision option (set_precision()): float32 or float64 IN/OUT
+ arrays. Reduced precision runs write an accuracy report against a float64 reference
+ run on the same inputs (run_reference(), accuracy_report()).
+10/18/2026: Added run_arrays(), an in-memory model run API (arrays in, arrays out,
+ no file access), and Model.set_arrays() / setup_arrays().
+10/18/2026: Added the Model class, a model instance owning its run state (gnrun.py
+ run context), so that several runs can coexist in one process and on threads;
+ main() is now a thin command-line wrapper over it. Added loadmodel().
+10/18/2026: Intermediates shared by the Calc_*() functions (Rnat in m/yr, Agfr,
+ FEriv * FEws, etc) are declared gngraph nodes, computed once per run and freed
+ after their last use (graph_uses(), graph_schedule()). Added the --graph option.
+10/18/2026: Added the -j/--procs option: the nutrient form sub-models run in a pool
+ of processes (run_forms_pool()), with the IN arrays in shared memory.
+10/18/2026: Added the --sensitivity option (runsensitivity()): Sobol or Morris global
+ sensitivity analysis over constants.cfg constants and input variable scalings,
+ configured in sensitivity.cfg, with streaming estimators (gnecode/gnsa.py).
+10/18/2026: Added the --sweep option (runsweep()): calibration constant sweeps over
+ a csv sample file or a [SWEEP] parameter grid, with the swept CCAL constants held
+ as (n_samples, 1) arrays and the samples run in vectorized chunks.
+10/18/2026: Added the -b/--batch option (runbatch()): a manifest of scenarios, each
+ replacing some [IN.TBLS] tables, is run in one vectorized pass over
+ (n_scenarios, n_basins) input arrays. The model code is broadcast-safe: masked
+ assignments are replaced by numpy.where(), source contributions are stacked with
+ numpy.stack(), and the dominant-source labels and LithoChem coefficients are
+ looked up with index arrays.
+10/18/2026: Added the optional [MODELRUN] basins option, a basin selection query on
+the BasinID table attributes (gnecode/gnselect.py), applied in load_var_arrays().
+10/18/2026: [OUT.TBLS] entries accept an optional table format (csv, npz or columnar).
+10/18/2026: write_var_arrays() uses the streaming table writer in gnecode/gntblio.py.
+10/18/2026: Added the --pack-inputs option (runpackinputs()), converting the csv input
+ tables into memory-mapped columnar tables, a new [IN.TBLS] source format.
+10/18/2026: Each sub-model declares the input variables it reads (INVARS_DISSOLVED,
+ INVARS_PARTICULATE, allformmodel.INVARS); runmodel() loads only the input
+ columns and tables needed by the requested nutrient forms.
+10/18/2026: Added the -w/--workers option (input table reading threads).
+10/18/2026: Added the --no-tblcache and --clear-tblcache options for the binary
+ input table cache (gnecode/gntblio.py).
+10/18/2026: load_var_arrays() uses the column-indexed table loader in gnecode/gntblio.py.
+ gne modules are imported through the gnecode search path (as gncore.py and
+ gngis2tbls.py do), so that all modules share the same gncfg global dictionaries.
 1/18/2010: Improved documentation and some run-time messages.
 10/16-24/2008: Added functionality to allow an optional 'All-Forms' model
  after the Global NEWS nutrient form models are completed. This new model
@@ -49,8 +113,14 @@ from numpy import log, exp, log10
 # subfolder, but they may also be placed at the same base folder
 __gne = os.path.join('.', 'gnecode')
 if os.path.exists(__gne): sys.path.insert(0, __gne)
-from gnecode.gncfg import *
-import gnecode.gngis2tbls as gngis2tbls
+from gncfg import *
+import gntblio
+import gnselect
+import gnsa
+import gngraph
+import gnrun
+import gnstate
+import gngis2tbls
 
 __version__ = '$Revision: 2010-01-18$'
 
@@ -78,11 +148,40 @@ def usage():
     print("-g OR --gis         Run GIS pre-processor using gis2tbls.cfg config file.")
     print("-p OR --postproc    Run post-processing: create new loads variables")
     print("                    for selected inputs and outputs, all basins.")
+    print("--pack-inputs       Convert the csv input tables in vars.cfg [IN.TBLS] into")
+    print("                    memory-mapped columnar tables (*.gnecol folders).")
+    print("-w N OR --workers=N Read the input tables concurrently with N threads")
+    print("                    (default: %d; 1 reads them one after another)." % TblReadWorkers)
+    print("-j N OR --procs=N   Run the nutrient form sub-models in a pool of N processes,")
+    print("                    sharing the input arrays (default: %d, serial run). With -g," % ModelProcs)
+    print("                    the zonal statistics variable groups run in N processes.")
+    print("--precision=P       Compute precision of the input and output arrays, float64 or")
+    print("                    float32 (default: %s). float32 model and batch runs also" % ComputePrecision)
+    print("                    write an accuracy report against a float64 run (*_accuracy.csv).")
+    print("--no-cache          Always run the sub-models, bypassing the model run result")
+    print("                    cache (see run_cache_key()). --incremental and --graph runs")
+    print("                    do not use the cache. Model runs only.")
+    print("--incremental       Recompute only the nutrient forms whose inputs, constants or")
+    print("                    model code changed since the previous run (run-state store),")
+    print("                    including the float64 reference of --precision=float32.")
+    print("                    Model runs only (not -g, -p, -b, --sweep or --sensitivity).")
+    print("--graph             Print the shared intermediates graph (gngraph) of the")
+    print("                    requested sub-models, its memoization counts and, for each")
+    print("                    output variable, the intermediates used to compute it.")
+    print("--no-tblcache       Do not use the binary input table cache (parse csv tables).")
+    print("--clear-tblcache    Remove all cached input tables before running.")
+    print("-b FILE OR --batch=FILE  Run the scenarios listed in manifest FILE in one")
+    print("                    vectorized pass, with one output per scenario (see runbatch()).")
+    print("--sweep=FILE        Run the model for each sample of the calibration constants")
+    print("                    in FILE (csv samples or [SWEEP] grid cfg; see runsweep()).")
+    print("                    Outputs are stacked npz archives, one per chunk of samples.")
+    print("--sweep-tables      With --sweep, write one output table per sample instead, in")
+    print("                    the [OUT.TBLS] formats (up to %d samples)." % SweepSampleTbls)
+    print("--sensitivity       Run a Sobol or Morris global sensitivity analysis, as")
+    print("                    configured in sensitivity.cfg (see runsensitivity()).")
 
 
 def main():
-    global FLAGS
-    
     print("\n***** Global NEWS modeling Environment (GNE) *****")
     print("            " + __version__)
     print("            " + localtimestrf())
@@ -93,10 +192,17 @@ def main():
 
     try:
         # hmm, not sure what's fed to args if opts already gets the arg value
-        opts, args = getopt.getopt(sys.argv[1:], "agphv", ["afm", "gis", "postproc", "help"])
+        opts, args = getopt.getopt(sys.argv[1:], "agphvw:b:j:", ["afm", "gis", "postproc", "help", \
+                                   "no-tblcache", "clear-tblcache", "workers=", "procs=", \
+                                   "pack-inputs", "batch=", "sweep=", "sensitivity", "graph", \
+                                   "precision=", "incremental", "no-cache", "sweep-tables"])
         # extract list of just the "options" (arguments), without arg. values
         opt = list(map(itemgetter(0), opts))
-    except getopt.GetoptError:
+        optval = dict(opts)
+        flags = {}
+        flags['TblReadWorkers'] = int(optval.get("-w", optval.get("--workers", TblReadWorkers)))
+        flags['ModelProcs'] = int(optval.get("-j", optval.get("--procs", ModelProcs)))
+    except (getopt.GetoptError, ValueError):
         # print help information, then exit:
         usage()
         sys.exit(2)
@@ -105,20 +211,40 @@ def main():
         usage()
         sys.exit()
 
-    FLAGS['verbose'] = False
-    if "-v" in opt:
-        FLAGS['verbose'] = True
-    
+    flags['verbose'] = "-v" in opt
+    flags['TblCache'] = "--no-tblcache" not in opt
+    flags['ShowGraph'] = "--graph" in opt
+    flags['AllFormModel'] = "-a" in opt or "--afm" in opt
+    flags['Precision'] = optval.get("--precision", ComputePrecision)
+    flags['Incremental'] = "--incremental" in opt
+    flags['RunCache'] = "--no-cache" not in opt
+    flags['SweepTables'] = "--sweep-tables" in opt
+    # --incremental and --no-cache only apply to model runs (runmodel())
+    runopts = [o for o in ("-g", "--gis", "-p", "--postproc", "--pack-inputs", "-b", "--batch", \
+                           "--sweep", "--sensitivity") if o in opt]
+    modelopts = [o for o in ("--incremental", "--no-cache") if o in opt]
+    if runopts and modelopts:
+        print("  !!! Model run option(s) %s not supported with %s !!!\n" \
+              % (" ".join(modelopts), runopts[0]))
+        sys.exit(2)
+    if "--clear-tblcache" in opt:
+        gntblio.clear_cache(FPathTblCache)
+
+    model = Model(flags=flags)
     if "-g" in opt or "--gis" in opt:
-        rungis2tbls()
+        model.rungis2tbls()
     elif "-p" in opt or "--postproc" in opt:
-        runpostproc()
+        model.runpostproc()
+    elif "--pack-inputs" in opt:
+        model.runpackinputs()
+    elif "-b" in opt or "--batch" in opt:
+        model.runbatch(optval.get("-b", optval.get("--batch")))
+    elif "--sweep" in opt:
+        model.runsweep(optval["--sweep"])
+    elif "--sensitivity" in opt:
+        model.runsensitivity()
     else:
-        if "-a" in opt or "--afm" in opt:
-            FLAGS['AllFormModel'] = True
-        else:
-            FLAGS['AllFormModel'] = False
-        runmodel()
+        model.run()
     #elif "-s" in opt or "--smry" in opt:
     #    runsummary() # does not exist yet!
 
@@ -127,6 +253,165 @@ def main():
     print("            %s\n" % localtimestrf())
 
 
+class Model(object):
+    ''' A Global NEWS model instance. It owns its run state (a gnrun.RunContext):
+    flags, configuration, calibration constants (CCAL), inputs (IN) and
+    outputs (OUT), so that several instances can be used side by side in one
+    process, including concurrently on different threads. Every GNE function
+    called through a Model method (or within "with model.active():") uses the
+    instance's dictionaries through the gncfg globals.
+
+    cfgpath is the folder holding the gensetup.cfg, constants.cfg and vars.cfg
+    configuration files (relative table paths in them are relative to the
+    current working directory); flags sets FLAGS keys (see gncfg.py).
+    Use load(), compute() and write() to keep a loaded ("warm") instance and
+    re-run its sub-models, eg, after changing model.CCAL or model.IN arrays.
+    '''
+
+    def __init__(self, cfgpath=fpath_dev, flags=None):
+        self.context = gnrun.RunContext()
+        self.FLAGS.update({'verbose':False, 'AllFormModel':False, 'TblCache':True, \
+                           'TblReadWorkers':TblReadWorkers, 'ModelProcs':ModelProcs, \
+                           'ShowGraph':False, 'Precision':ComputePrecision, 'Incremental':False, \
+                           'RunCache':True, 'SweepTables':False, 'CfgPath':cfgpath})
+        if flags:
+            self.FLAGS.update(flags)
+        self.loaded = False
+
+    # The instance's run state dictionaries
+    FLAGS = property(lambda self: self.context['FLAGS'])
+    CCAL = property(lambda self: self.context['CCAL'])
+    RUN = property(lambda self: self.context['RUN'])
+    IN = property(lambda self: self.context['IN'])
+    OUT = property(lambda self: self.context['OUT'])
+
+    def active(self):
+        ''' Context manager making this instance's run state the active one '''
+        return self.context.active()
+
+    def call(self, func, *args, **kwargs):
+        ''' Call func(*args, **kwargs) with this instance's run state active '''
+        with self.context.active():
+            return func(*args, **kwargs)
+
+    def load(self):
+        ''' Read the model run configurations and load the input arrays '''
+        self.call(loadmodel)
+        self.loaded = True
+
+    def compute(self, quiet=True):
+        ''' Run the sub-models on the loaded inputs (see load()); return OUT '''
+        if not self.loaded:
+            self.load()
+        self.call(run_submodels, quiet)
+        return self.OUT
+
+    def set_arrays(self, inputs, constants, forms, batch=None):
+        ''' Set up the instance from in-memory arrays, instead of load() (no
+        configuration or table files are read); see setup_arrays().
+        '''
+        self.call(setup_arrays, inputs, constants, forms, batch)
+        self.loaded = True
+
+    def write(self):
+        ''' Write the OUT variables to the vars.cfg [OUT.TBLS] output tables '''
+        self.call(write_var_arrays, OUTDOC_TBL, OUTDOC, OUT)
+
+    def run(self):
+        ''' Complete model run, as configured in vars.cfg (see runmodel()) '''
+        self.call(runmodel)
+        self.loaded = True
+
+    def runbatch(self, fname_manifest):
+        self.call(runbatch, fname_manifest)
+
+    def runsweep(self, fname_samples):
+        self.call(runsweep, fname_samples)
+
+    def runsensitivity(self):
+        self.call(runsensitivity)
+
+    def runpackinputs(self):
+        self.call(runpackinputs)
+
+    def rungis2tbls(self):
+        self.call(rungis2tbls)
+
+    def runpostproc(self):
+        self.call(runpostproc)
+
+
+def run_arrays(inputs, constants, forms, allformmodel=False, batch=None, procs=1, \
+               precision=ComputePrecision):
+    ''' Run the model entirely in memory, without reading or writing any file:
+    inputs maps input variable names (IN keys, eg 'Rnat') to basin arrays,
+    constants maps nutrient forms to their calibration constants (as in the
+    constants.cfg [CAL.form] sections), forms lists the nutrient forms to run,
+    and allformmodel=True also runs the 'All-Forms' model, at the compute
+    precision ('float64' or 'float32'). See setup_arrays() for batched
+    (n_batch, n_basins) inputs. Return the dictionary of output
+    arrays (OUT variables, eg 'DINYld'). The dominant source variables (eg,
+    'DINYS2Max') are int8 codes; see YS1MAX_LABELS and YS2MAX_LABELS.
+    Each call uses its own Model instance, so calls may run on several threads.
+    '''
+    model = Model(flags={'AllFormModel':allformmodel, 'ModelProcs':procs, 'Precision':precision})
+    model.set_arrays(inputs, constants, forms, batch)
+
+    return dict(model.compute())
+
+
+def setup_arrays(inputs, constants, forms, batch=None):
+    ''' Populate RUN, CCAL and IN from in-memory arrays (see run_arrays()), in
+    place of the configuration files and input tables. The input variables
+    required by the requested forms (invars_required()) must all be given;
+    BasinID defaults to 0 ... n_basins - 1. If batch (a list of names) is given,
+    inputs may be (n_batch, n_basins) arrays and constants (n_batch, 1) arrays,
+    as in batched runs (see runbatch()).
+    '''
+    forms = list(forms)
+    unknown = [F for F in forms if F not in PARAMETERS]
+    if unknown:
+        print("  !!! Unknown nutrient forms (parameters): %s !!!" % ",".join(unknown))
+        raise KeyError(unknown[0])
+    invars = invars_required(forms, FLAGS['AllFormModel'])
+    missing = sorted(invars.difference(inputs).difference(['BasinID']))
+    if missing:
+        print("  !!! Input arrays missing for the requested forms: %s !!!" % ",".join(missing))
+        raise KeyError(missing[0])
+    nocal = [F for F in forms if F in ('DIN', 'DIP', 'DON', 'DOP', 'DOC') and F not in constants]
+    if nocal:
+        print("  !!! Calibration constants missing for forms: %s !!!" % ",".join(nocal))
+        raise KeyError(nocal[0])
+    if FLAGS['AllFormModel']:
+        noafm = [F for F in ('DIN', 'DON', 'PN', 'DIP', 'DOP', 'PP', 'DSi') if F not in forms]
+        if noafm:
+            print("  !!! The 'All-Forms' model requires the forms: %s !!!" % ",".join(noafm))
+            raise ValueError(noafm[0])
+
+    RUN.clear()
+    RUN['p'] = forms
+    RUN['param_ord'] = [PARAMETERS.index(F) for F in forms]
+    RUN['basins'] = None
+    if batch is not None:
+        RUN['batch'] = list(batch)
+
+    CCAL.clear()
+    for F, ccalf in constants.items():
+        CCAL[F] = dict(ccalf)
+
+    IN.clear()
+    for var in invars.difference(['BasinID']):
+        IN[var] = ny.asarray(inputs[var])
+    if 'BasinID' in inputs:
+        IN['BasinID'] = ny.asarray(inputs['BasinID'])
+    else:
+        IN['BasinID'] = ny.arange(ny.shape(IN['A'])[-1])
+
+    OUT.clear()
+    OUT['BasinID'] = IN['BasinID']
+    set_precision(FLAGS.get('Precision', ComputePrecision))
+
+
 def runmodel():
     ''' Execute a Global NEWS run using pre-processed basin inputs
     as configured in vars.cfg.
@@ -135,6 +420,85 @@ def runmodel():
 
     print("*** Running Global NEWS Model\n")
 
+    loadmodel()
+
+    # Whole-run result cache: a run identical to a cached one just writes its outputs
+    # (and accuracy report). Incremental runs have their own run-state store, and
+    # --graph describes the sub-models as they run: neither uses the cache.
+    precision = FLAGS.get('Precision', ComputePrecision)
+    cachekey = None
+    if FLAGS.get('RunCache') and FPathRunCache is not None and \
+       not FLAGS.get('Incremental') and not FLAGS.get('ShowGraph'):
+        cachekey = run_cache_key()
+        cached = gnstate.run_cache_lookup(FPathRunCache, cachekey)
+        if cached is not None and (precision == 'float64' or cached[2] is not None):
+            print("*** Model results found in the run cache (%s), sub-models not run ***" % cachekey[:16])
+            OUT.update(cached[0])
+            OUTCODES.clear()
+            OUTCODES.update(cached[1])
+            if precision != 'float64':
+                RUN['dtype'] = precision
+                write_accuracy_report(cached[2], OUTDOC_TBL)
+            write_var_arrays(OUTDOC_TBL, OUTDOC, OUT)
+            print("*** Done writing output to files (write_var_arrays()) ***")
+            return
+
+    # Reduced precision runs: first run the sub-models at float64 precision,
+    # as the reference for the accuracy report
+    report = None
+    if precision != 'float64':
+        ref_d = run_reference(FLAGS.get('Incremental'))
+        set_precision(precision)
+
+    if FLAGS.get('Incremental'):
+        statedir, state, writesig = run_submodels_incremental()
+    else:
+        run_submodels()
+
+    if precision != 'float64':
+        report = accuracy_report(OUT, ref_d)
+        write_accuracy_report(report, OUTDOC_TBL)
+
+    if cachekey is not None:
+        gnstate.run_cache_store(FPathRunCache, cachekey, dict(OUT), dict(OUTCODES), \
+                                RunCacheMaxMB, report)
+
+    # The output tables are up to date if they were last written from the same
+    # results and still hold what was written then (another run may have overwritten them)
+    outpaths = sorted(tbl_d['filepath'] for tbl_d in OUTDOC_TBL.values())
+    if FLAGS.get('Incremental') and state.get('writesig') == writesig and \
+       state.get('outfiles') == dict((p, gnstate.path_hash(p)) for p in outpaths):
+        print("*** Output files are up to date (not rewritten) ***")
+        return
+
+    write_var_arrays(OUTDOC_TBL, OUTDOC, OUT)
+    print("*** Done writing output to files (write_var_arrays()) ***")
+
+    if FLAGS.get('Incremental'):
+        state['writesig'] = writesig
+        state['outfiles'] = dict((p, gnstate.path_hash(p)) for p in outpaths)
+        gnstate.save_state(statedir, state)
+
+
+def run_cache_key():
+    ''' Key (content hash) of the current model run in the result cache: the run
+    settings (RUN, requested precision, 'All-Forms' model), the calibration
+    constants, the input and output variable mappings (INDOC, OUTDOC), the
+    contents of the loaded input columns and the model code version. Table
+    file paths are not part of the key; the input contents are.
+    '''
+    ccal = dict((F, dict((c, gnstate.value_hash(v)) for c, v in CCAL[F].items())) for F in CCAL)
+    return gnstate.signature({'run':dict(RUN), 'precision':FLAGS.get('Precision', ComputePrecision), \
+                              'afm':FLAGS['AllFormModel'], 'ccal':ccal, \
+                              'indoc':dict(INDOC), 'outdoc':dict(OUTDOC), \
+                              'in':dict((var, gnstate.array_hash(IN[var])) for var in IN), \
+                              'code':gnstate.code_hash(model_code_files())})
+
+
+def loadmodel():
+    ''' Read the model run and variable configurations (vars.cfg etc), and load
+    the input data of the requested nutrient forms into IN.
+    '''
     cfg_simple_sections("MODEL")
     print("*** Done reading general model run configurations (cfg_simple_sections()) ***")
     print("        %s" % localtimestrf("timeonly"))
@@ -143,42 +507,723 @@ def runmodel():
     print("*** Done reading variable configurations (PopulateCfgVars()) ***")
     print("        %s" % localtimestrf("timeonly"))
 
-    load_var_arrays(INDOC_TBL, INDOC, IN, OUT)
+    invars = invars_required(RUN['p'], FLAGS['AllFormModel'])
+    load_var_arrays(INDOC_TBL, INDOC, IN, OUT, invars)
     print("*** Done loading input data into memory (load_var_arrays()) ***")
     print("        %s" % localtimestrf("timeonly"))
 
-    print("\n*** Ready to run models ... ***")
+
+def set_precision(dtype):
+    ''' Set the compute precision, RUN['dtype'] ('float64' or 'float32'): cast the
+    floating point IN arrays and the array-valued CCAL constants to dtype.
+    ExportVar() keeps the OUT arrays at the same precision.
+    '''
+    if dtype not in ('float64', 'float32'):
+        print("  !!! Compute precision must be float64 or float32, not %s !!!" % dtype)
+        raise ValueError(dtype)
+    RUN['dtype'] = dtype
+    for var in IN:
+        if IN[var].dtype.kind == 'f' and IN[var].dtype != dtype:
+            IN[var] = IN[var].astype(dtype)
+    for F in CCAL:
+        for const, val in CCAL[F].items():
+            if isinstance(val, ny.ndarray) and val.dtype.kind == 'f':
+                CCAL[F][const] = val.astype(dtype)
+
+
+def run_reference(incremental=False):
+    ''' Run the sub-models at float64 precision, as the reference for the accuracy
+    report of a reduced precision run (see accuracy_report()). Return the
+    reference OUT variables; OUT is then cleared, except for BasinID.
+    If incremental, the reference units are reused from the run-state store
+    when unchanged (see run_submodels_incremental()).
+    '''
+    print("*** Running the float64 reference sub-models, for the accuracy report ***")
+    RUN['dtype'] = 'float64'
+    if incremental:
+        run_submodels_incremental(reference=True)
+    else:
+        run_submodels(quiet=True)
+    ref_d = dict(OUT)
+    for var in ref_d:
+        if var != 'BasinID':
+            del OUT[var]
+
+    return ref_d
+
+
+def accuracy_report(out_d, ref_d):
+    ''' Compare the numeric OUT variables of a reduced precision run (out_d) with
+    those of the float64 reference run (ref_d). Return (varnames, columns), the
+    report table columns: maximum absolute error, maximum relative error
+    (over basins with a non-zero reference value), and number of basins where
+    only one of the two values is finite.
+    '''
+    varnames = [var for var in out_d if var != 'BasinID' and out_d[var].dtype.kind == 'f']
+    maxabs, maxrel, nonfinite = [], [], []
+    for var in varnames:
+        val, ref = out_d[var].astype('float64'), ref_d[var]
+        finite = ny.isfinite(val) & ny.isfinite(ref)
+        err = ny.abs(val - ref)[finite]
+        refabs = ny.abs(ref)[finite]
+        maxabs.append(err.max() if err.size else 0.0)
+        relerr = err[refabs > 0] / refabs[refabs > 0]
+        maxrel.append(relerr.max() if relerr.size else 0.0)
+        nonfinite.append(ny.count_nonzero(ny.isfinite(val) != ny.isfinite(ref)))
+
+    return varnames, [ny.array(maxabs), ny.array(maxrel), ny.array(nonfinite)]
+
+
+def write_accuracy_report(report, doctbl_d):
+    ''' Print a summary of the accuracy report (see accuracy_report()), and write it
+    next to the first output table, as <output table name>_accuracy.csv.
+    '''
+    varnames, (maxabs, maxrel, nonfinite) = report
+    if not len(varnames):
+        return
+    worst = maxrel.argmax()
+    print("    %s vs. float64 reference: max relative error %.3g (%s), max absolute error %.3g (%s)" \
+          % (RUN['dtype'], maxrel[worst], varnames[worst], maxabs.max(), varnames[maxabs.argmax()]))
+
+    filepath = doctbl_d[sorted(doctbl_d)[0]]['filepath']
+    fpath_report = os.path.splitext(filepath)[0] + "_accuracy.csv"
+    gntblio.write_csv_columns(fpath_report, ['variable', 'max_abs_error', 'max_rel_error', \
+                              'n_nonfinite_diff'], [ny.array(varnames), maxabs, maxrel, nonfinite])
+    print("*** Done writing the accuracy report (%s) ***" % fpath_report)
+
+
+def runbatch(fname_manifest):
+    ''' Execute a batch of Global NEWS scenario runs in a single pass.
+    The scenario manifest (see parse_cfg_scenarios()) lists the vars.cfg [IN.TBLS]
+    tables replaced in each scenario. Tables shared by all scenarios are read once;
+    variables from replaced tables are stacked into (n_scenarios, n_basins) arrays,
+    and every sub-model runs once on the whole batch, by numpy broadcasting.
+    '''
+    global IN, OUT, FLAGS
+
+    print("*** Running Global NEWS Model, scenario batch %s\n" % fname_manifest)
+
+    cfg_simple_sections("MODEL")
+    PopulateCfgVars(fname_cfg_var, "MODEL")
+    scenarios = parse_cfg_scenarios(fname_manifest, INDOC_TBL)
+    print("*** Done reading model run and scenario configurations ***")
+    print("    Scenarios: " + ",".join([name for name, scentbl_d in scenarios]))
+    print("        %s" % localtimestrf("timeonly"))
+
+    invars = invars_required(RUN['p'], FLAGS['AllFormModel'])
+    load_var_arrays(INDOC_TBL, INDOC, IN, OUT, invars)
+    load_scenario_arrays(scenarios, INDOC_TBL, INDOC, IN, invars)
+    print("*** Done loading input data into memory (load_scenario_arrays()) ***")
+    print("        %s" % localtimestrf("timeonly"))
+
+    RUN['batch'] = [name for name, scentbl_d in scenarios]
+    precision = FLAGS.get('Precision', ComputePrecision)
+    if precision != 'float64':
+        ref_d = run_reference()
+        set_precision(precision)
+
+    run_submodels()
+
+    if precision != 'float64':
+        write_accuracy_report(accuracy_report(OUT, ref_d), OUTDOC_TBL)
+
+    write_batch_arrays(OUTDOC_TBL, OUTDOC, OUT, RUN['batch'], [('scenario', ny.array(RUN['batch']))])
+    print("*** Done writing output to files (write_batch_arrays()) ***")
+
+
+def runsweep(fname_samples):
+    ''' Execute a calibration constant sweep: the model is run for every sample
+    of the CCAL constants in fname_samples (see read_sweep_samples()).
+    Input tables are read once; samples are run in chunks of SweepChunkSamples
+    (gncfg.py), with each swept constant held as a (n_chunk, 1) array, so that
+    every sub-model yields (n_chunk, n_basins) arrays in one vectorized pass.
+    Chunk outputs are written with write_batch_arrays(): every output table as
+    one stacked npz archive per chunk (*_sweep0000.npz, ...), holding the sample
+    numbers and swept constant values. With FLAGS['SweepTables'] (--sweep-tables),
+    sweeps of up to SweepSampleTbls samples (gncfg.py) write instead one table
+    per sample, in its [OUT.TBLS] format.
+    Restricting [OUT.VARS] to the variables of interest is recommended.
+    '''
+    global IN, OUT, FLAGS, CCAL
+
+    print("*** Running Global NEWS Model, calibration constant sweep %s\n" % fname_samples)
+
+    cfg_simple_sections("MODEL")
+    PopulateCfgVars(fname_cfg_var, "MODEL")
+    ccalnames, samples = read_sweep_samples(fname_samples, CCAL)
+    print("*** Done reading model run and sweep configurations ***")
+    print("    %d samples of: %s" % (samples.shape[0], ",".join(ccalnames)))
+    if FLAGS.get('SweepTables') and samples.shape[0] > SweepSampleTbls:
+        print("  !!! --sweep-tables writes one output table per sample, for sweeps of up to")
+        print("      %d samples (SweepSampleTbls), not %d; run without it to write stacked" \
+              % (SweepSampleTbls, samples.shape[0]))
+        print("      npz archives (one per chunk of samples) !!!\n")
+        raise ValueError(fname_samples)
+    print("        %s" % localtimestrf("timeonly"))
+
+    invars = invars_required(RUN['p'], FLAGS['AllFormModel'])
+    load_var_arrays(INDOC_TBL, INDOC, IN, OUT, invars)
+    print("*** Done loading input data into memory (load_var_arrays()) ***")
+    print("        %s" % localtimestrf("timeonly"))
+    set_precision(FLAGS.get('Precision', ComputePrecision))
+
+    ccal_base = dict((F, dict(CCAL[F])) for F in CCAL)
+    for chunkidx, start in enumerate(range(0, samples.shape[0], SweepChunkSamples)):
+        stop = min(start + SweepChunkSamples, samples.shape[0])
+        sampleidx = ny.arange(start, stop)
+        for j, name in enumerate(ccalnames):
+            F, const = name.split('.')
+            CCAL[F][const] = samples[start:stop, j].reshape(-1, 1).astype(RUN['dtype'])
+
+        # clear the previous chunk's results (OUT is shared with the gne modules)
+        for var in list(OUT.keys()):
+            if var != 'BasinID':
+                del OUT[var]
+        RUN['batch'] = ["s%06d" % i for i in sampleidx]
+        run_submodels()
+
+        batchcols = [('sample', sampleidx)] + \
+                    [(name, samples[start:stop, j]) for j, name in enumerate(ccalnames)]
+        write_batch_arrays(OUTDOC_TBL, OUTDOC, OUT, RUN['batch'], batchcols, \
+                           "_sweep%04d" % chunkidx, stacked=not FLAGS.get('SweepTables'))
+        print("*** Done with samples %d-%d ***" % (start, stop - 1))
+
+    for F in ccal_base:
+        CCAL[F].update(ccal_base[F])
+    RUN['batch'] = None
+    print("*** Done writing output to files (write_batch_arrays()) ***")
+
+
+def read_sweep_samples(fname_samples, ccal_d):
+    ''' Read the calibration constant samples for runsweep(), either:
+    - a csv sample file: one column per swept constant, named <form>.<constant>
+      (eg, DIP.a, DIN.e), one row per sample; or
+    - a parameter grid cfg file: one [SWEEP] section option per swept constant,
+      <form>.<constant> = comma-separated values; all combinations are run.
+    Return (ccalnames, samples): the constant names and a (n_samples, n_names) array.
+    '''
+    if os.path.splitext(fname_samples)[1].lower() == ".csv":
+        fld_names, rows = gntblio.read_csv_rows(fname_samples)
+        rows = [row for row in rows if len(row) > 0]
+        ccalnames = [fld.strip() for fld in fld_names]
+        samples = ny.array(rows, dtype='float64').reshape(len(rows), len(ccalnames))
+    else:
+        grid_d = read_cfgfile(fname_samples, "SWEEP")
+        ccalnames = list(grid_d.keys())
+        axes = [ny.array(grid_d[name].split(','), dtype='float64') for name in ccalnames]
+        samples = ny.stack([g.ravel() for g in ny.meshgrid(*axes, indexing='ij')], axis=1)
+
+    for name in ccalnames:
+        F, const = (name.split('.') + [None])[:2]
+        if F not in ccal_d or const not in ccal_d[F]:
+            print("  !!! Sweep constant %s is not a constants.cfg [CAL.<form>] constant !!!\n" % name)
+            raise KeyError(name)
+    if samples.size == 0:
+        print("  !!! No samples found in %s !!!\n" % fname_samples)
+        raise ValueError(fname_samples)
+
+    return ccalnames, samples
+
+
+def runsensitivity():
+    ''' Global sensitivity analysis of model outputs (eg, DIN, DIP, DSi yields and
+    ICEP) to the constants.cfg calibration constants and to multiplicative scalings
+    of input variables, configured in sensitivity.cfg (see parse_cfg_sensitivity()).
+    Sobol first-order and total indices, or Morris elementary effect statistics,
+    are computed for every basin and for regional and global (area-weighted)
+    aggregates. The sample design is generated and run in chunks of up to
+    SweepChunkSamples samples (gncfg.py), as (n_samples, n_basins) arrays; each
+    chunk is folded into running sums (gnecode/gnsa.py) and discarded.
+    '''
+    global IN, OUT, FLAGS, CCAL
+
+    print("*** Running Global NEWS Model, sensitivity analysis (%s)\n" % fname_cfg_sa)
+
+    cfg_simple_sections("MODEL")
+    PopulateCfgVars(fname_cfg_var, "MODEL")
+    invars = invars_required(RUN['p'], FLAGS['AllFormModel'])
+    load_var_arrays(INDOC_TBL, INDOC, IN, OUT, invars)
+    set_precision(FLAGS.get('Precision', ComputePrecision))
+    sa = parse_cfg_sensitivity(read_cfgfile(fname_cfg_sa, "SENSITIVITY"))
+    factors, outvars = sa['factors'], sa['outvars']
+    nfactors = len(factors)
+    print("*** Done reading configurations and loading input data ***")
+    print("    %s analysis, %d factors: %s" % (sa['method'], nfactors, \
+          ",".join([name for kind, name, lo, hi in factors])))
+    print("        %s" % localtimestrf("timeonly"))
+
+    # Basin regions, for the regional aggregates (plus a last, global aggregate)
+    if sa['regions']:
+        id_tblname = INDOC['BasinID']['srctable'][0]
+        regcodes, reglabels = gnselect.basin_attr_codes(INDOC_TBL[id_tblname]['filepath'], \
+            sa['regions'], INDOC['BasinID']['fieldname'], IN['BasinID'], \
+            INDOC_TBL[id_tblname]['format'])
+    else:
+        regcodes, reglabels = ny.full(IN['BasinID'].size, -1), ny.array([], dtype=str)
+    outshape = (IN['BasinID'].size + reglabels.size + 1,)
+
+    lo = ny.array([f[2] for f in factors])
+    hi = ny.array([f[3] for f in factors])
+    ccal_base = dict((F, dict(CCAL[F])) for F in CCAL)
+    in_base = dict((name, IN[name]) for kind, name, flo, fhi in factors if kind == 'IN')
+    rng = ny.random.default_rng(sa['seed'])
+
+    # Check that the analyzed outputs are computed, with one run at the base
+    # factor values, before any sample is run
+    run_submodels(quiet=True)
+    missing = [var for var in outvars if var not in OUT]
+    if missing:
+        print("  !!! sensitivity.cfg: output variable(s) %s not computed by the [MODELRUN] p" \
+              % ",".join(missing))
+        print("      nutrient forms (%s)%s !!!\n" % (",".join(RUN['p']), \
+              "" if FLAGS['AllFormModel'] else "; ICEP requires the -a option"))
+        raise KeyError(missing[0])
+
+    if sa['method'] == 'sobol':
+        acc = dict((var, gnsa.sobol_init(nfactors, outshape)) for var in outvars)
+        chunkbase = max(1, SweepChunkSamples // (nfactors + 2))
+    else:
+        acc = dict((var, gnsa.morris_init(nfactors, outshape)) for var in outvars)
+        chunkbase = max(1, SweepChunkSamples // (nfactors + 1))
+
+    ndone = 0
+    while ndone < sa['n']:
+        nchunk = min(chunkbase, sa['n'] - ndone)
+        if sa['method'] == 'sobol':
+            unit = gnsa.sobol_chunk(rng, nchunk, nfactors)
+        else:
+            unit, design = gnsa.morris_chunk(rng, nchunk, nfactors, sa['levels'])
+
+        # Set factor values: CCAL constants as (n_samples, 1) arrays,
+        # scaled input variables as (n_samples, n_basins) arrays
+        x = gnsa.scale_unit(unit, lo, hi)
+        for j, (kind, name, flo, fhi) in enumerate(factors):
+            if kind == 'CAL':
+                F, const = name.split('.')
+                CCAL[F][const] = x[:, j].reshape(-1, 1).astype(RUN['dtype'])
+            else:
+                IN[name] = in_base[name] * x[:, j].reshape(-1, 1).astype(RUN['dtype'])
+        for var in list(OUT.keys()):
+            if var != 'BasinID':
+                del OUT[var]
+        RUN['batch'] = ["s%d" % i for i in range(x.shape[0])]
+        run_submodels(quiet=True)
+
+        for var in outvars:
+            f = ny.concatenate((OUT[var], gnsa.region_means(OUT[var], IN['A'], \
+                                regcodes, reglabels.size)), axis=1)
+            if sa['method'] == 'sobol':
+                gnsa.sobol_update(acc[var], f)
+            else:
+                gnsa.morris_update(acc[var], f, design)
+        ndone += nchunk
+        print("    %d of %d %s done (%d model runs)" % (ndone, sa['n'], \
+              'base samples' if sa['method'] == 'sobol' else 'trajectories', x.shape[0]))
+
+    for F in ccal_base:
+        CCAL[F].update(ccal_base[F])
+    IN.update(in_base)
+    RUN['batch'] = None
+    print("*** Done with sensitivity model runs ***")
+    print("        %s" % localtimestrf("timeonly"))
+
+    write_sensitivity_indices(sa, acc, reglabels)
+    print("*** Done writing sensitivity indices to files (%s_*.csv) ***" % sa['output'])
+
+
+def parse_cfg_sensitivity(sa_cfg_d):
+    ''' Parse the sensitivity.cfg configuration (read_cfgfile() dictionary).
+    Factors are every constants.cfg constant of the [MODELRUN] p nutrient forms,
+    varied by +/- calspread (fraction) around its value unless its range (lo,hi)
+    is given in [SENSITIVITY.CAL], plus the input variables listed in
+    [SENSITIVITY.IN] with their multiplicative scaling range (lo,hi).
+    Return the sa dictionary; sa['factors'] is a list of (kind, name, lo, hi),
+    kind being 'CAL' (name <form>.<constant>) or 'IN' (name: IN variable).
+    '''
+    sa = {}
+    sa['method'] = sa_cfg_d.get('method', 'sobol').strip().lower()
+    if sa['method'] not in ('sobol', 'morris'):
+        print("  !!! sensitivity.cfg: method must be sobol or morris !!!\n")
+        raise ValueError(sa['method'])
+    sa['n'] = int(sa_cfg_d.get('n', 256))
+    sa['levels'] = int(sa_cfg_d.get('levels', 4))
+    sa['seed'] = int(sa_cfg_d.get('seed', 1))
+    sa['regions'] = sa_cfg_d.get('regions', '').strip() or None
+
+    outvars = [F + 'Yld' for F in RUN['p']]
+    if FLAGS['AllFormModel']:
+        outvars.append('ICEP')
+    if sa_cfg_d.get('outvars', '').strip():
+        outvars = [var.strip() for var in sa_cfg_d['outvars'].split(',')]
+    sa['outvars'] = outvars
+
+    strsubs = read_cfgfile(fname_cfg_gen, "STRSUBS")
+    strblock = {}
+    sa['output'] = sa_cfg_d.get('output', '(fpath_out)/sensitivity')
+    if ParseStrBlock("()", sa['output'], strblock):
+        sa['output'] = strsubs[strblock['b']] + strblock['f']
+
+    factors = []
+    calspread = float(sa_cfg_d.get('calspread', 0.1))
+    calranges = sa_cfg_d.get('CAL', {})
+    for F in RUN['p']:
+        for const, val in sorted(CCAL.get(F, {}).items()):
+            name = F + '.' + const
+            if name in calranges:
+                flo, fhi = [float(v) for v in calranges[name].split(',')]
+            elif calspread > 0:
+                flo, fhi = val * (1 - calspread), val * (1 + calspread)
+            else:
+                continue
+            factors.append(('CAL', name, flo, fhi))
+    for name in calranges:
+        if name not in [f[1] for f in factors]:
+            print("  !!! sensitivity.cfg: %s is not a constant of the [MODELRUN] p forms !!!\n" % name)
+            raise KeyError(name)
+    for name, val in list(sa_cfg_d.get('IN', {}).items()):
+        if name not in IN:
+            print("  !!! sensitivity.cfg: input variable %s is not loaded (not an [IN.VARS]" % name)
+            print("      variable read by the [MODELRUN] p nutrient forms) !!!\n")
+            raise KeyError(name)
+        flo, fhi = [float(v) for v in val.split(',')]
+        factors.append(('IN', name, flo, fhi))
+    if len(factors) == 0:
+        print("  !!! sensitivity.cfg: no factors to analyze !!!\n")
+        raise ValueError(fname_cfg_sa)
+    sa['factors'] = factors
+
+    return sa
+
+
+def write_sensitivity_indices(sa, acc, reglabels):
+    ''' Write the sensitivity indices of each output variable to csv tables:
+    <output>_<var>.csv, one row per basin, and <output>_<var>_regions.csv,
+    one row per region plus a last 'Global' row. Fields are, for each factor:
+    S_<factor>, ST_<factor> (sobol) or mu_, mustar_, sigma_<factor> (morris).
+    '''
+    nbasins = IN['BasinID'].size
+    regnames = ny.array([str(lbl) for lbl in reglabels] + ['Global'])
+    for var in sa['outvars']:
+        if sa['method'] == 'sobol':
+            stats = list(zip(('S', 'ST'), gnsa.sobol_indices(acc[var])))
+        else:
+            stats = list(zip(('mu', 'mustar', 'sigma'), gnsa.morris_indices(acc[var])))
+        fldnames, columns = [], []
+        for j, (kind, name, flo, fhi) in enumerate(sa['factors']):
+            for statname, statvals in stats:
+                fldnames.append(statname + '_' + name)
+                columns.append(statvals[j])
+
+        gntblio.write_csv_columns("%s_%s.csv" % (sa['output'], var), \
+            ['basinid'] + fldnames, [IN['BasinID']] + [col[:nbasins] for col in columns])
+        gntblio.write_csv_columns("%s_%s_regions.csv" % (sa['output'], var), \
+            ['region'] + fldnames, [regnames] + [col[nbasins:] for col in columns])
+
+
+def run_submodels(quiet=False):
+    ''' Run the dissolved, particulate and (optional) 'All-Form' sub-models
+    for the nutrient forms requested in vars.cfg, on the loaded IN arrays.
+    With FLAGS['ModelProcs'] > 1, the nutrient form sub-models are run by
+    a pool of processes (see run_forms_pool()).
+    quiet=True skips the progress messages (for repeated, batched runs).
+    '''
+    msg = print if not quiet else (lambda *args: None)
+
+    msg("\n*** Ready to run models ... ***")
     # run only nutrient-form (parameter) subsets specified in vars.cfg, as appropriate
     params_dissolved = [p for p in RUN['p'] if p in PGRP['dissolved']]
     params_particulate = [p for p in RUN['p'] if p in PGRP['particulate']]
-    print("    Nutrient forms (parameters) requested:")
-    print("    " + ",".join(params_dissolved) + "  " + ",".join(params_particulate))
+    msg("    Nutrient forms (parameters) requested:")
+    msg("    " + ",".join(params_dissolved) + "  " + ",".join(params_particulate))
     
-    if len(params_dissolved):        
-        model_dissolved(params_dissolved)
-        print("*** Done with dissolved sub-models ***")
+    if FLAGS.get('ShowGraph'):
+        print("    Shared intermediates (gngraph nodes) used by the sub-models:")
+        for line in gngraph.describe(graph_schedule(params_dissolved, params_particulate)):
+            print("      " + line)
+
+    procs = FLAGS.get('ModelProcs', ModelProcs)
+    if procs > 1 and len(params_dissolved) + min(len(params_particulate), 1) > 1:
+        run_forms_pool(params_dissolved, params_particulate, procs)
+        if FLAGS.get('ShowGraph'):
+            print("    (The intermediates used by each output variable are listed in serial runs, -j 1)")
+        msg("*** Done with dissolved and particulate sub-models (%d processes) ***" % procs)
+        msg("        %s" % localtimestrf("timeonly"))
     else:
-        print("*** No dissolved forms (parameters) requested")
-    print("        %s" % localtimestrf("timeonly"))
+        graph_schedule(params_dissolved, params_particulate)
+        if len(params_dissolved):        
+            model_dissolved(params_dissolved)
+            msg("*** Done with dissolved sub-models ***")
+        else:
+            msg("*** No dissolved forms (parameters) requested")
+        msg("        %s" % localtimestrf("timeonly"))
 
-    if len(params_particulate):        
-        model_particulate(params_particulate)
-        print("*** Done with particulate sub-models ***")
-    else:
-        print("*** No particulate forms (parameters) requested")
-    print("        %s" % localtimestrf("timeonly"))
+        if len(params_particulate):        
+            model_particulate(params_particulate)
+            msg("*** Done with particulate sub-models ***")
+        else:
+            msg("*** No particulate forms (parameters) requested")
+        msg("        %s" % localtimestrf("timeonly"))
+        if FLAGS.get('ShowGraph'):
+            print("    Shared intermediates computed: %(computed)d, reused: %(hits)d, freed: %(freed)d" \
+                  % gngraph.STATS)
+            print("    Shared intermediates used by each output variable (step that exported it):")
+            for line in gngraph.describe_outputs(graph_uses):
+                print("      " + line)
+        gngraph.clear()
 
     if FLAGS['AllFormModel']:
         import allformmodel
         allformmodel.model()
-        print("*** Done with 'All-Form' model ***")
+        msg("*** Done with 'All-Form' model ***")
+    else:
+        msg("*** No 'All-Form' model requested")
+    msg("        %s" % localtimestrf("timeonly"))
+
+
+def run_forms_pool(params_dissolved, params_particulate, procs):
+    ''' Run the dissolved nutrient form sub-models, one task per form, and the
+    particulate sub-models (one task) in a pool of procs worker processes.
+    The read-only IN arrays are placed once in shared memory blocks that every
+    worker maps without copying (see share_arrays()). Each task returns the
+    OUT variables exported by its sub-model; they are merged into OUT in the
+    serial run order. Nutrient forms don't read each other's variables, so
+    the results are bit-identical to a serial run.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [('dissolved', [F]) for F in params_dissolved]
+    if len(params_particulate):
+        tasks.append(('particulate', params_particulate))
+
+    shmblocks, inspec = share_arrays(IN)
+    try:
+        pool = ProcessPoolExecutor(max_workers=min(procs, len(tasks)), \
+                                   initializer=_forms_pool_init, \
+                                   initargs=(inspec, dict(CCAL), dict(RUN), dict(FLAGS)))
+        out_lst = list(pool.map(run_forms_task, tasks))
+        pool.shutdown()
+    finally:
+        for shm in shmblocks:
+            shm.close()
+            shm.unlink()
+
+    for out_d, outcodes_d in out_lst:
+        OUT.update(out_d)
+        OUTCODES.update(outcodes_d)
+
+
+def share_arrays(data_d):
+    ''' Copy the numpy arrays in data_d into shared memory blocks, one per array.
+    Return (shmblocks, spec): the SharedMemory objects, to be closed and unlinked
+    by the caller, and spec[varname] = (block name, shape, dtype), for attach_arrays().
+    '''
+    from multiprocessing import shared_memory
+
+    shmblocks, spec = [], {}
+    for var, arr in data_d.items():
+        arr = ny.asarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        ny.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        shmblocks.append(shm)
+        spec[var] = (shm.name, arr.shape, arr.dtype.str)
+
+    return shmblocks, spec
+
+
+def attach_arrays(spec):
+    ''' Map the shared memory blocks described by spec (see share_arrays())
+    as read-only numpy arrays. Return (shmblocks, data_d).
+    '''
+    from multiprocessing import shared_memory
+
+    shmblocks, data_d = [], {}
+    for var, (name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        arr = ny.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        arr.flags.writeable = False
+        shmblocks.append(shm)
+        data_d[var] = arr
+
+    return shmblocks, data_d
+
+
+# shared memory blocks mapped by a run_forms_pool() worker process
+_forms_pool_shm = []
+
+def _forms_pool_init(inspec, ccal_d, run_d, flags_d):
+    ''' run_forms_pool() worker process initializer: map the shared IN arrays
+    and set up the gncfg dictionaries (updated in place, as they are shared
+    by all gne modules).
+    '''
+    global _forms_pool_shm
+    _forms_pool_shm, in_d = attach_arrays(inspec)
+    IN.clear()
+    IN.update(in_d)
+    CCAL.clear()
+    CCAL.update(ccal_d)
+    RUN.update(run_d)
+    FLAGS.update(flags_d)
+
+
+def run_forms_task(task):
+    ''' Run one run_forms_pool() or run_submodels_incremental() task, on an
+    emptied OUT; return the OUT variables it exported, and their code tables
+    (OUTCODES)
+    '''
+    kind, forms = task
+    OUT.clear()
+    OUTCODES.clear()
+    if kind == 'dissolved':
+        graph_schedule(forms, [])
+        model_dissolved(forms)
+    else:
+        graph_schedule([], forms)
+        model_particulate(forms)
+    gngraph.clear()
+
+    return dict(OUT), dict(OUTCODES)
+
+
+def model_units(params_dissolved, params_particulate):
+    ''' Return the model units of incremental runs, as (unit name, task) pairs
+    (see run_forms_task()): one unit per dissolved form, one for the particulate forms.
+    '''
+    units = [(F, ('dissolved', [F])) for F in params_dissolved]
+    if len(params_particulate):
+        units.append(('particulate', ('particulate', params_particulate)))
+    return units
+
+
+def model_code_files():
+    ''' Model code files, whose contents set the model code version (see gnstate.code_hash()) '''
+    import allformmodel
+    return [os.path.abspath(__file__), allformmodel.__file__]
+
+
+def unit_signature(task, inhash, codehash):
+    ''' Signature of a model unit (see model_units()): the hashes of its input
+    columns (inhash[var]) and constants, the basin set, the compute precision
+    and the model code version (codehash).
+    '''
+    kind, forms = task
+    if kind == 'dissolved':
+        invars = INVARS_DISSOLVED[forms[0]]
     else:
-        print("*** No 'All-Form' model requested")
+        invars = INVARS_PARTICULATE
+    ccal = dict((F, dict((c, gnstate.value_hash(v)) for c, v in CCAL.get(F, {}).items())) \
+                for F in forms)
+    return gnstate.signature({'task':task, 'in':dict((var, inhash[var]) for var in invars), \
+                              'ccal':ccal, 'basins':inhash['BasinID'], \
+                              'dtype':RUN.get('dtype', 'float64'), 'code':codehash})
+
+
+def run_submodels_incremental(reference=False):
+    ''' Incremental version of run_submodels(): only the model units (see model_units())
+    whose input columns, constants or code changed since the previous run with
+    the same output tables are recomputed; the outputs of the other units are
+    reloaded from the run-state store (gnstate.py, under FPathRunState).
+    The 'All-Forms' model is recomputed if any of its nutrient forms changed.
+    Return (statedir, state, writesig); the output tables were last written from
+    the same results if state['writesig'] == writesig (see runmodel(), which also
+    checks their contents against state['outfiles']).
+    reference runs are the float64 reference of a reduced precision run (see
+    run_reference()); their units are stored as <unit>.float64.
+    '''
+    unitsuffix = ".float64" if reference else ""
+    print("\n*** Ready to run models, incrementally%s ... ***" % (" (float64 reference)" if reference else ""))
+    params_dissolved = [p for p in RUN['p'] if p in PGRP['dissolved']]
+    params_particulate = [p for p in RUN['p'] if p in PGRP['particulate']]
+
+    statedir = gnstate.state_dir(FPathRunState, sorted(tbl_d['filepath'] for tbl_d in OUTDOC_TBL.values()))
+    state = gnstate.load_state(statedir)
+    codehash = gnstate.code_hash(model_code_files())
+    inhash = dict((var, gnstate.array_hash(IN[var])) for var in IN)
+
+    base_d = dict(OUT)
+    results, sigs, recomputed, changed = [], {}, [], []
+    for unit, task in model_units(params_dissolved, params_particulate):
+        unit += unitsuffix
+        sigs[unit] = unit_signature(task, inhash, codehash)
+        stored = gnstate.load_unit(statedir, state, unit, sigs[unit])
+        if stored is None:
+            stored = run_forms_task(task)
+            changed += gnstate.save_unit(statedir, state, unit, sigs[unit], stored[0], stored[1])
+            recomputed.append(unit)
+        results.append(stored)
+
+    OUT.clear()
+    OUT.update(base_d)
+    OUTCODES.clear()
+    for out_d, outcodes_d in results:
+        OUT.update(out_d)
+        OUTCODES.update(outcodes_d)
+
+    if FLAGS['AllFormModel']:
+        import allformmodel
+        unit = 'allforms' + unitsuffix
+        sigs[unit] = gnstate.signature({'units':sigs, \
+            'in':dict((var, inhash[var]) for var in allformmodel.INVARS), 'code':codehash})
+        stored = gnstate.load_unit(statedir, state, unit, sigs[unit])
+        if stored is None:
+            before = set(OUT.keys())
+            allformmodel.model()
+            stored = (dict((var, OUT[var]) for var in OUT if var not in before), {})
+            changed += gnstate.save_unit(statedir, state, unit, sigs[unit], *stored)
+            recomputed.append(unit)
+        OUT.update(stored[0])
+
+    gnstate.save_state(statedir, state)
+    print("    Recomputed: %s" % (",".join(recomputed) or "(none)"))
+    print("    Reused:     %s" % (",".join([u for u in sigs if u not in recomputed]) or "(none)"))
+    print("    Output variables changed: %d" % len(changed))
+    print("*** Done with sub-models ***")
     print("        %s" % localtimestrf("timeonly"))
 
+    writesig = gnstate.signature({'units':sigs, 'tbls':dict(OUTDOC_TBL), 'vars':dict(OUTDOC)})
+    return statedir, state, writesig
 
-    write_var_arrays(OUTDOC_TBL, OUTDOC, OUT)
-    print("*** Done writing output to files (write_var_arrays()) ***")
+
+def invars_required(run_forms, allformmodel=False):
+    ''' Return the set of input variables (IN keys) read by the sub-models
+    of the requested nutrient forms (and by the 'All-Forms' model, if requested),
+    as declared in INVARS_DISSOLVED, INVARS_PARTICULATE and allformmodel.INVARS.
+    '''
+    invars = set(['BasinID'])
+    for F in run_forms:
+        if F in PGRP['dissolved']:
+            invars.update(INVARS_DISSOLVED[F])
+        elif F in PGRP['particulate']:
+            invars.update(INVARS_PARTICULATE)
+    if allformmodel:
+        import allformmodel
+        invars.update(allformmodel.INVARS)
+
+    return invars
+
+
+def runpackinputs():
+    ''' Convert each csv input table in vars.cfg [IN.TBLS] into a memory-mapped
+    columnar table folder (same path, with extension .gnecol instead of .csv).
+    Fields mapped to [IN.VARS] variables are stored with their configured type.
+    '''
+    print("*** Packing csv input tables into columnar tables\n")
+
+    cfg_simple_sections("MODEL")
+    PopulateCfgVars(fname_cfg_var, "MODEL")
+
+    for tbl in INDOC_TBL:
+        if INDOC_TBL[tbl]['format'] != 'csv':
+            continue
+        fldtypes_d = {}
+        for var in INDOC_TBL[tbl]['varlst']:
+            fldtypes_d[INDOC[var]['fieldname']] = INDOC[var]['fieldtype']
+        csvpath = INDOC_TBL[tbl]['filepath']
+        packpath = os.path.splitext(csvpath)[0] + ".gnecol"
+        nrows = gntblio.pack_csv_table(csvpath, packpath, fldtypes_d)
+        print("    %s: %d rows packed into %s" % (tbl, nrows, packpath))
+
+    print("\n*** To use them, set the [IN.TBLS] entries in vars.cfg to, eg:")
+    print("    tblname = (fpath_in)\\preproctbls\\tblfile.gnecol|basin|columnar")
 
 
 def rungis2tbls():
@@ -198,9 +1243,16 @@ def rungis2tbls():
     
     # loop through gis input grids for all items in INDOC
     #print "INDOC keys:", INDOC.keys(), "  INDOC_TBL keys:", INDOC_TBL.keys()
-    gngis2tbls.CalcBasinStats(INDOC_TBL, INDOC)
-    print("*** Done with CalcBasinStats ***\n")
-    gngis2tbls.BasinStatsToOUTvarArrays(OUTDOC_TBL, OUTDOC, OUT, IN)
+    # ArcInfo (or other non gnraster.py) grids require ArcGIS, which writes
+    # the zonal statistics to dbf tables, read by BasinStatsToOUTvarArrays()
+    if gngis2tbls.UseArcGIS(INDOC_TBL, INDOC):
+        gngis2tbls.CalcBasinStatsArcGIS(INDOC_TBL, INDOC)
+        stats_d = None
+        print("*** Done with CalcBasinStatsArcGIS ***\n")
+    else:
+        stats_d = gngis2tbls.CalcBasinStats(INDOC_TBL, INDOC)
+        print("*** Done with CalcBasinStats ***\n")
+    gngis2tbls.BasinStatsToOUTvarArrays(OUTDOC_TBL, OUTDOC, OUT, IN, stats_d)
     print("*** Done with BasinStatsToOUTvarArrays ***\n")
     
     # INSERT HERE A NEW FUNCTION (SEPARATE FILE) TO FREELY DEFINE GENERATED
@@ -281,7 +1333,7 @@ def read_cfgfile(fname_cfg, sect_prefix):
     # Prevent default behavior of returning options in all-lowercase
     cfg.optionxform = str
 
-    fpath_cfg = os.path.join(fpath_dev, fname_cfg)
+    fpath_cfg = os.path.join(FLAGS.get('CfgPath', fpath_dev), fname_cfg)
     cfg.read(fpath_cfg)
 
     # is any error checking needed??
@@ -340,6 +1392,12 @@ def parse_cfg_modelrun(mrun_cfg_d, run_d):
             # assign order index, converting from base 1 to base 0
             run_d['param_ord'].append(int(v) - 1)
 
+    # Parse optional variable basins, a basin selection query (see gnselect.py);
+    # None if omitted. The query is checked here, evaluated in load_var_arrays()
+    run_d['basins'] = None
+    if mrun_cfg_d.get('basins', '').strip():
+        run_d['basins'] = mrun_cfg_d['basins'].strip()
+        gnselect.parse_basin_query(run_d['basins'])
     
     if FLAGS['verbose']: print(run_d)
 
@@ -369,15 +1427,18 @@ def parse_cfg_tbls(tbls, strsubs, doctbl_d, doctype):
     """
     import os.path
     
-    vlist_len = {"INGIS":2, "IN":2, "OUT":2}
+    # IN and OUT tables take an optional 3rd argument, the table format
+    vlist_len = {"INGIS":(2,), "IN":(2,3), "OUT":(2,3)}
+    format_valid = {"IN":('csv', 'columnar'), "OUT":('csv', 'npz', 'columnar')}
 
     # what's the difference between .items() and .iteritems()?
     for tblname,val in list(tbls.items()):
         vlist = val.split("|")
     
         # later, the basis for doctype == "OUT" might be made optional?
-        if len(vlist) != vlist_len[doctype]:
-            if FLAGS['verbose']: print("%s: Tables must have exactly %d arguments.\n" %(tblname, vlist_len[doctype]))
+        if len(vlist) not in vlist_len[doctype]:
+            if FLAGS['verbose']: print("%s: Tables must have %s arguments.\n" \
+                                 %(tblname, " or ".join(map(str, vlist_len[doctype]))))
             # Now exit.
     
         # add empty tblname key to dictionary
@@ -412,12 +1473,54 @@ def parse_cfg_tbls(tbls, strsubs, doctbl_d, doctype):
         elif doctype == "OUT":
             doctbl_d[tblname]['basis'] = 'basin'
 
+        # Add table format item (check for valid values); 'csv' if omitted.
+        # 'columnar': directory of memory-mapped column files (IN and OUT);
+        # 'npz': numpy npz archive of columns (OUT). See gntblio.py.
+        if doctype in format_valid:
+            doctbl_d[tblname]['format'] = 'csv'
+            if len(vlist) > 2:
+                if vlist[2] in format_valid[doctype]:
+                    doctbl_d[tblname]['format'] = vlist[2]
+                else:
+                    print("Table %s: format '%s' is not recognized; must be (%s).\n" \
+                          %(tblname, vlist[2], ','.join(format_valid[doctype])))
+                    # Now exit.
+
         # initialize list of variables to be used
         # and their left-right field output order (for OUT)
         doctbl_d[tblname]['varlst'] = []
         doctbl_d[tblname]['fieldorder'] = []
 
 
+def parse_cfg_scenarios(fname_manifest, doctbl_d):
+    """ Parse a batch scenario manifest file, eg:
+        [SCENARIO.c00]
+        [SCENARIO.GO2030]
+        difflanduse   = (fpath_in)\preproctbls\GO2030_diffsrc_landuse_ng.csv|basin
+        hydropntother = (fpath_in)\preproctbls\GO2030_hydro_pntsrc_other_ng.csv|basin
+    Each [SCENARIO.name] section lists the [IN.TBLS] tables (doctbl_d keys) replaced
+    in that scenario, with the [IN.TBLS] entry syntax; other tables are shared.
+    Return the list of (scenario name, scenario doctbl dictionary), in manifest order.
+    """
+    strsubs = read_cfgfile(fname_cfg_gen, "STRSUBS")
+    scen_dict = read_cfgfile(fname_manifest, "SCENARIO")
+    if len(scen_dict) == 0:
+        print("  !!! No [SCENARIO.name] sections found in %s !!!\n" % fname_manifest)
+        raise ValueError(fname_manifest)
+
+    scenarios = []
+    for name in scen_dict:
+        for tbl in scen_dict[name]:
+            if tbl not in doctbl_d:
+                print("  !!! Scenario %s: table %s is not an [IN.TBLS] table !!!\n" % (name, tbl))
+                raise KeyError(tbl)
+        scentbl_d = {}
+        parse_cfg_tbls(scen_dict[name], strsubs, scentbl_d, "IN")
+        scenarios.append((name, scentbl_d))
+
+    return scenarios
+
+
 def parse_cfg_vars(vars, doctbl_d, doc_d, doctype):
     """ Parse variables, mapping them to columns (fields) in csv tables.
     """
@@ -542,30 +1645,35 @@ def doctbld_docd_assign(dattype, doctbld, docd, varname, srctable, fldname, \
         docd[varname]['srctable'],docd[varname]['fieldname'],docd[varname]['fieldtype'])
 
 
-def load_var_arrays(doctbl_d, doc_d, data_d, out_data_d):
+def load_var_arrays(doctbl_d, doc_d, data_d, out_data_d, invars=None):
     """ Data array will be populated into data_d[varname]
     Open each table, load each requested fields and map them to variables.
     Variables will be numpy arrays.
+    If invars (set of variable names) is not None, only those variables are
+    loaded, and tables holding none of them are not read at all.
     """
-    import csv
-    
+
     # =====================================================
     # LOAD AND HANDLE BasinID VARIABLE
     # Basin sub-setting functionality is included.
     id_var = 'BasinID'
     id_fldname, id_tblname = doc_d[id_var]['fieldname'], doc_d[id_var]['srctable'][0]
-    
-    # read csv table and load BasinID variable        
-    fp = open(doctbl_d[id_tblname]['filepath'], "r")
-    basinid_lst = [int(row[id_fldname]) for row in csv.DictReader(fp)]    
-    fp.close()
-
-    # Convert to int32 numpy array and load into IN
-    data_d[id_var] = ny.array(basinid_lst, dtype="int32")
 
-    # Create set out of global BasinID's array
-    # For use in basin sub-setting as input variables/tables are read in (below)
-    setBasinID = set(data_d[id_var])
+    # read table and load BasinID variable as int32 numpy array into IN
+    data_d[id_var] = gntblio.read_tbl_columns(doctbl_d[id_tblname]['filepath'], \
+                        [id_fldname], ['int'], None, doctbl_d[id_tblname]['format'])[id_fldname]
+
+    # Basin selection by attribute query ([MODELRUN] basins), evaluated on the
+    # attribute fields of the BasinID table before any other table is read
+    if RUN.get('basins'):
+        rowsel = gnselect.select_basin_rows(doctbl_d[id_tblname]['filepath'], \
+                        RUN['basins'], doctbl_d[id_tblname]['format'])
+        print("  Basins selected (%s): %d of %d" \
+              % (RUN['basins'], rowsel.size, data_d[id_var].size))
+        if rowsel.size == 0:
+            print("  !!! No basins match the [MODELRUN] basins query !!!\n")
+            raise ValueError(RUN['basins'])
+        data_d[id_var] = data_d[id_var][rowsel]
 
     # Copy to OUT[id_var] numpy array
     out_data_d[id_var] = data_d[id_var]
@@ -573,112 +1681,152 @@ def load_var_arrays(doctbl_d, doc_d, data_d, out_data_d):
     if FLAGS['verbose']: print("  Number of basins to be processed: %d" % data_d[id_var].size)
 
     # =====================================================
-    # LOAD ALL OTHER INPUT VARIABLES, STEPPING THROUGH INDIVIDUAL INPUT TABLES
+    # LOAD ALL OTHER INPUT VARIABLES FROM THE INDIVIDUAL INPUT TABLES
+    # Tables are read concurrently by FLAGS['TblReadWorkers'] threads, then
+    # merged into data_d in the (deterministic) order of doctbl_d
+    tbljobs, tblvars = [], []
     for tbl in list(doctbl_d.keys()):
-        if len(doctbl_d[tbl]['varlst']) > 0:
-            # Initialize data_d dict with all its keys (variables), as numpy arrays
-            # (maybe this data_d initialization should be done in parse_cfg_vars()?
-            for var in doctbl_d[tbl]['varlst']:
-                if var != id_var: 
-                    if doc_d[var]['fieldtype'] == "double":
-                        data_d[var] = ny.array([], dtype="float64")
-                        #data_d[var] = ny.array([], dtype="float32")
-                    elif doc_d[var]['fieldtype'] == "int":
-                        data_d[var] = ny.array([], dtype="int32")
-
-            # create temporary dict {fieldname:varname} for current table (tbl),
-            # based on doctbl_d[tbl]['varlst'] and doc_d[varname]['fieldname']
-            # Then map fieldname to varname, and use in the block below
-            tbl_fld_var = {}
-            for var in doctbl_d[tbl]['varlst']:
-                if var != id_var: 
-                    tbl_fld_var[doc_d[var]['fieldname']] = var
-            if FLAGS['verbose']: print("tbl_fld_var: ", tbl_fld_var)
-
-            # Read the first row (field names)
-            fp = open(doctbl_d[tbl]['filepath'], "r")
-            fld_names_reader = csv.reader(fp)
-            fld_names = next(fld_names_reader)
-            fp.close()
-
-            # Set basinid_fld using the header (field names) reader list
-            # id_fldnames_lst is a list of expected basin id field names
-            id_fldnames_lst = ['basinid', 'BASINID']
-            if id_fldnames_lst[0] in fld_names:
-                basinid_fld = id_fldnames_lst[0]
-            elif id_fldnames_lst[1] in fld_names:
-                basinid_fld = id_fldnames_lst[1]
-            else:
-                print("  !!! Input table does not have a valid basin ID column name !!!\n")
-
-            # read csv table and load requested fields
-            fp = open(doctbl_d[tbl]['filepath'], "r")
-            csvreader = csv.DictReader(fp)
-            # SHOULD THERE BE A TEST TO ENSURE THAT ALL REQUESTED FIELDS
-            # ARE PRESENT IN THE FILE? OTHERWISE, ABORT WITH ERROR MESSAGE
-            for row in csvreader:
-                for fld,v in list(row.items()):
-                    if int(row[basinid_fld]) in setBasinID and fld in list(tbl_fld_var.keys()):
-                        # load requested fields into the data_d dict by
-                        # concatenating each row value to the numpy arrays
-                        # This test is done for every single row! It may be more
-                        # efficient to extract indices for the requested fields, then
-                        # just use those indices directly into the row dictionary.
-                        # And maybe use simple reader and not DictRead, for efficiency.
-                        var = tbl_fld_var[fld]
-                        if var != id_var:
-                            if doc_d[var]['fieldtype'] == "double":
-                                data_d[var] = ny.r_[data_d[var], float(v)]
-                            elif doc_d[var]['fieldtype'] == "int":
-                                data_d[var] = ny.r_[data_d[var], int(v)]
-            fp.close()
-
-            if FLAGS['verbose']: 
-                for var in doctbl_d[tbl]['varlst']: 
-                    print("   ", var, "(", data_d[var].size, "):", data_d[var])
+        varlst = [var for var in doctbl_d[tbl]['varlst'] if var != id_var \
+                  and (invars is None or var in invars)]
+        if len(varlst) > 0:
+            # Requested field names and types for current table (tbl), based on
+            # doctbl_d[tbl]['varlst'] and doc_d[varname]['fieldname']
+            fldnames = [doc_d[var]['fieldname'] for var in varlst]
+            fldtypes = [doc_d[var]['fieldtype'] for var in varlst]
+            if FLAGS['verbose']: print("tbl_fld_var: ", dict(list(zip(fldnames, varlst))))
+            tbljobs.append((doctbl_d[tbl]['filepath'], fldnames, fldtypes, \
+                            doctbl_d[tbl].get('format', 'csv')))
+            tblvars.append((tbl, varlst))
+
+    # read tables and load requested fields, retaining only
+    # rows with Basin ID's found in the global BasinID array
+    coldata_lst = gntblio.read_tbls_columns(tbljobs, data_d[id_var], \
+                        FLAGS.get('TblReadWorkers', TblReadWorkers))
+    for (tbl, varlst), (filepath, fldnames, fldtypes, tblformat), coldata_d in \
+            zip(tblvars, tbljobs, coldata_lst):
+        for var, fld in zip(varlst, fldnames):
+            data_d[var] = coldata_d[fld]
+
+        if FLAGS['verbose']: 
+            for var in varlst: 
+                print("   ", var, "(", data_d[var].size, "):", data_d[var])
+
+
+def load_scenario_arrays(scenarios, doctbl_d, doc_d, data_d, invars=None):
+    """ Stack the variables of the tables replaced by batch scenarios
+    (see parse_cfg_scenarios()) into (n_scenarios, n_basins) arrays in data_d.
+    Must be called after load_var_arrays(); variables of tables shared by all
+    scenarios keep their (n_basins) arrays. The replacement tables are read
+    concurrently and aligned to the BasinID array, like the base tables.
+    """
+    id_var = 'BasinID'
+
+    tbljobs, jobvars = [], []
+    for scenidx, (name, scentbl_d) in enumerate(scenarios):
+        for tbl in scentbl_d:
+            varlst = [var for var in doctbl_d[tbl]['varlst'] if var != id_var \
+                      and (invars is None or var in invars)]
+            if len(varlst) > 0:
+                fldnames = [doc_d[var]['fieldname'] for var in varlst]
+                fldtypes = [doc_d[var]['fieldtype'] for var in varlst]
+                tbljobs.append((scentbl_d[tbl]['filepath'], fldnames, fldtypes, \
+                                scentbl_d[tbl]['format']))
+                jobvars.append((scenidx, varlst))
+
+    coldata_lst = gntblio.read_tbls_columns(tbljobs, data_d[id_var], \
+                        FLAGS.get('TblReadWorkers', TblReadWorkers))
+
+    # per-scenario column lists, starting from the shared (base) column
+    scencols_d = {}
+    for (scenidx, varlst), (filepath, fldnames, fldtypes, tblformat), coldata_d in \
+            zip(jobvars, tbljobs, coldata_lst):
+        for var, fld in zip(varlst, fldnames):
+            if var not in scencols_d:
+                scencols_d[var] = [data_d[var]] * len(scenarios)
+            scencols_d[var][scenidx] = coldata_d[fld]
+
+    for var in scencols_d:
+        data_d[var] = ny.stack(scencols_d[var])
+        if FLAGS['verbose']: print("   ", var, data_d[var].shape, ":", data_d[var])
 
 
 def write_var_arrays(doctbl_d, doc_d, data_d):
     """ 
-    To write out variables to csv tables, use the compact
-    writerows() csv writer method. One way to prepare the output numpy arrays
-    for writing is to use zip(). eg, for 3 numpy arrays:
-    a = ny.array([1,2])
-    b = ny.array([10,20])
-    c = ny.array([5,7])
-    zip(a,b,c)
-    [(1, 10, 5), (2, 20, 7)]
-    
-    fp = open("myfile.csv", "wb") # without the 'b', blank lines may be inserted
-    writer = csv.writer(fp)
-    writer.writerow(["fld1","fld2","fld3"])
-    writer.writerows(zip(a,b,c))
+    Write out variables to csv (or npz, columnar) tables, in the field order set in vars.cfg
+    (see cfg_outvars_order()). The ordered variable arrays are handed to
+    gntblio.write_tbl_columns(), which (for csv tables) formats and streams
+    each table out in chunks of basins.
     
     Getting the field order just right is a big deal.
     """
-    import csv
+
+    for tbl in doctbl_d:
+        if len(doctbl_d[tbl]['varlst']) > 0:
+            fldnameseq, writeseq, codetables = ordered_out_columns(doctbl_d[tbl], doc_d, data_d)
+
+            # write requested fields to table, in the requested format
+            gntblio.write_tbl_columns(doctbl_d[tbl]['filepath'], fldnameseq, writeseq, \
+                                      doctbl_d[tbl].get('format', 'csv'), codetables)
+
+
+def ordered_out_columns(tbl_d, doc_d, data_d):
+    """ Return (fldnameseq, writeseq, codetables), the field names and variable
+    arrays of output table tbl_d (a doctbl_d[tbl] entry), in field order.
+    Categorical (coded) variables (see ExportVar()) are translated to their
+    labels, except in columnar tables, which keep the codes; their code tables
+    are then returned in codetables[fieldname].
+    """
+    keepcodes = tbl_d.get('format', 'csv') == 'columnar'
+    fldnameseq = []
+    writeseq = []
+    codetables = {}
+    # remove vars that were never written out to the OUT dict
+    # either by choice or by oversight. Alternatively, write out None?
+    orderedflds = dict(list(zip(tbl_d['fieldorder'], tbl_d['varlst'])))
+    for ord,var in sorted(orderedflds.items()): 
+        if var in data_d and \
+        var in doc_d and doc_d[var]['flgwrite']:
+            fldnameseq.append(doc_d[var]['fieldname'])
+            if var not in OUTCODES:
+                writeseq.append(data_d[var])
+            elif keepcodes:
+                writeseq.append(data_d[var])
+                codetables[doc_d[var]['fieldname']] = OUTCODES[var]
+            else:
+                writeseq.append(OUTCODES[var].take(data_d[var]))
+
+    return fldnameseq, writeseq, codetables
 
 
+def write_batch_arrays(doctbl_d, doc_d, data_d, names, batchcols=(), npzsuffix="", \
+                       stacked=False):
+    """ Write out the (n_batch, n_basins) variables of a batched run (see runbatch()
+    and runsweep()); names are the batch member (scenario or sample) names.
+    csv and columnar tables are written once per batch member, with the member
+    name appended to the file name (eg, c00_NEWS2Output_GO2030.csv).
+    npz tables, and every table if stacked, are written as a single stacked
+    archive (with npzsuffix appended to the file name, and a .npz extension),
+    holding first the batchcols (name, array) pairs, eg ('scenario', scenario
+    names), indexed like the first array axis.
+    """
     for tbl in doctbl_d:
         if len(doctbl_d[tbl]['varlst']) > 0:
-            fldnameseq = []
-            writeseq = []
-            # remove vars that were never written out to the OUT dict
-            # either by choice or by oversight. Alternatively, write out None?
-            orderedflds = dict(list(zip(doctbl_d[tbl]['fieldorder'], doctbl_d[tbl]['varlst'])))
-            for ord,var in sorted(orderedflds.items()): 
-                if var in data_d and \
-                var in doc_d and doc_d[var]['flgwrite']:
-                    fldnameseq.append(doc_d[var]['fieldname'])
-                    writeseq.append("data_d['" + var + "']")
-
-            # write requested fields to csv table
-            fp = open(doctbl_d[tbl]['filepath'], "w", newline='')
-            csvwriter = csv.writer(fp)
-            csvwriter.writerow(fldnameseq)
-            csvwriter.writerows(eval("zip(" + ",".join(writeseq) + ")"))
-
-            fp.close()
+            fldnameseq, writeseq, codetables = ordered_out_columns(doctbl_d[tbl], doc_d, data_d)
+            filepath, tblformat = doctbl_d[tbl]['filepath'], doctbl_d[tbl].get('format', 'csv')
+            fileroot, fileext = os.path.splitext(filepath)
+
+            if tblformat == 'npz' or stacked:
+                if tblformat != 'npz':
+                    fileext = ".npz"
+                gntblio.write_npz_columns(fileroot + npzsuffix + fileext, \
+                                          [fld for fld, col in batchcols] + fldnameseq, \
+                                          [col for fld, col in batchcols] + writeseq)
+            else:
+                for idx, name in enumerate(names):
+                    # shared, 1-D arrays (BasinID) are written as is
+                    memberseq = [col[idx] if col.ndim == 2 else col for col in writeseq]
+                    gntblio.write_tbl_columns(fileroot + "_" + name + fileext, \
+                                              fldnameseq, memberseq, tblformat, codetables)
 
 
 def cfg_outvars_order(fname_cfg_var, doctbl_d, doc_d):
@@ -721,7 +1869,7 @@ def cfg_outvars_order(fname_cfg_var, doctbl_d, doc_d):
         if FLAGS['verbose']: print("genvars sorted: ", gv, genvars_d[gv]['p'], genvars_d[gv]['var'])
 
     # open file, suck in all lines, close file
-    f = open(fname_cfg_var, "r")
+    f = open(os.path.join(FLAGS.get('CfgPath', fpath_dev), fname_cfg_var), "r")
     cfg_lines = f.readlines()
     f.close()
 
@@ -762,13 +1910,16 @@ def cfg_outvars_order(fname_cfg_var, doctbl_d, doc_d):
             ord_offset -= 1
 
 
-def ExportVar(varsave, varname, param=None):
+def ExportVar(varsave, varname, param=None, labels=None):
     ''' Export variable (array) to the gloabl OUT dictionary, to make it
     available for writing out to files. If variable is actually a literal
     (single value) and not a full-length numpy array, expand it to full-length
     float32 numpy array using IN['BasinID'] to extract the length.
     If param is not None, the variable has a generic name and must be
     expanded.
+    If labels is not None, the variable is categorical: an integer code array,
+    with code table labels (label = labels[code]), registered in OUTCODES.
+    With FLAGS['ShowGraph'], the calling model step is recorded (gngraph.record_output()).
     '''
     global OUT
     
@@ -778,20 +1929,38 @@ def ExportVar(varsave, varname, param=None):
     # ARRAYS)!!! IF IN['BasinID'].size == 1, VARIABLE STILL NEEDS TO BE CONVERTED 
     # TO NUMPY ARRAY IF IT'S A SCALAR!]
     ExpandToArrayFlg = False
-    if ny.isscalar(varsave) or len(varsave) == 1:
+    if labels is not None:
+        OUTCODES[varname if param == None else param + varname] = labels
+    elif ny.isscalar(varsave) or ny.size(varsave) == 1:
         # Expand only if scalar or array is not a numpy string-type
         # (There are no foreseeable cases of string scalars that would be exported)
         # But must first test if variable is a numpy array!
         if isinstance(varsave, ny.ndarray):
-            if 'string' not in varsave.dtype.name:
+            if varsave.dtype.kind not in 'SU':
                 ExpandToArrayFlg = True
         else:
             ExpandToArrayFlg = True
     
+    # In batched runs (RUN['batch']: scenarios or calibration constant samples,
+    # see runbatch() and runsweep() in globalnews.py), full-size arrays are
+    # (n_batch, n_basins): arrays computed only from inputs or constants shared
+    # by the whole batch, eg (n_basins) or (n_batch, 1), are broadcast to that shape
+    fullshape = IN['BasinID'].shape
+    if RUN.get('batch'):
+        fullshape = (len(RUN['batch']),) + fullshape
+        if isinstance(varsave, ny.ndarray) and not ExpandToArrayFlg \
+           and varsave.shape != fullshape:
+            varsave = ny.broadcast_to(varsave, fullshape).copy()
+
+    # Floating point arrays are kept at the compute precision, RUN['dtype']
+    dtype = RUN.get('dtype', 'float64')
     if ExpandToArrayFlg:
-        varsave = ny.array(varsave, dtype='float64') \
-                  * ny.ones(IN['BasinID'].size)
+        varsave = ny.array(varsave, dtype=dtype) \
+                  * ny.ones(fullshape, dtype=dtype)
         #varsave = ny.array(varsave, dtype='float32') \
+    elif isinstance(varsave, ny.ndarray) and varsave.dtype.kind == 'f' \
+         and varsave.dtype != dtype:
+        varsave = varsave.astype(dtype)
     
     if param == None:
         OUT[varname] = varsave
@@ -799,6 +1968,10 @@ def ExportVar(varsave, varname, param=None):
         # generic var name
         OUT[param + varname] = varsave
 
+    # the calling model step, for the --graph output lineage (see gngraph.describe_outputs())
+    gngraph.record_output(varname if param == None else param + varname, \
+                          sys._getframe(1).f_code.co_name, param)
+
     # The handling of generic var names will only work if the parameter
     # is the first element of the var name!! That's very limiting and
     # will need to be generalized
@@ -843,6 +2016,86 @@ def PopulateCfgVars(fname_cfg, steptype):
 
 R_MIN = 0.003  # 3 mm/yr
 
+# Input variables (IN keys) read by each dissolved nutrient form sub-model,
+# including its Calc_*() functions and SourceContrib(). Used by invars_required()
+# to load only the input columns (and tables) needed by the requested forms.
+INVARS_DISSOLVED = { \
+'DIN': ('A','Rnat','agric','FQrem','D_DIN','KoppenGrpAperc','hwfrem_N_aspct',
+        'RSpntExc_N','WSdif_fe_N','WSdif_ma_N','WSdif_ex_N',
+        'WSdif_fix_ant_N','WSdif_dep_ant_N','WSdif_fix_nat_N','WSdif_dep_nat_N'),
+'DIP': ('A','Rnat','agric','FQrem','D_DIP','RSpntExc_P','RSpntDet_P',
+        'WSdif_fe_P','WSdif_ma_P','WSdif_ex_P'),
+'DON': ('A','Rnat','agric','FQrem','RSpntExc_N','WSdif_fe_N','WSdif_ma_N','WSdif_ex_N'),
+'DOP': ('A','Rnat','agric','FQrem','RSpntExc_P','RSpntDet_P',
+        'WSdif_fe_P','WSdif_ma_P','WSdif_ex_P'),
+'DOC': ('A','Rnat','FQrem','W_pct'),
+'DSi': ('A','Rnat','precip','gslope','bulkdens','frvolclith','D_TSS'),
+'DIC': ('A',) \
+}
+
+
+# Intermediate quantities shared by several sub-model steps (see gngraph).
+# Each is computed once per run, on first use, and freed after its last use.
+gngraph.declare('Rnat_m', ('IN.Rnat',), lambda Rnat: Rnat / 1000.0, \
+    "Rnat in meters/yr (input is in mm/yr)")
+gngraph.declare('RnatArid', ('Rnat_m',), lambda Rnat: Rnat < R_MIN, \
+    "arid basins (Rnat < R_MIN)")
+gngraph.declare('Agfr', ('IN.agric',), lambda agric: agric / 100.0, \
+    "agricultural area fraction (0-1)")
+gngraph.declare('WSdif_fema', ('IN.WSdif_fe_{p}', 'IN.WSdif_ma_{p}'), \
+    lambda fe, ma: fe + ma, "fertilizer + manure diffuse inputs of element p")
+gngraph.declare('FErivws', ('OUT.{p}FEriv', 'OUT.{p}FEws'), \
+    lambda FEriv, FEws: FEriv * FEws, "FEriv_F * FEws_F")
+gngraph.declare('FErivwsnat', ('OUT.{p}FEriv', 'OUT.{p}FEws_nat'), \
+    lambda FEriv, FEws_nat: FEriv * FEws_nat, "FEriv_F * FEws_nat_F")
+gngraph.declare('FErivpnt', ('OUT.{p}FEriv', 'OUT.{p}FEpnt'), \
+    lambda FEriv, FEpnt: FEriv * FEpnt, "FEriv_F * FEpnt_F")
+
+
+def graph_uses(step, F=None):
+    ''' Return the gngraph nodes used by a sub-model step (function name, and
+    nutrient form F). Each step releases them (gngraph.release()) when done.
+    '''
+    E = F[-1] if F else None
+    if step in ('Calc_WSExportFunc', 'model_particulate'):
+        return ['Rnat_m', 'RnatArid']
+    elif step == 'DSiModel':
+        return ['RnatArid']
+    elif step == 'model_dissolved':
+        return ['Agfr'] if F in ('DIN', 'DIP', 'DON', 'DOP') else []
+    elif step == 'Calc_WSdifExplicit':
+        return ['WSdif_fema[%s]' % E] if E in ('N', 'P') else []
+    elif step == 'SourceContrib':
+        uses = ['FErivws[%s]' % F, 'FErivpnt[%s]' % F]
+        if F == 'DIN':
+            uses.append('FErivwsnat[%s]' % F)
+        elif E in ('N', 'P'):
+            uses.append('WSdif_fema[%s]' % E)
+        return uses
+    return []
+
+
+def graph_schedule(params_dissolved, params_particulate):
+    ''' Schedule the gngraph node uses of the sub-model steps run for the
+    requested dissolved and particulate forms. Return the list of node uses.
+    '''
+    steps = []
+    for F in params_dissolved:
+        if F == 'DSi':
+            steps.append(('DSiModel', F))
+        elif F != 'DIC':
+            steps += [(step, F) for step in ('Calc_WSExportFunc', 'Calc_WSdifExplicit', \
+                                             'model_dissolved', 'SourceContrib')]
+    if len(params_particulate):
+        steps.append(('model_particulate', None))
+
+    uses = []
+    for step, F in steps:
+        uses += graph_uses(step, F)
+    gngraph.schedule(uses)
+
+    return uses
+
 
 def model_dissolved(run_forms):
     """ Dissolved nutrient form sub-models.
@@ -876,9 +2129,10 @@ def model_dissolved(run_forms):
                 RSdif_ec_ant_F = 0.0
                 RSdif_ec_nat_F = RSdif_ec_F
             else:
-                Agfr = IN['agric'] / 100.0
+                Agfr = gngraph.get('Agfr')
                 RSdif_ec_ant_F =      Agfr  * RSdif_ec_F
                 RSdif_ec_nat_F = (1 - Agfr) * RSdif_ec_F
+            gngraph.release(graph_uses('model_dissolved', F))
             
             # Total diffuse River Sources: anthropogenic vs. natural
             RSdif_ant_F = RSdif_expl_ant_F + RSdif_ec_ant_F
@@ -916,9 +2170,6 @@ def DSiModel():
     """ DSi model. A multiple linear regression model, from Beusen et al. (2009)
     """
 
-    # Runoff must be in meters/yr, but current input is in mm/yr
-    Rnat = IN['Rnat'] / 1000.0
-
     # Truncate (clip) input (independent) variables to the acceptable range 
     # before using in T_DSiyldNAT equation
     IndepVarsTruncate = lambda var,minval,maxval: IN[var].clip(min=minval,max=maxval)
@@ -936,10 +2187,10 @@ def DSiModel():
     Yld_DSi_pred = (boxcox_lambda*T_Yld_DSi_pred + 1) ** (1/boxcox_lambda)
 
     # Set Yld_DSi_pred to 0 in arid basins (Rnat < R_MIN)
-    Yld_DSi_pred[Rnat < R_MIN] = 0.0
+    Yld_DSi_pred = ny.where(gngraph.get('RnatArid'), 0.0, Yld_DSi_pred)
     
     # Set yield to 0 if bulk density is ~ 0
-    Yld_DSi_pred[IN['bulkdens'] < 0.01] = 0.0
+    Yld_DSi_pred = ny.where(IN['bulkdens'] < 0.01, 0.0, Yld_DSi_pred)
 
     # Unit conversion of yield, to kg Si/km2/yr
     Yld_DSi_pred *= 1000*(28.09/60.09)
@@ -948,6 +2199,8 @@ def DSiModel():
     D_TSS = IN['D_TSS']
     Yld_DSi = (1 - D_TSS) * Yld_DSi_pred
 
+    gngraph.release(graph_uses('DSiModel'))
+
     return Yld_DSi
 
 
@@ -1010,7 +2263,7 @@ def Calc_WSExportFunc(F):
     """
 
     ccalf = CCAL[F]
-    Rnat = IN['Rnat'] / 1000.0 # Runoff must be in meters/yr, but input is in mm/yr
+    Rnat = gngraph.get('Rnat_m') # Runoff must be in meters/yr, but input is in mm/yr
 
     # Calculate f_F runoff function
     if F in ('DIN', 'DON', 'DOP', 'DOC'):
@@ -1020,8 +2273,7 @@ def Calc_WSExportFunc(F):
         # where exponent is negative. More generally: f_F -> 0 as Rnat -> 0.
         # Net effect of setting near-zero Rnat values to a very low min value
         # is to set f_F ~ 0 as Rnat -> 0
-        Rgt0 = Rnat
-        Rgt0[Rnat < 0.00001] = 0.0000001
+        Rgt0 = ny.where(Rnat < 0.00001, 0.0000001, Rnat)
         f_F = 1/(1 + (Rgt0/ccalf['a']) ** -ccalf['b'])
     
     # Set f_F (and therefore FEws_F and FEws_nat_F) to 0 for arid basins, 
@@ -1029,7 +2281,7 @@ def Calc_WSExportFunc(F):
     # Point sources in N & P models can produce yield > 0 when Rnat = 0 (more 
     # generally, Rnat < R_MIN). But DOC model has no point sources, so yield = 0
     # when Rnat = 0 (Rnat < R_MIN). This creates an inconsistency for DOM yields.
-    f_F[Rnat < R_MIN] = 0.0
+    f_F = ny.where(gngraph.get('RnatArid'), 0.0, f_F)
 
     FEws_F = ccalf['e'] * f_F
 
@@ -1046,20 +2298,22 @@ def Calc_WSExportFunc(F):
 
     # For DIN, enforce max value for FEws_F and calculate final FEws_nat_F
     if F == 'DIN':
-        FEws_F[FEws_F > 1.0] = 1.0
+        FEws_F = ny.where(FEws_F > 1.0, 1.0, FEws_F)
 
         # FEws_nat. Currently only applies
         # in basins predominantly in the Humid Tropics
         HumidTropicsMask = (IN['KoppenGrpAperc'] > 50)
-        FEws_nat_F[HumidTropicsMask] = ccalf['enat'] * f_F[HumidTropicsMask]
+        FEws_nat_F = ny.where(HumidTropicsMask, ccalf['enat'] * f_F, FEws_nat_F)
         # This constraint is probably implicit, but enforcing
         # it explicitly is a good, safe practice
-        FEws_nat_F[FEws_nat_F > 1.0] = 1.0
+        FEws_nat_F = ny.where(FEws_nat_F > 1.0, 1.0, FEws_nat_F)
     
     # SAVE VARIABLES FOR (OPTIONAL) EXPORT TO FILE
     ExportVar(FEws_F, 'FEws', F)
     ExportVar(FEws_nat_F, 'FEws_nat', F)
 
+    gngraph.release(graph_uses('Calc_WSExportFunc', F))
+
     return FEws_F, FEws_nat_F, f_F
 
 
@@ -1073,7 +2327,7 @@ def Calc_FEriv(F):
         A = IN['A']
         L_F = 0.0605 * log(A) - 0.0443
         # Enforce max value
-        L_F[L_F > 0.65] = 0.65
+        L_F = ny.where(L_F > 0.65, 0.65, L_F)
     else:
         L_F = 0
 
@@ -1084,11 +2338,11 @@ def Calc_FEriv(F):
     if F == 'DIN':
         D_F = IN['D_DIN']
         # Enforce max value
-        D_F[D_F > 0.965] = 0.965
+        D_F = ny.where(D_F > 0.965, 0.965, D_F)
     elif F == 'DIP':
         D_F = IN['D_DIP']
         # Enforce max value
-        D_F[D_F > 0.85] = 0.85
+        D_F = ny.where(D_F > 0.85, 0.85, D_F)
     else:  # DON, DOP, DOC
         D_F = 0
 
@@ -1103,7 +2357,7 @@ def Calc_FEriv(F):
     # be interpreted as a "Fraction Exported", logically it should be <= 1.
     # However, that's not how the other models where defined and calibrated.
     if F == 'DIN':
-        FEriv_F[FEriv_F > 1.0] = 1.0
+        FEriv_F = ny.where(FEriv_F > 1.0, 1.0, FEriv_F)
 
     # SAVE VARIABLES FOR (OPTIONAL) EXPORT TO FILE
     ExportVar(FEriv_F, 'FEriv', F)
@@ -1146,18 +2400,16 @@ def Calc_WSdifExplicit(F):
     E = F[-1]
     
     if E in ('N', 'P'): # DIN, DIP, DON, DOP
-        WSdif_fe_E = IN['WSdif_fe_'+E]
-        WSdif_ma_E = IN['WSdif_ma_'+E]
         WSdif_ex_E = IN['WSdif_ex_'+E]
         
-        WSdif_ant_E = WSdif_fe_E + WSdif_ma_E - WSdif_ex_E
+        WSdif_ant_E = gngraph.get('WSdif_fema[%s]' % E) - WSdif_ex_E
         WSdif_nat_E = 0.0
         if F == 'DIN':
             # WSdif_fix_E and WSdif_dep_E are each provided as two separate input files,
             # nat & agr (ant)
             WSdif_fix_ant_E = IN['WSdif_fix_ant_N']
             WSdif_dep_ant_E = IN['WSdif_dep_ant_N']
-            WSdif_ant_E += WSdif_fix_ant_E + WSdif_dep_ant_E
+            WSdif_ant_E = WSdif_ant_E + (WSdif_fix_ant_E + WSdif_dep_ant_E)
             
             WSdif_fix_nat_E = IN['WSdif_fix_nat_N']
             WSdif_dep_nat_E = IN['WSdif_dep_nat_N']
@@ -1165,7 +2417,7 @@ def Calc_WSdifExplicit(F):
 
         # Enforce WSdif_ant_E min value for net inputs balance.
         # WSdif_nat_E is always >= 0
-        WSdif_ant_E[WSdif_ant_E < 0.0] = 0  # 0.0
+        WSdif_ant_E = ny.where(WSdif_ant_E < 0.0, 0.0, WSdif_ant_E)
     else:  # DOC
         WSdif_ant_E = 0.0
         WSdif_nat_E = 0.0
@@ -1175,11 +2427,41 @@ def Calc_WSdifExplicit(F):
     ExportVar(WSdif_ant_E, 'WSdif_ant_'+E, F)
     ExportVar(WSdif_nat_E, 'WSdif_nat_'+E, F)
 
+    gngraph.release(graph_uses('Calc_WSdifExplicit', F))
+
     return WSdif_ant_E, WSdif_nat_E
 
 
 # =====================================================================
 
+# Dominant (max) source code tables: the YS1Max and YS2Max outputs are int8
+# codes, label = table[code]; code 0 is 'undef' (all sources are zero), and
+# codes 1, 2, ... follow the order in which the source arrays are stacked
+# in SourceContrib()
+YS1MAX_LABELS = ny.array(['undef', 'YS1pnt', 'YS1dif_ant', 'YS1dif_nat'], dtype='|S12')
+YS2MAX_LABELS = { \
+'DIN': ny.array(['undef', 'YS2pntExc', 'YS2difFe_ant', 'YS2difMa_ant', 'YS2difFix_ant',
+                 'YS2difDep_ant', 'YS2difFix_nat', 'YS2difDep_nat'], dtype='|S15'),
+'DIP': ny.array(['undef', 'YS2pntExc', 'YS2pntDet', 'YS2difFe_ant', 'YS2difMa_ant',
+                 'YS2difWth_ant', 'YS2difWth_nat'], dtype='|S15'),
+'DON': ny.array(['undef', 'YS2pntExc', 'YS2difFe_ant', 'YS2difMa_ant',
+                 'YS2difLch_ant', 'YS2difLch_nat'], dtype='|S15'),
+'DOP': ny.array(['undef', 'YS2pntExc', 'YS2pntDet', 'YS2difFe_ant', 'YS2difMa_ant',
+                 'YS2difLch_ant', 'YS2difLch_nat'], dtype='|S15'),
+'DOC': ny.array(['undef', 'YS2difWet', 'YS2difDry'], dtype='|S15') \
+}
+
+
+def max_source_codes(srcall):
+    ''' Return the int8 dominant source codes of the stacked source arrays srcall
+    (sources along the first axis): 1 + index of the max source, or 0 (undef)
+    where all sources are zero.
+    '''
+    codes = srcall.argmax(0).astype('int8') + 1
+    codes[srcall.max(0) == 0] = 0
+    return codes
+
+
 def SourceContrib(F):
     """ Determine Source Distribution (apportionment) and dominant (max) source.
     """
@@ -1193,19 +2475,18 @@ def SourceContrib(F):
     # (though currently this is relevant only for DIN, and only 
     # in basins predominantly in the Humid Tropics
     FEriv      = OUT[F + 'FEriv']
-    FErivws    = FEriv * OUT[F + 'FEws']
-    FErivwsnat = FEriv * OUT[F + 'FEws_nat']
+    FErivws    = gngraph.get('FErivws[%s]' % F)
+    FErivpnt   = gngraph.get('FErivpnt[%s]' % F)
 
     RSdif_ant_F = OUT[F + 'RSdif_ant']
     RSdif_nat_F = OUT[F + 'RSdif_nat']
 
     YS1dif_ant_F = FEriv * RSdif_ant_F
     YS1dif_nat_F = FEriv * RSdif_nat_F
-    YS1pnt_F     = FEriv * OUT[F + 'FEpnt'] * OUT[F + 'RSpnt_'+E]
+    YS1pnt_F     = FErivpnt * OUT[F + 'RSpnt_'+E]
     
-    # coarse-level source attribution
-    YS1MaxDict_F = {0:'YS1pnt', 1:'YS1dif_ant', 2:'YS1dif_nat'}
-    YS1all = ny.vstack((YS1pnt_F, YS1dif_ant_F, YS1dif_nat_F))
+    # coarse-level source attribution (YS1MAX_LABELS order)
+    YS1all = ny.stack(ny.broadcast_arrays(YS1pnt_F, YS1dif_ant_F, YS1dif_nat_F))
 
     if E in ('N', 'P'):  # DIN, DIP, DON, DOP
         # Load variables that are used by all/most N & P models
@@ -1218,18 +2499,18 @@ def SourceContrib(F):
         if F == 'DIN':
             WSdif_gross_ant_E = OUT[F + 'WSdif_ant_'+E] + WSdif_ex_E
         else:
-            WSdif_gross_ant_E = WSdif_fe_E + WSdif_ma_E
+            WSdif_gross_ant_E = gngraph.get('WSdif_fema[%s]' % E)
         
         expfr = ny.where(WSdif_gross_ant_E > 0.0, WSdif_ex_E/WSdif_gross_ant_E, 1.0)
         G = 1. - expfr
         # Impose "mass-balance" constraint on G
         # (equivalent to WSdif_ant_E[WSdif_ant_E < 0.0] = 0.0)
-        G[G < 0.0] = 0.0
+        G = ny.where(G < 0.0, 0.0, G)
 
         YS2difMa_ant_F = (FErivws * WSdif_ma_E) * G
         YS2difFe_ant_F = (FErivws * WSdif_fe_E) * G
 
-        YS2pntExc_F = FEriv * OUT[F + 'FEpnt'] * OUT[F + 'RSpntExc_'+E]
+        YS2pntExc_F = FErivpnt * OUT[F + 'RSpntExc_'+E]
 
         if F == 'DIN':
             WSdif_fix_ant_E = IN['WSdif_fix_ant_N']
@@ -1241,16 +2522,14 @@ def SourceContrib(F):
             YS2difDep_ant_F = (FErivws * WSdif_dep_ant_E) * G
             
             # "Natural" sources (no crop export to account for)
+            FErivwsnat = gngraph.get('FErivwsnat[%s]' % F)
             YS2difFix_nat_F = FErivwsnat * WSdif_fix_nat_E
             YS2difDep_nat_F = FErivwsnat * WSdif_dep_nat_E
             
-            # fine-level source attribution
-            YS2MaxDict_F = {0:'YS2pntExc', 1:'YS2difFe_ant', 2:'YS2difMa_ant', 
-                            3:'YS2difFix_ant', 4:'YS2difDep_ant',
-                            5:'YS2difFix_nat', 6:'YS2difDep_nat'}
-            YS2all = ny.vstack((YS2pntExc_F, YS2difFe_ant_F, YS2difMa_ant_F, 
-                                YS2difFix_ant_F, YS2difDep_ant_F, 
-                                YS2difFix_nat_F, YS2difDep_nat_F))
+            # fine-level source attribution (YS2MAX_LABELS order)
+            YS2all = ny.stack(ny.broadcast_arrays(YS2pntExc_F, YS2difFe_ant_F, YS2difMa_ant_F, 
+                                                  YS2difFix_ant_F, YS2difDep_ant_F,
+                                                  YS2difFix_nat_F, YS2difDep_nat_F))
         else:  # DIP, DON, DOP
             # Weathering/"Leaching" from agricultural areas
             # at same rate as in natural systems
@@ -1261,7 +2540,7 @@ def SourceContrib(F):
             # is from YS1dif_nat_F
             YS2dif_ec_nat_F = YS1dif_nat_F
 
-            # fine-level source attribution
+            # fine-level source attribution (YS2MAX_LABELS order)
             # Use different names for weathering and leaching
             if F == 'DIP':
                 LchWth = 'Wth'
@@ -1269,42 +2548,34 @@ def SourceContrib(F):
                 LchWth = 'Lch'
             
             if F == 'DON':
-                YS2MaxDict_F = {0:'YS2pntExc', 1:'YS2difFe_ant', 2:'YS2difMa_ant', 
-                                3:'YS2dif'+LchWth+'_ant', 4:'YS2dif'+LchWth+'_nat'}
-                YS2all = ny.vstack((YS2pntExc_F, YS2difFe_ant_F, YS2difMa_ant_F, 
-                                    YS2dif_ec_ant_F, YS2dif_ec_nat_F))
+                YS2all = ny.stack(ny.broadcast_arrays(YS2pntExc_F, YS2difFe_ant_F, YS2difMa_ant_F, 
+                                                      YS2dif_ec_ant_F, YS2dif_ec_nat_F))
             else:
                 # YS2pntDet_F is 0 for N
-                YS2pntDet_F = FEriv * OUT[F + 'FEpnt'] * OUT[F + 'RSpntDet_'+E]
+                YS2pntDet_F = FErivpnt * OUT[F + 'RSpntDet_'+E]
 
-                YS2MaxDict_F = {0:'YS2pntExc', 1:'YS2pntDet', 
-                                2:'YS2difFe_ant', 3:'YS2difMa_ant', 
-                                4:'YS2dif'+LchWth+'_ant', 5:'YS2dif'+LchWth+'_nat'}
-                YS2all = ny.vstack((YS2pntExc_F, YS2pntDet_F, YS2difFe_ant_F, YS2difMa_ant_F,
-                                    YS2dif_ec_ant_F, YS2dif_ec_nat_F))
+                YS2all = ny.stack(ny.broadcast_arrays(YS2pntExc_F, YS2pntDet_F, YS2difFe_ant_F, YS2difMa_ant_F,
+                                                      YS2dif_ec_ant_F, YS2dif_ec_nat_F))
     else: # DOC
         # just wetlands vs. non-wetlands (dry)
         YS2difWet_F = FEriv * OUT[F + 'RSdif_ec_wet']
         YS2difDry_F = FEriv * OUT[F + 'RSdif_ec_dry']
 
-        YS2MaxDict_F = {0:'YS2difWet', 1:'YS2difDry'}
-        YS2all = ny.vstack((YS2difWet_F, YS2difDry_F))
+        YS2all = ny.stack(ny.broadcast_arrays(YS2difWet_F, YS2difDry_F))
 
+    gngraph.release(graph_uses('SourceContrib', F))
 
     # SAVE VARIABLES FOR (OPTIONAL) EXPORT TO FILE
 
     # SELECT AND EXPORT MAX SOURCE
-    # When all src* arrays are zero, srcMax is assigned the value "undef"
-    YS2MaxIdx_F = YS2all.argmax(0)
-    YS2Max_F = ny.array([YS2MaxDict_F[src] for src in YS2MaxIdx_F], dtype='|S15')
-    YS2Max_F[YS2all.max(0) == 0] = 'undef'
-    ExportVar(YS2Max_F, 'YS2Max', F)
+    # When all src* arrays are zero, srcMax is assigned the code of "undef"
+    # Source arrays are stacked along a new first axis (sources x basins, or
+    # sources x scenarios x basins in batched runs). Max sources are exported
+    # as int8 codes, translated to labels only when written out
+    ExportVar(max_source_codes(YS2all), 'YS2Max', F, labels=YS2MAX_LABELS[F])
 
     if E in ('N', 'P'):  # DIN, DIP, DON, DOP
-        YS1MaxIdx_F = YS1all.argmax(0)
-        YS1Max_F = ny.array([YS1MaxDict_F[src] for src in YS1MaxIdx_F], dtype='|S12')
-        YS1Max_F[YS1all.max(0) == 0] = 'undef'
-        ExportVar(YS1Max_F, 'YS1Max', F)
+        ExportVar(max_source_codes(YS1all), 'YS1Max', F, labels=YS1MAX_LABELS)
 
         ExportVar(YS1pnt_F, 'YS1pnt', F)
         ExportVar(YS1dif_ant_F, 'YS1dif_ant', F)
@@ -1337,25 +2608,30 @@ R_MIN = 0.003  # 3 mm/yr
 # in the basins used to develop the regression model (Table A1 in Beusen et al 2005)
 Yld_TSS_pred_MAX = 5000  # ton/km2/yr
 
+# Input variables (IN keys) read by the particulate sub-models (all forms),
+# including Calc_Yld_TSS_pred(). See INVARS_DISSOLVED.
+INVARS_PARTICULATE = ('A','Rnat','D_TSS','marggrass','wetlndrice','frnrprecp','frnrslope','LiClass')
+
 def model_particulate(run_forms):
     """ Main body of particulates sub-models.
     """
     
     # Runoff must be in meters/yr, but current input is in mm/yr
-    Rnat = IN['Rnat'] / 1000.0
+    Rnat = gngraph.get('Rnat_m')
+    RnatArid = gngraph.get('RnatArid')
 
     # Calculate Yld_TSS_pred and Yld_TSS, set to 0 in arid basins (Rnat < R_MIN),
     # and to Yld_TSS_pred_MAX if Yld_TSS_pred > Yld_TSS_pred_MAX
     D_TSS = IN['D_TSS']
     Yld_TSS_pred = Calc_Yld_TSS_pred()
-    Yld_TSS_pred[Rnat < R_MIN] = 0.0
-    Yld_TSS_pred[Yld_TSS_pred > Yld_TSS_pred_MAX] = Yld_TSS_pred_MAX
+    Yld_TSS_pred = ny.where(RnatArid, 0.0, Yld_TSS_pred)
+    Yld_TSS_pred = ny.where(Yld_TSS_pred > Yld_TSS_pred_MAX, Yld_TSS_pred_MAX, Yld_TSS_pred)
 
     Yld_TSS = (1 - D_TSS) * Yld_TSS_pred
 
     # No-data flag set when Yld_TSS = 0 or Rnat < R_MIN. Because Yld_TSS = 0 when
     # either Yld_TSS_pred = 0 or D_TSS = 1, both situations are accounted for.
-    NoFluxFlg = ((Yld_TSS == 0) | (Rnat < R_MIN))
+    NoFluxFlg = ((Yld_TSS == 0) | RnatArid)
     
     # Yld_TSS is already in ton/km2/yr ...
     Ld_TSS = Yld_TSS * IN['A']
@@ -1365,10 +2641,11 @@ def model_particulate(run_forms):
     # TSSc_pred blows up when Rnat = 0, logTSSc_pred when Rnat = 0 or Yld_TSS_pred = 0.
     TSSc_pred = Yld_TSS_pred / Rnat
     logTSSc_pred = log10(TSSc_pred)
+    gngraph.release(graph_uses('model_particulate'))
 
     # Correct for invalid cases (NoFluxFlg), which yield TSSpc_POC_pred errors
-    TSSc_pred[NoFluxFlg] = 0
-    Ld_TSS[NoFluxFlg] = 0
+    TSSc_pred = ny.where(NoFluxFlg, 0.0, TSSc_pred)
+    Ld_TSS = ny.where(NoFluxFlg, 0.0, Ld_TSS)
 
     # SAVE VARIABLES FOR (OPTIONAL) EXPORT TO FILE
     ExportVar(Yld_TSS, 'Yld_TSS')
@@ -1387,7 +2664,7 @@ def model_particulate(run_forms):
     # out of TSSpc_POC_pred at high TSS conc. is generally supported by the literature.
     # It could be implemented like this:   TSSpc_POC_pred[TSSc_pred > 2250] = 0.5
     # However, the Yld_TSS_pred_MAX implementations makes that unnecessary.
-    TSSpc_POC_pred[NoFluxFlg] = 0
+    TSSpc_POC_pred = ny.where(NoFluxFlg, 0.0, TSSpc_POC_pred)
 
     # nutrient form list is limited to particulate and actual 
     # model run forms ('parameters') in RUN['F']
@@ -1402,7 +2679,7 @@ def model_particulate(run_forms):
 
             # Correct for invalid cases (NoFluxFlg), which give TSSpc_POC_pred errors.
             # Then calculate POC & PN yields (kg/km2/yr) and loads (ton/yr)
-            TSSpc_F_pred[NoFluxFlg] = 0
+            TSSpc_F_pred = ny.where(NoFluxFlg, 0.0, TSSpc_F_pred)
 
             # PARTICULATE YIELD (kg/km2/yr) & LOAD (T/yr, or Mg/yr)
             # The Yld_F equation below is derived from these 3 equations:
@@ -1426,11 +2703,11 @@ def model_particulate(run_forms):
 
             # Correct for invalid cases (NoFluxFlg), which give TSSpc_POC_pred and therefore
             # Ld_F & Yld_F errors. Then calculate PP yield (kg/km2/yr) & percent (%)
-            Ld_F[NoFluxFlg] = 0
+            Ld_F = ny.where(NoFluxFlg, 0.0, Ld_F)
 
             Yld_F = 1000.0 * Ld_F / IN['A']
             TSSpc_F_pred = 100 * Yld_F / (1000*Yld_TSS)
-            TSSpc_F_pred[NoFluxFlg] = 0
+            TSSpc_F_pred = ny.where(NoFluxFlg, 0.0, TSSpc_F_pred)
 
 
         # CN = (TSSpc_POC_pred/12)/(PNpct/14) # Molar C:N ratio; calculate C:P and N:P ratios?
@@ -1462,16 +2739,19 @@ def Calc_Yld_TSS_pred():
     # class number 8 (ice) was assigned. See LithologySlope.xls.
     LithoChemCoef = {1:0.0, 2:1.0379,  3:0.9037, 4:0.3125, \
                      5:0.0, 6:-2.0678, 7:0.6694, 8:0.0}
-    # Map dominant lithology class number to corresponding coefficient
+    # Map dominant lithology class number to corresponding coefficient,
+    # through a class number-indexed lookup array
     LiClass = IN['LiClass']
-    LithoChem = [LithoChemCoef[i] for i in LiClass]
+    LithoChemLUT = ny.zeros(max(LithoChemCoef) + 1)
+    LithoChemLUT[list(LithoChemCoef.keys())] = list(LithoChemCoef.values())
+    LithoChem = LithoChemLUT[LiClass.astype(int)]
 
 
     # YIELD (ton/km2/yr) & LOAD (ton/yr), where 1 ton = 1 Mg
     Yld_TSS_pred = exp(0.0301*MargGrassPrc + 0.1234*WetlnRicePrc + \
                    0.2933*FrnrPrecp + 0.1027*FrnrSlope + LithoChem + 0.5522)
     # Set yield to 0 if lithology class is 8 (see comments above)
-    Yld_TSS_pred[LiClass == 8] = 0.0
+    Yld_TSS_pred = ny.where(LiClass == 8, 0.0, Yld_TSS_pred)
     
     return Yld_TSS_pred
 
@@ -14,9 +14,114 @@ Reader iterates over records in Dbase or Xbase files.
 Writer creates dbf files from Python sequences.
 
 Source: Text Source
+
+GNE modifications:
+10/18/2026: F fields are written as right-justified numbers, like N fields.
+10/18/2026: Ported to Python 3. The record block is read in one go, with
+ numpy.frombuffer, into a fixed-width structured array, and the fields are
+ parsed column-wise into numpy arrays (dbfreader_columns()); numeric fields
+ are float64 (with decimals) or int64, not Decimal. dbfwriter_columns() writes
+ numpy columns as one record buffer. dbfreader() and dbfwriter() keep their
+ record-based interface, on top of the column functions.
 """
 
-import struct, datetime, decimal, itertools
+import struct, datetime
+import numpy as ny
+
+# Single byte text encoding of character fields
+ENCODING = 'latin-1'
+
+
+def dbfheader(f):
+    """ Read the header of a Xbase DBF file (open for binary reads), leaving f
+    at the start of the records. Return (fieldnames, fieldspecs, numrec, lenrecord);
+    fieldspecs are (type, size, decimal places).
+    """
+    # See DBF format spec at:
+    #     http://www.pgts.com.au/download/public/xbase.htm#DBF_STRUCT
+
+    numrec, lenheader, lenrecord = struct.unpack('<xxxxLHH20x', f.read(32))
+    numfields = (lenheader - 33) // 32
+
+    fieldnames, fieldspecs = [], []
+    for fieldno in range(numfields):
+        name, typ, size, deci = struct.unpack('<11sc4xBB14x', f.read(32))
+        fieldnames.append(name.split(b'\0', 1)[0].decode(ENCODING))
+        fieldspecs.append((typ.decode(ENCODING), size, deci))
+
+    # the terminator, followed by any extra header bytes
+    terminator = f.read(lenheader - 32 - 32 * numfields)
+    assert terminator[:1] == b'\r'
+
+    return fieldnames, fieldspecs, numrec, lenrecord
+
+
+def record_dtype(fieldspecs, lenrecord=None):
+    """ Fixed-width numpy structured dtype of a DBF record: the deletion flag,
+    then one bytes field per DBF field (named f0, f1, ...).
+    """
+    names = ['DeletionFlag'] + ['f%d' % i for i in range(len(fieldspecs))]
+    formats = ['S1'] + ['S%d' % size for typ, size, deci in fieldspecs]
+    offsets = [0, 1]
+    for typ, size, deci in fieldspecs:
+        offsets.append(offsets[-1] + size)
+    # records may be padded beyond their fields (lenrecord)
+    itemsize = max(lenrecord or 0, offsets.pop())
+    return ny.dtype({'names':names, 'formats':formats, 'offsets':offsets, 'itemsize':itemsize})
+
+
+def parse_column(raw, typ, deci):
+    """ Parse the fixed-width bytes array raw of a DBF field of type typ into
+    a numpy array: N and F fields into float64 (with decimal places) or int64
+    (blank values are 0), D into datetime64[D] (blank values are NaT),
+    L into 'T', 'F' or '?', and other fields into right-stripped strings.
+    """
+    if typ in ('N', 'F'):
+        raw = ny.char.strip(ny.char.replace(raw, b'\0', b''))
+        raw = ny.where(raw == b'', b'0', raw)
+        if not deci:
+            try:
+                return raw.astype('int64')
+            except ValueError:
+                pass
+        return raw.astype('float64')
+    elif typ == 'D':
+        raw = ny.char.strip(raw)
+        digits = ny.ascontiguousarray(raw.astype('S8')).view('S1').reshape(-1, 8)
+        part = lambda i, j: ny.ascontiguousarray(digits[:, i:j]).view('S%d' % (j - i)).ravel()
+        iso = ny.char.add(ny.char.add(ny.char.add(part(0, 4), b'-'), ny.char.add(part(4, 6), b'-')), part(6, 8))
+        return ny.where(raw == b'', b'NaT', iso).astype('U10').astype('datetime64[D]')
+    elif typ == 'L':
+        flag = raw.astype('S1')
+        return ny.where(ny.isin(flag, [b'Y', b'y', b'T', b't']), 'T', \
+                        ny.where(ny.isin(flag, [b'N', b'n', b'F', b'f']), 'F', '?'))
+    else:
+        return ny.char.decode(ny.char.rstrip(raw), ENCODING)
+
+
+def dbfreader_columns(f, fieldnames=None):
+    """ Read a Xbase DBF file (open for binary reads) column-wise.
+    Return (names, fieldspecs, columns): the field names, their specs
+    (type, size, decimal places) and the list of field values as numpy arrays
+    (see parse_column()). If fieldnames is given, only those fields are
+    parsed and returned, in that order. Deleted records are skipped.
+    """
+    allnames, allspecs, numrec, lenrecord = dbfheader(f)
+    dtype = record_dtype(allspecs, lenrecord)
+    records = ny.frombuffer(f.read(numrec * dtype.itemsize), dtype=dtype, count=numrec)
+    records = records[records['DeletionFlag'] == b' ']
+
+    if fieldnames is None:
+        fieldnames = allnames
+    names, specs, columns = [], [], []
+    for name in fieldnames:
+        i = allnames.index(name)
+        typ, size, deci = allspecs[i]
+        names.append(name)
+        specs.append(allspecs[i])
+        columns.append(parse_column(records['f%d' % i], typ, deci))
+    return names, specs, columns
+
 
 def dbfreader(f):
     """Returns an iterator over records in a Xbase DBF file.
@@ -27,126 +132,121 @@ def dbfreader(f):
     If a record is marked as deleted, it is skipped.
 
     File should be opened for binary reads.
+    Numeric values are floats (fields with decimal places) or ints, dates
+    are datetime.date and character values are right-stripped strings.
 
     """
-    # See DBF format spec at:
-    #     http://www.pgts.com.au/download/public/xbase.htm#DBF_STRUCT
+    fieldnames, fieldspecs, columns = dbfreader_columns(f)
+    yield fieldnames
+    yield fieldspecs
+    for record in zip(*[column.tolist() for column in columns]):
+        yield list(record)
 
-    numrec, lenheader = struct.unpack('<xxxxLH22x', f.read(32))    
-    numfields = (lenheader - 33) // 32
-
-    fields = []
-    for fieldno in xrange(numfields):
-        name, typ, size, deci = struct.unpack('<11sc4xBB14x', f.read(32))
-        name = name.replace('\0', '')       # eliminate NULs from string   
-        fields.append((name, typ, size, deci))
-    yield [field[0] for field in fields]
-    yield [tuple(field[1:]) for field in fields]
-
-    terminator = f.read(1)
-    assert terminator == '\r'
-
-    fields.insert(0, ('DeletionFlag', 'C', 1, 0))
-    fmt = ''.join(['%ds' % fieldinfo[2] for fieldinfo in fields])
-    fmtsiz = struct.calcsize(fmt)
-    for i in xrange(numrec):
-        record = struct.unpack(fmt, f.read(fmtsiz))
-        if record[0] != ' ':
-            continue                        # deleted record
-        result = []
-        for (name, typ, size, deci), value in itertools.izip(fields, record):
-            if name == 'DeletionFlag':
-                continue
-            if typ == "N":
-                value = value.replace('\0', '').lstrip()
-                if value == '':
-                    value = 0
-                elif deci:
-                    value = decimal.Decimal(value)
-                else:
-                    value = int(value)
-            elif typ == 'D':
-                y, m, d = int(value[:4]), int(value[4:6]), int(value[6:8])
-                value = datetime.date(y, m, d)
-            elif typ == 'L':
-                value = (value in 'YyTt' and 'T') or (value in 'NnFf' and 'F') or '?'
-            result.append(value)
-        yield result
 
+def format_column(values, typ, size, deci):
+    """ Format the values of a DBF field of type typ (see dbfwriter()) as a
+    fixed-width (size) bytes array.
+    """
+    if typ in ('N', 'F'):
+        if deci:
+            text = ny.char.mod('%%.%df' % deci, ny.asarray(values, dtype='float64'))
+        else:
+            text = ny.asarray(values, dtype='int64').astype('U')
+        if len(text) and ny.char.str_len(text).max() > size:
+            raise ValueError("numeric values do not fit in field width %d" % size)
+        text = ny.char.rjust(text, size)
+    elif typ == 'D':
+        text = ny.char.replace(ny.datetime_as_string(ny.asarray(values, dtype='datetime64[D]')), '-', '')
+    elif typ == 'L':
+        text = ny.char.upper(ny.asarray(values).astype('U1'))
+    else:
+        text = ny.char.ljust(ny.asarray(values).astype('U%d' % size), size)
+    return ny.char.encode(text, ENCODING).astype('S%d' % size)
 
-def dbfwriter(f, fieldnames, fieldspecs, records):
-    """ Return a string suitable for writing directly to a binary dbf file.
 
+def dbfwriter_columns(f, fieldnames, fieldspecs, columns):
+    """ Write a dbf file from columns (a sequence of equal-length arrays, one
+    per field), building all the records as one fixed-width buffer.
     File f should be open for writing in a binary mode.
-
-    Fieldnames should be no longer than ten characters and not include \x00.
-    Fieldspecs are in the form (type, size, deci) where
-        type is one of:
-            C for ascii character data
-            M for ascii character memo data (real memo fields not supported)
-            D for datetime objects
-            N for ints or decimal objects
-            L for logical values 'T', 'F', or '?'
-        size is the field width
-        deci is the number of decimal places in the provided decimal object
-    Records can be an iterable over the records (sequences of field values).
-    
+    fieldnames and fieldspecs are as in dbfwriter().
     """
     # header info
     ver = 3
     now = datetime.datetime.now()
     yr, mon, day = now.year-1900, now.month, now.day
-    numrec = len(records)
+    numrec = len(columns[0]) if len(columns) else 0
     numfields = len(fieldspecs)
     lenheader = numfields * 32 + 33
     lenrecord = sum(field[1] for field in fieldspecs) + 1
     hdr = struct.pack('<BBBBLHH20x', ver, yr, mon, day, numrec, lenheader, lenrecord)
     f.write(hdr)
-                      
+
     # field specs
-    for name, (typ, size, deci) in itertools.izip(fieldnames, fieldspecs):
-        name = name.ljust(11, '\x00')
-        fld = struct.pack('<11sc4xBB14x', name, typ, size, deci)
+    for name, (typ, size, deci) in zip(fieldnames, fieldspecs):
+        fld = struct.pack('<11sc4xBB14x', name.encode(ENCODING), typ.encode(ENCODING), size, deci)
         f.write(fld)
 
     # terminator
-    f.write('\r')
+    f.write(b'\r')
 
     # records
-    for record in records:
-        f.write(' ')                        # deletion flag
-        for (typ, size, deci), value in itertools.izip(fieldspecs, record):
-            if typ == "N":
-                value = str(value).rjust(size, ' ')
-            elif typ == 'D':
-                value = value.strftime('%Y%m%d')
-            elif typ == 'L':
-                value = str(value)[0].upper()
-            else:
-                value = str(value)[:size].ljust(size, ' ')
-            assert len(value) == size
-            f.write(value)
+    records = ny.zeros(numrec, dtype=record_dtype(fieldspecs))
+    records['DeletionFlag'] = b' '
+    for i, ((typ, size, deci), values) in enumerate(zip(fieldspecs, columns)):
+        records['f%d' % i] = format_column(values, typ, size, deci)
+    f.write(records.tobytes())
 
     # End of file
-    f.write('\x1A')
+    f.write(b'\x1A')
+
+
+def dbfwriter(f, fieldnames, fieldspecs, records):
+    """ Return a string suitable for writing directly to a binary dbf file.
+
+    File f should be open for writing in a binary mode.
+
+    Fieldnames should be no longer than ten characters and not include \x00.
+    Fieldspecs are in the form (type, size, deci) where
+        type is one of:
+            C for ascii character data
+            M for ascii character memo data (real memo fields not supported)
+            D for datetime objects
+            N for ints or decimal objects
+            F for floats
+            L for logical values 'T', 'F', or '?'
+        size is the field width
+        deci is the number of decimal places in the provided decimal object
+    Records can be an iterable over the records (sequences of field values).
+
+    """
+    records = list(records)
+    columns = []
+    for i, (typ, size, deci) in enumerate(fieldspecs):
+        values = [record[i] for record in records]
+        if typ == 'D':
+            values = ny.array(values, dtype='datetime64[D]')
+        elif typ not in ('N', 'F'):
+            values = ny.array([str(value) for value in values])
+        columns.append(values)
+    dbfwriter_columns(f, fieldnames, fieldspecs, columns)
 
 
 # -------------------------------------------------------
 # Example calls
 if __name__ == '__main__':
     import sys, csv
-    from cStringIO import StringIO
+    from io import BytesIO, StringIO
     from operator import itemgetter
 
     # Read a database
-    filename = '/pydev/databases/orders.dbf'      
+    filename = '/pydev/databases/orders.dbf'
     if len(sys.argv) == 2:
         filename = sys.argv[1]
     f = open(filename, 'rb')
     db = list(dbfreader(f))
     f.close()
     for record in db:
-        print record
+        print(record)
     fieldnames, fieldspecs, records = db[0], db[1], db[2:]
 
     # Alter the database
@@ -159,20 +259,20 @@ if __name__ == '__main__':
     records = [rec[1:] for rec in records]
 
     # Create a new DBF
-    f = StringIO()
+    f = BytesIO()
     dbfwriter(f, fieldnames, fieldspecs, records)
 
     # Read the data back from the new DBF
-    print '-' * 20    
+    print('-' * 20)
     f.seek(0)
     for line in dbfreader(f):
-        print line
+        print(line)
     f.close()
 
     # Convert to CSV
-    print '.' * 20    
+    print('.' * 20)
     f = StringIO()
-    csv.writer(f).writerow(fieldnames)    
+    csv.writer(f).writerow(fieldnames)
     csv.writer(f).writerows(records)
-    print f.getvalue()
-    f.close()
\ No newline at end of file
+    print(f.getvalue())
+    f.close()
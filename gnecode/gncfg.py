@@ -27,6 +27,21 @@ Seattle, WA  USA
 ---------------------------------------
 RECENT MODIFICATION HISTORY
 
+10/18/2026: Added SweepSampleTbls, the largest sweep written as one output table per sample.
+10/18/2026: Added FPathGridCache and GridTileCells, the gis2tbls grid reading settings.
+10/18/2026: Added FPathZoneIndex, the gis2tbls basin-to-cell index folder.
+10/18/2026: Added FPathRunCache and RunCacheMaxMB, the model run result cache settings.
+10/18/2026: Added FPathRunState, the incremental run-state store folder.
+10/18/2026: Added OUTCODES, the code tables of categorical OUT variables.
+10/18/2026: Added ComputePrecision, the default IN/OUT array float precision.
+10/18/2026: The run state dictionaries (FLAGS, CCAL, RUN, IN, OUT, etc) are now
+ gnrun.RunDict proxies, to support several concurrent model runs (run contexts).
+10/18/2026: Added ModelProcs, the default nutrient form sub-model process count.
+10/18/2026: Added fname_cfg_sa, the sensitivity analysis configuration file name.
+10/18/2026: Added SweepChunkSamples, the calibration sweep chunk size.
+10/18/2026: Added TblNoData, the fill value for basins missing from input tables.
+10/18/2026: Added TblReadWorkers, the default input table reading thread count.
+10/18/2026: Added FPathTblCache and TblCacheMaxMB, the input table cache settings.
 1/18/2010: Removed extraneous comments, improved documentation for distribution.
 10/16-24/2008: Added DSi parameter to PARAMETERS and PGRP dictionaries.
 Added AllFormModel FLAGS key to support the optional use of model code file
@@ -39,6 +54,8 @@ after all element form sub-models have been completed.
 
 __version__ = '$Revision: 2010-01-18$'
 
+from gnrun import RunDict
+
 #fpath_dev = r"N:\newsmodel\code"
 fpath_dev = "."
 
@@ -47,18 +64,72 @@ fname_cfg_gen = "gensetup.cfg"
 fname_cfg_cal = "constants.cfg"
 fname_cfg_var = "vars.cfg"
 fname_cfg_gis = "gis2tbls.cfg"
+fname_cfg_sa  = "sensitivity.cfg"
 
 # Global, temporary working file path, to write intermediate files to
 FPathTmpSpace = fpath_dev
 
+# Binary columnar cache of the parsed [IN.TBLS] input tables (see gntblio.py),
+# and its size cap in MB. Set FPathTblCache to None to disable the cache.
+FPathTblCache = FPathTmpSpace + "/gnecache/tbls"
+TblCacheMaxMB = 2048
+
+# Run-state store of incremental model runs (globalnews.py --incremental; see gnstate.py)
+FPathRunState = FPathTmpSpace + "/gnecache/state"
+
+# Content-addressed cache of whole model run results (see run_cache_key() in
+# globalnews.py), and its size cap in MB. Set FPathRunCache to None to disable it.
+FPathRunCache = FPathTmpSpace + "/gnecache/runs"
+RunCacheMaxMB = 1024
+
+# Basin-to-cell (zone) indices of the gis2tbls basin grids, keyed by the grid
+# contents (see gngis2tbls.BasinCellIndex()). Set to None to not keep them.
+FPathZoneIndex = FPathTmpSpace + "/gnecache/zoneidx"
+
+# Binary (.flt) conversions of the gis2tbls ASCII grids (see gnraster.py), and
+# the number of grid cells read at once (row tiles) by the zonal statistics
+FPathGridCache = FPathTmpSpace + "/gnecache/grids"
+GridTileCells = 4 * 1024 * 1024
+
+# No-data value assigned to basins missing from an [IN.TBLS] input table
+TblNoData = 0.0
+
+# Default number of threads used to read the [IN.TBLS] input tables concurrently
+# (overridden by the globalnews.py -w/--workers option); 1 reads them serially
+TblReadWorkers = 4
+
+# Default number of processes running the nutrient form sub-models
+# (overridden by the globalnews.py -j/--procs option); 1 runs them serially
+ModelProcs = 1
+
+# Default compute precision (numpy float dtype) of the IN and OUT arrays,
+# "float64" or "float32" (overridden by the globalnews.py --precision option).
+# With float32, single model runs also report the output errors relative
+# to a float64 run on the same inputs (see runmodel() in globalnews.py)
+ComputePrecision = "float64"
+
+# Number of calibration constant samples run at once, as (n_samples, n_basins)
+# arrays, in globalnews.py --sweep runs (see runsweep())
+SweepChunkSamples = 64
+
+# Calibration sweeps write each output table as one stacked npz archive per
+# chunk of samples (*_sweep0000.npz, ...). Sweeps of up to SweepSampleTbls
+# samples may instead write one table per sample, in its [OUT.TBLS] format
+# (csv, etc), with the globalnews.py --sweep-tables option
+SweepSampleTbls = 16
+
 
 # To be set in globalnews.py/main from command-line arg
-# currently defined keys: "verbose", "AllFormModel"
+# currently defined keys: "verbose", "AllFormModel", "TblCache", "TblReadWorkers",
+# "ModelProcs", "ShowGraph", "Precision", "Incremental",
+# "RunCache", "SweepTables"
 # Add new keys: "debug", "warning"
-FLAGS = {}
+# FLAGS and the run state dictionaries below are RunDict proxies (see gnrun.py):
+# they behave as dictionaries, but their contents belong to the active run context
+FLAGS = RunDict('FLAGS')
 
 # Initialize/declare global dictionaries (for gis2tbls)
-BASAREA = {}
+BASAREA = RunDict('BASAREA')
 """
 BASAREA['BasinAreas']
     ['FLAG']      (True/False)
@@ -67,17 +138,19 @@ BASAREA['BasinAreas']
 """
 
 # Initialize/declare global dictionaries
-CCAL = {}
-RUN = {}
-INDOC_TBL = {}
-INDOC = {}
-IN = {}
+CCAL = RunDict('CCAL')
+RUN = RunDict('RUN')
+INDOC_TBL = RunDict('INDOC_TBL')
+INDOC = RunDict('INDOC')
+IN = RunDict('IN')
 # for writing out variables to tables, does it need a set of
 # data structures completely parallel to the ones used for reading tables/vars?
 # (INDOC_TBL, INDOC, IN) It looks that way...
-OUTDOC_TBL = {}
-OUTDOC = {}
-OUT = {}
+OUTDOC_TBL = RunDict('OUTDOC_TBL')
+OUTDOC = RunDict('OUTDOC')
+OUT = RunDict('OUT')
+# code tables of the categorical (integer-coded) OUT variables
+OUTCODES = RunDict('OUTCODES')
 
 """
 CCAL[param][constant] (all floats, loaded from constants.cfg)
@@ -85,6 +158,11 @@ RUN['p']         (str param list)
 RUN['param_ord'] (int list, base 0, though input in vars.cfg is base 1)
   param_ord gets reduced from an all-parameters interpretation to 
   the actual requested list of parameters, RUN['p']
+RUN['basins']    (str basin selection query, or None; see gnselect.py)
+RUN['dtype']    (str compute precision, float dtype of the IN and OUT arrays;
+  see set_precision() in globalnews.py. Default: 'float64')
+RUN['batch']    (str list of scenario or sample names, set in batched runs only;
+  see runbatch() and runsweep() in globalnews.py)
 
 INDOC/OUTDOC & INDOC_TBL/OUTDOC_TBL dictionaries
 doc_d[varname]
@@ -95,6 +173,9 @@ doc_d[varname]
     ['genvarname'] (str)
     ['genvar_p']   (str)
 
+OUTCODES[varname] (str array of the labels of OUT[varname] codes: label = OUTCODES[varname][code];
+  set by ExportVar(). Labels replace the codes when written out, except in columnar tables)
+
 doctbl_d[tblname]
     ['varlst']     (str list)
     ['fieldorder'] (int list)
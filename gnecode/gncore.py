@@ -24,6 +24,30 @@ Seattle, WA  USA
 ---------------------------------------
 RECENT MODIFICATION HISTORY
 
+10/18/2026: ExportVar() records the calling model step of each OUT variable, for
+ the globalnews.py --graph output (gngraph.record_output()).
+10/18/2026: Categorical OUT variables (integer codes, ExportVar() labels argument,
+ OUTCODES) are translated to labels only when written out (ordered_out_columns()).
+10/18/2026: ExportVar() keeps floating point arrays at the compute precision,
+ RUN['dtype'] (default float64).
+10/18/2026: Configuration files are read from FLAGS['CfgPath'] (default fpath_dev),
+ set per model instance (see the globalnews.py Model class).
+10/18/2026: ExportVar() expands variables to (n_batch, n_basins) arrays in
+batched scenario and calibration sweep runs (RUN['batch']); added ordered_out_columns().
+10/18/2026: Added the optional [MODELRUN] basins option, a basin selection query on
+the BasinID table attributes (gnecode/gnselect.py), applied in load_var_arrays().
+10/18/2026: [OUT.TBLS] entries accept an optional table format (csv, npz or columnar).
+10/18/2026: write_var_arrays() writes tables with gntblio.write_csv_columns(), in chunks
+of basins, instead of eval()-ing a zip() over all the output arrays.
+10/18/2026: parse_cfg_tbls() accepts an optional [IN.TBLS] table source format
+(csv or columnar); load_var_arrays() reads columnar tables memory-mapped.
+10/18/2026: load_var_arrays() accepts an optional set of required input variables
+(invars); other variables, and tables holding none of them, are not loaded.
+10/18/2026: load_var_arrays() reads the input tables concurrently with a bounded
+thread pool (FLAGS['TblReadWorkers'], default TblReadWorkers in gncfg.py).
+10/18/2026: load_var_arrays() now reads each input table with the column-indexed
+loader in gntblio.py (one typed pass per requested field, vectorized basin
+sub-setting mask) instead of growing arrays one csv cell at a time with ny.r_.
 1/18/2010: Added the standard module documentation text above.
 10/16/2008
 Changed floating-point I/O numpy array dtype from float32 to NumPy's default float64,
@@ -44,8 +68,12 @@ the BasinID set are loaded.
 
 
 
+import sys
 import numpy as ny
 from gncfg import *
+import gntblio
+import gnselect
+import gngraph
 
 __version__ = '$Revision: 2010-01-18$'
 
@@ -78,7 +106,7 @@ def read_cfgfile(fname_cfg, sect_prefix):
     # Prevent default behavior of returning options in all-lowercase
     cfg.optionxform = str
 
-    fpath_cfg = os.path.join(fpath_dev, fname_cfg)
+    fpath_cfg = os.path.join(FLAGS.get('CfgPath', fpath_dev), fname_cfg)
     cfg.read(fpath_cfg)
 
     # is any error checking needed??
@@ -137,6 +165,12 @@ def parse_cfg_modelrun(mrun_cfg_d, run_d):
             # assign order index, converting from base 1 to base 0
             run_d['param_ord'].append(int(v) - 1)
 
+    # Parse optional variable basins, a basin selection query (see gnselect.py);
+    # None if omitted. The query is checked here, evaluated in load_var_arrays()
+    run_d['basins'] = None
+    if mrun_cfg_d.get('basins', '').strip():
+        run_d['basins'] = mrun_cfg_d['basins'].strip()
+        gnselect.parse_basin_query(run_d['basins'])
     
     if FLAGS['verbose']: print(run_d)
 
@@ -166,15 +200,18 @@ def parse_cfg_tbls(tbls, strsubs, doctbl_d, doctype):
     """
     import os.path
     
-    vlist_len = {"INGIS":2, "IN":2, "OUT":2}
+    # IN and OUT tables take an optional 3rd argument, the table format
+    vlist_len = {"INGIS":(2,), "IN":(2,3), "OUT":(2,3)}
+    format_valid = {"IN":('csv', 'columnar'), "OUT":('csv', 'npz', 'columnar')}
 
     # what's the difference between .items() and .iteritems()?
     for tblname,val in list(tbls.items()):
         vlist = val.split("|")
     
         # later, the basis for doctype == "OUT" might be made optional?
-        if len(vlist) != vlist_len[doctype]:
-            if FLAGS['verbose']: print("%s: Tables must have exactly %d arguments.\n" %(tblname, vlist_len[doctype]))
+        if len(vlist) not in vlist_len[doctype]:
+            if FLAGS['verbose']: print("%s: Tables must have %s arguments.\n" \
+                                 %(tblname, " or ".join(map(str, vlist_len[doctype]))))
             # Now exit.
     
         # add empty tblname key to dictionary
@@ -209,6 +246,19 @@ def parse_cfg_tbls(tbls, strsubs, doctbl_d, doctype):
         elif doctype == "OUT":
             doctbl_d[tblname]['basis'] = 'basin'
 
+        # Add table format item (check for valid values); 'csv' if omitted.
+        # 'columnar': directory of memory-mapped column files (IN and OUT);
+        # 'npz': numpy npz archive of columns (OUT). See gntblio.py.
+        if doctype in format_valid:
+            doctbl_d[tblname]['format'] = 'csv'
+            if len(vlist) > 2:
+                if vlist[2] in format_valid[doctype]:
+                    doctbl_d[tblname]['format'] = vlist[2]
+                else:
+                    print("Table %s: format '%s' is not recognized; must be (%s).\n" \
+                          %(tblname, vlist[2], ','.join(format_valid[doctype])))
+                    # Now exit.
+
         # initialize list of variables to be used
         # and their left-right field output order (for OUT)
         doctbl_d[tblname]['varlst'] = []
@@ -339,30 +389,35 @@ def doctbld_docd_assign(dattype, doctbld, docd, varname, srctable, fldname, \
         docd[varname]['srctable'],docd[varname]['fieldname'],docd[varname]['fieldtype'])
 
 
-def load_var_arrays(doctbl_d, doc_d, data_d, out_data_d):
+def load_var_arrays(doctbl_d, doc_d, data_d, out_data_d, invars=None):
     """ Data array will be populated into data_d[varname]
     Open each table, load each requested fields and map them to variables.
     Variables will be numpy arrays.
+    If invars (set of variable names) is not None, only those variables are
+    loaded, and tables holding none of them are not read at all.
     """
-    import csv
 
     # =====================================================
     # LOAD AND HANDLE BasinID VARIABLE
     # Basin sub-setting functionality is included.
     id_var = 'BasinID'
     id_fldname, id_tblname = doc_d[id_var]['fieldname'], doc_d[id_var]['srctable'][0]
-    
-    # read csv table and load BasinID variable
-    fp = open(doctbl_d[id_tblname]['filepath'], "rb")
-    basinid_lst = [int(row[id_fldname]) for row in csv.DictReader(fp)]
-    fp.close()
-
-    # Convert to int32 numpy array and load into IN
-    data_d[id_var] = ny.array(basinid_lst, dtype="int32")
 
-    # Create set out of global BasinID's array
-    # For use in basin sub-setting as input variables/tables are read in (below)
-    setBasinID = set(data_d[id_var])
+    # read table and load BasinID variable as int32 numpy array into IN
+    data_d[id_var] = gntblio.read_tbl_columns(doctbl_d[id_tblname]['filepath'], \
+                        [id_fldname], ['int'], None, doctbl_d[id_tblname]['format'])[id_fldname]
+
+    # Basin selection by attribute query ([MODELRUN] basins), evaluated on the
+    # attribute fields of the BasinID table before any other table is read
+    if RUN.get('basins'):
+        rowsel = gnselect.select_basin_rows(doctbl_d[id_tblname]['filepath'], \
+                        RUN['basins'], doctbl_d[id_tblname]['format'])
+        print("  Basins selected (%s): %d of %d" \
+              % (RUN['basins'], rowsel.size, data_d[id_var].size))
+        if rowsel.size == 0:
+            print("  !!! No basins match the [MODELRUN] basins query !!!\n")
+            raise ValueError(RUN['basins'])
+        data_d[id_var] = data_d[id_var][rowsel]
 
     # Copy to OUT[id_var] numpy array
     out_data_d[id_var] = data_d[id_var]
@@ -370,112 +425,83 @@ def load_var_arrays(doctbl_d, doc_d, data_d, out_data_d):
     if FLAGS['verbose']: print("  Number of basins to be processed: %d" % data_d[id_var].size)
 
     # =====================================================
-    # LOAD ALL OTHER INPUT VARIABLES, STEPPING THROUGH INDIVIDUAL INPUT TABLES
+    # LOAD ALL OTHER INPUT VARIABLES FROM THE INDIVIDUAL INPUT TABLES
+    # Tables are read concurrently by FLAGS['TblReadWorkers'] threads, then
+    # merged into data_d in the (deterministic) order of doctbl_d
+    tbljobs, tblvars = [], []
     for tbl in list(doctbl_d.keys()):
-        if len(doctbl_d[tbl]['varlst']) > 0:
-            # Initialize data_d dict with all its keys (variables), as numpy arrays
-            # (maybe this data_d initialization should be done in parse_cfg_vars()?
-            for var in doctbl_d[tbl]['varlst']:
-                if var != id_var: 
-                    if doc_d[var]['fieldtype'] == "double":
-                        data_d[var] = ny.array([], dtype="float64")
-                        #data_d[var] = ny.array([], dtype="float32")
-                    elif doc_d[var]['fieldtype'] == "int":
-                        data_d[var] = ny.array([], dtype="int32")
-
-            # create temporary dict {fieldname:varname} for current table (tbl),
-            # based on doctbl_d[tbl]['varlst'] and doc_d[varname]['fieldname']
-            # Then map fieldname to varname, and use in the block below
-            tbl_fld_var = {}
-            for var in doctbl_d[tbl]['varlst']:
-                if var != id_var: 
-                    tbl_fld_var[doc_d[var]['fieldname']] = var
-            if FLAGS['verbose']: print("tbl_fld_var: ", tbl_fld_var)
-
-            # Read the first row (field names)
-            fp = open(doctbl_d[tbl]['filepath'], "rb")
-            fld_names_reader = csv.reader(fp)
-            fld_names = next(fld_names_reader)
-            fp.close()
-
-            # Set basinid_fld using the header (field names) reader list
-            # id_fldnames_lst is a list of expected basin id field names
-            id_fldnames_lst = ['basinid', 'BASINID']
-            if id_fldnames_lst[0] in fld_names:
-                basinid_fld = id_fldnames_lst[0]
-            elif id_fldnames_lst[1] in fld_names:
-                basinid_fld = id_fldnames_lst[1]
-            else:
-                print("  !!! Input table does not have a valid basin ID column name !!!\n")
-
-            # read csv table and load requested fields
-            fp = open(doctbl_d[tbl]['filepath'], "rb")
-            csvreader = csv.DictReader(fp)
-            # SHOULD THERE BE A TEST TO ENSURE THAT ALL REQUESTED FIELDS
-            # ARE PRESENT IN THE FILE? OTHERWISE, ABORT WITH ERROR MESSAGE
-            for row in csvreader:
-                for fld,v in list(row.items()):
-                    if int(row[basinid_fld]) in setBasinID and fld in list(tbl_fld_var.keys()):
-                        # load requested fields into the data_d dict by
-                        # concatenating each row value to the numpy arrays
-                        # This test is done for every single row! It may be more
-                        # efficient to extract indices for the requested fields, then
-                        # just use those indices directly into the row dictionary.
-                        # And maybe use simple reader and not DictRead, for efficiency.
-                        var = tbl_fld_var[fld]
-                        if var != id_var:
-                            if doc_d[var]['fieldtype'] == "double":
-                                data_d[var] = ny.r_[data_d[var], float(v)]
-                            elif doc_d[var]['fieldtype'] == "int":
-                                data_d[var] = ny.r_[data_d[var], int(v)]
-            fp.close()
-
-            if FLAGS['verbose']: 
-                for var in doctbl_d[tbl]['varlst']: 
-                    print("   ", var, "(", data_d[var].size, "):", data_d[var])
+        varlst = [var for var in doctbl_d[tbl]['varlst'] if var != id_var \
+                  and (invars is None or var in invars)]
+        if len(varlst) > 0:
+            # Requested field names and types for current table (tbl), based on
+            # doctbl_d[tbl]['varlst'] and doc_d[varname]['fieldname']
+            fldnames = [doc_d[var]['fieldname'] for var in varlst]
+            fldtypes = [doc_d[var]['fieldtype'] for var in varlst]
+            if FLAGS['verbose']: print("tbl_fld_var: ", dict(list(zip(fldnames, varlst))))
+            tbljobs.append((doctbl_d[tbl]['filepath'], fldnames, fldtypes, \
+                            doctbl_d[tbl].get('format', 'csv')))
+            tblvars.append((tbl, varlst))
+
+    # read tables and load requested fields, retaining only
+    # rows with Basin ID's found in the global BasinID array
+    coldata_lst = gntblio.read_tbls_columns(tbljobs, data_d[id_var], \
+                        FLAGS.get('TblReadWorkers', TblReadWorkers))
+    for (tbl, varlst), (filepath, fldnames, fldtypes, tblformat), coldata_d in \
+            zip(tblvars, tbljobs, coldata_lst):
+        for var, fld in zip(varlst, fldnames):
+            data_d[var] = coldata_d[fld]
+
+        if FLAGS['verbose']: 
+            for var in varlst: 
+                print("   ", var, "(", data_d[var].size, "):", data_d[var])
 
 
 def write_var_arrays(doctbl_d, doc_d, data_d):
     """ 
-    To write out variables to csv tables, use the compact
-    writerows() csv writer method. One way to prepare the output numpy arrays
-    for writing is to use zip(). eg, for 3 numpy arrays:
-    a = ny.array([1,2])
-    b = ny.array([10,20])
-    c = ny.array([5,7])
-    zip(a,b,c)
-    [(1, 10, 5), (2, 20, 7)]
-    
-    fp = open("myfile.csv", "wb") # without the 'b', blank lines may be inserted
-    writer = csv.writer(fp)
-    writer.writerow(["fld1","fld2","fld3"])
-    writer.writerows(zip(a,b,c))
+    Write out variables to csv (or npz, columnar) tables, in the field order set in vars.cfg
+    (see cfg_outvars_order()). The ordered variable arrays are handed to
+    gntblio.write_tbl_columns(), which (for csv tables) formats and streams
+    each table out in chunks of basins.
     
     Getting the field order just right is a big deal.
     """
-    import csv
-
 
     for tbl in doctbl_d:
         if len(doctbl_d[tbl]['varlst']) > 0:
-            fldnameseq = []
-            writeseq = []
-            # remove vars that were never written out to the OUT dict
-            # either by choice or by oversight. Alternatively, write out None?
-            orderedflds = dict(list(zip(doctbl_d[tbl]['fieldorder'], doctbl_d[tbl]['varlst'])))
-            for ord,var in sorted(orderedflds.items()): 
-                if var in data_d and \
-                var in doc_d and doc_d[var]['flgwrite']:
-                    fldnameseq.append(doc_d[var]['fieldname'])
-                    writeseq.append("data_d['" + var + "']")
-
-            # write requested fields to csv table
-            fp = open(doctbl_d[tbl]['filepath'], "wb")
-            csvwriter = csv.writer(fp)
-            csvwriter.writerow(fldnameseq)
-            csvwriter.writerows(eval("zip(" + ",".join(writeseq) + ")"))
-
-            fp.close()
+            fldnameseq, writeseq, codetables = ordered_out_columns(doctbl_d[tbl], doc_d, data_d)
+
+            # write requested fields to table, in the requested format
+            gntblio.write_tbl_columns(doctbl_d[tbl]['filepath'], fldnameseq, writeseq, \
+                                      doctbl_d[tbl].get('format', 'csv'), codetables)
+
+
+def ordered_out_columns(tbl_d, doc_d, data_d):
+    """ Return (fldnameseq, writeseq, codetables), the field names and variable
+    arrays of output table tbl_d (a doctbl_d[tbl] entry), in field order.
+    Categorical (coded) variables (see ExportVar()) are translated to their
+    labels, except in columnar tables, which keep the codes; their code tables
+    are then returned in codetables[fieldname].
+    """
+    keepcodes = tbl_d.get('format', 'csv') == 'columnar'
+    fldnameseq = []
+    writeseq = []
+    codetables = {}
+    # remove vars that were never written out to the OUT dict
+    # either by choice or by oversight. Alternatively, write out None?
+    orderedflds = dict(list(zip(tbl_d['fieldorder'], tbl_d['varlst'])))
+    for ord,var in sorted(orderedflds.items()): 
+        if var in data_d and \
+        var in doc_d and doc_d[var]['flgwrite']:
+            fldnameseq.append(doc_d[var]['fieldname'])
+            if var not in OUTCODES:
+                writeseq.append(data_d[var])
+            elif keepcodes:
+                writeseq.append(data_d[var])
+                codetables[doc_d[var]['fieldname']] = OUTCODES[var]
+            else:
+                writeseq.append(OUTCODES[var].take(data_d[var]))
+
+    return fldnameseq, writeseq, codetables
 
 
 def cfg_outvars_order(fname_cfg_var, doctbl_d, doc_d):
@@ -518,7 +544,8 @@ def cfg_outvars_order(fname_cfg_var, doctbl_d, doc_d):
         if FLAGS['verbose']: print("genvars sorted: ", gv, genvars_d[gv]['p'], genvars_d[gv]['var'])
 
     # open file, suck in all lines, close file
-    f = open(fname_cfg_var, "r")
+    import os.path
+    f = open(os.path.join(FLAGS.get('CfgPath', fpath_dev), fname_cfg_var), "r")
     cfg_lines = f.readlines()
     f.close()
 
@@ -559,13 +586,16 @@ def cfg_outvars_order(fname_cfg_var, doctbl_d, doc_d):
             ord_offset -= 1
 
 
-def ExportVar(varsave, varname, param=None):
+def ExportVar(varsave, varname, param=None, labels=None):
     ''' Export variable (array) to the gloabl OUT dictionary, to make it
     available for writing out to files. If variable is actually a literal
     (single value) and not a full-length numpy array, expand it to full-length
     float32 numpy array using IN['BasinID'] to extract the length.
     If param is not None, the variable has a generic name and must be
     expanded.
+    If labels is not None, the variable is categorical: an integer code array,
+    with code table labels (label = labels[code]), registered in OUTCODES.
+    With FLAGS['ShowGraph'], the calling model step is recorded (gngraph.record_output()).
     '''
     global OUT
     
@@ -575,20 +605,38 @@ def ExportVar(varsave, varname, param=None):
     # ARRAYS)!!! IF IN['BasinID'].size == 1, VARIABLE STILL NEEDS TO BE CONVERTED 
     # TO NUMPY ARRAY IF IT'S A SCALAR!]
     ExpandToArrayFlg = False
-    if ny.isscalar(varsave) or len(varsave) == 1:
+    if labels is not None:
+        OUTCODES[varname if param == None else param + varname] = labels
+    elif ny.isscalar(varsave) or ny.size(varsave) == 1:
         # Expand only if scalar or array is not a numpy string-type
         # (There are no foreseeable cases of string scalars that would be exported)
         # But must first test if variable is a numpy array!
         if isinstance(varsave, ny.ndarray):
-            if 'string' not in varsave.dtype.name:
+            if varsave.dtype.kind not in 'SU':
                 ExpandToArrayFlg = True
         else:
             ExpandToArrayFlg = True
     
+    # In batched runs (RUN['batch']: scenarios or calibration constant samples,
+    # see runbatch() and runsweep() in globalnews.py), full-size arrays are
+    # (n_batch, n_basins): arrays computed only from inputs or constants shared
+    # by the whole batch, eg (n_basins) or (n_batch, 1), are broadcast to that shape
+    fullshape = IN['BasinID'].shape
+    if RUN.get('batch'):
+        fullshape = (len(RUN['batch']),) + fullshape
+        if isinstance(varsave, ny.ndarray) and not ExpandToArrayFlg \
+           and varsave.shape != fullshape:
+            varsave = ny.broadcast_to(varsave, fullshape).copy()
+
+    # Floating point arrays are kept at the compute precision, RUN['dtype']
+    dtype = RUN.get('dtype', 'float64')
     if ExpandToArrayFlg:
-        varsave = ny.array(varsave, dtype='float64') \
-                  * ny.ones(IN['BasinID'].size)
+        varsave = ny.array(varsave, dtype=dtype) \
+                  * ny.ones(fullshape, dtype=dtype)
         #varsave = ny.array(varsave, dtype='float32') \
+    elif isinstance(varsave, ny.ndarray) and varsave.dtype.kind == 'f' \
+         and varsave.dtype != dtype:
+        varsave = varsave.astype(dtype)
     
     if param == None:
         OUT[varname] = varsave
@@ -596,6 +644,10 @@ def ExportVar(varsave, varname, param=None):
         # generic var name
         OUT[param + varname] = varsave
 
+    # the calling model step, for the --graph output lineage (see gngraph.describe_outputs())
+    gngraph.record_output(varname if param == None else param + varname, \
+                          sys._getframe(1).f_code.co_name, param)
+
     # The handling of generic var names will only work if the parameter
     # is the first element of the var name!! That's very limiting and
     # will need to be generalized
@@ -1,8 +1,12 @@
 # gngis2tbls.py
 """ gncore.py
 Global NEWS 2 model, GNE implementation.
-This module implements the raster, GIS pre-processing functionality,
-which currently relies on the ArcGIS GeoProcessing library.
+This module implements the raster, GIS pre-processing functionality.
+Zonal statistics are computed in memory with numpy (CalcBasinStats()),
+from grids read by gnraster.py. If any of the grids is not in a format
+gnraster.py reads (eg, ArcInfo grid folders), the original ArcGIS
+GeoProcessing implementation, CalcBasinStatsArcGIS(), is used instead
+(see UseArcGIS(); it requires ArcGIS and its Spatial Analyst extension).
 Outline of functionality (somewhat outdated):
 
 PARSE CONFIG FILE, gis2tbls.cfg
@@ -46,14 +50,35 @@ Seattle, WA  USA
 ---------------------------------------
 RECENT MODIFICATION HISTORY
 
+10/18/2026: BasinCellIndex() temporary files are named by process and thread.
+10/18/2026: BasinCellIndex() finds its stored index without re-hashing an unchanged
+ zone grid (gnraster.cached_grid_hash()).
+10/18/2026: Added UseArcGIS(): CalcBasinStatsArcGIS() is used when any grid is not
+ in a gnraster.py format (eg, ArcInfo grids).
+10/18/2026: The ArcGIS zonal statistics dbf tables are read column-wise (dbf.dbfreader_columns()).
+10/18/2026: Variables sharing the same weighting grids are reduced together, in one
+ tiled pass with fused value x area x fraction products (GisVarGroups(), ZonalStats());
+ the groups run in a process pool with globalnews.py -j.
+10/18/2026: Grids are memory-mapped and streamed in row tiles (gnraster.py): ZonalStats()
+ accumulates each tile's basin sums from the cells the basin-to-cell index has in the tile.
+10/18/2026: Zonal statistics are gathers over a basin-to-cell index (CSR layout:
+ BasinCellIndex()), built once per zone grid and kept in FPathZoneIndex.
+10/18/2026: CalcBasinStats() computes the zonal statistics with numpy (ZonalStats(),
+ bincount reductions) from grids read by gnraster.py, and returns them to
+ BasinStatsToOUTvarArrays(), without temporary grids or dbf tables. The ArcGIS
+ implementation is now CalcBasinStatsArcGIS().
 1/18/2010: Added the standard module documentation text above.
 5/17/2007
 """
 
 
+import os, os.path
+import threading
 import numpy as ny
 from gncfg import *
 import gncore
+import gnraster
+import gntblio
 
 __version__ = '$Revision: 2010-01-18$'
 
@@ -74,7 +99,7 @@ def LoadBasinIDArea(doctbl_d, data_d, out_data_d):
     import csv
 
     # read csv table and load basinid field
-    fp = open(doctbl_d['tblbasins']['filepath'], "rb")
+    fp = open(doctbl_d['tblbasins']['filepath'], "r", newline='')
     csvreader = csv.DictReader(fp)
     # Test to ensure field is present in the file, aborting if not present?
     data_d['BasinID'] = ny.array([int(row['BASINID']) for row in csvreader], \
@@ -89,7 +114,7 @@ def LoadBasinIDArea(doctbl_d, data_d, out_data_d):
         setBasinID = set(data_d['BasinID'])
 
         # read csv table and load area field
-        fp = open(doctbl_d['tblareas']['filepath'], "rb")
+        fp = open(doctbl_d['tblareas']['filepath'], "r", newline='')
         csvreader = csv.DictReader(fp)
         # Test to ensure field is present in the file, aborting if not present?
         # As done in BasinStatsToOUTvarArrays(), retain only rows whose
@@ -106,8 +131,240 @@ def LoadBasinIDArea(doctbl_d, data_d, out_data_d):
         out_data_d['BasinArea'] = data_d['BasinArea']
 
 
+def BasinCellIndex(filepath):
+    ''' Return the basin-to-cell index of the basin zone grid filepath, in CSR
+    layout: the data cells of basin (zone) ID[i] are the flat grid cell offsets
+    cells[offsets[i]:offsets[i+1]]. 'shape' holds the grid dimensions.
+    The index is built once per zone grid and kept in FPathZoneIndex, keyed by
+    the grid contents hash. That hash is itself looked up by the grid file sizes
+    and modification times (gnraster.cached_grid_hash()), so later runs on an
+    unchanged zone grid neither read it nor scan and sort its zones; a zone grid
+    whose files changed is hashed again (one full read) before the lookup.
+    '''
+    shape = gnraster.grid_shape(filepath)
+    idxpath = None
+    if FPathZoneIndex is not None:
+        idxpath = os.path.join(FPathZoneIndex, gnraster.cached_grid_hash(filepath, FPathZoneIndex) + ".npz")
+        if os.path.exists(idxpath):
+            npz = ny.load(idxpath)
+            index = dict((key, npz[key]) for key in npz.files)
+            npz.close()
+            print("ZONALSTATS basin-cell index read:", idxpath)
+            return index
+
+    if shape[0] * shape[1] >= 2**31:
+        print("  !!! Basin grid %s: too many cells (%d) for an int32 index !!!" % (filepath, shape[0] * shape[1]))
+        raise ValueError(filepath)
+    ZoneGrid, nodata = gnraster.open_grid(filepath)
+    datacells, zones = [], []
+    for r0, r1 in gnraster.row_tiles(shape):
+        window, valid = gnraster.read_window(ZoneGrid, nodata, r0, r1)
+        cells = ny.flatnonzero(valid)
+        datacells.append((cells + r0 * shape[1]).astype('int32'))
+        zones.append(window.ravel()[cells].astype('int64'))
+    datacells, zones = ny.concatenate(datacells), ny.concatenate(zones)
+    order = ny.argsort(zones, kind='stable')
+    ids, counts = ny.unique(zones[order], return_counts=True)
+    index = {'ID':ids, 'offsets':ny.concatenate(([0], ny.cumsum(counts))).astype('int32'), \
+             'cells':datacells[order], 'shape':ny.array(shape)}
+
+    if idxpath is not None:
+        os.makedirs(FPathZoneIndex, exist_ok=True)
+        tmppath = "%s.%d.%d.tmp" % (idxpath, os.getpid(), threading.get_ident())
+        gntblio.write_npz_columns(tmppath, list(index.keys()), list(index.values()))
+        os.replace(tmppath, idxpath)
+        print("ZONALSTATS basin-cell index written:", idxpath)
+    return index
+
+
+def SegmentSearch(cells, starts, ends, cell):
+    ''' Vectorized binary search in each sorted segment cells[starts[i]:ends[i]]:
+    return, for every segment, the position of the first cell >= cell.
+    '''
+    lo, hi = starts.astype('int64'), ends.astype('int64')
+    while True:
+        searching = lo < hi
+        if not searching.any():
+            return lo
+        mid = (lo + hi) // 2
+        below = searching & (cells[ny.minimum(mid, len(cells) - 1)] < cell)
+        lo = ny.where(below, mid + 1, lo)
+        hi = ny.where(searching & ~below, mid, hi)
+
+
+def TileCells(index, first, end):
+    ''' Return the data cells of the basin-to-cell index (BasinCellIndex()) in the
+    flat grid cell range [first, end), eg a row tile: (basin positions in
+    index['ID'], cell offsets relative to first). Each basin's cells are sorted,
+    so they are found with a binary search per basin, without scanning the index.
+    '''
+    starts, ends = index['offsets'][:-1], index['offsets'][1:]
+    lo = SegmentSearch(index['cells'], starts, ends, first)
+    counts = SegmentSearch(index['cells'], lo, ends, end) - lo
+    basinpos = ny.repeat(ny.arange(len(counts)), counts)
+    # positions in index['cells'] of the consecutive cells of each basin
+    segstart = ny.repeat(lo - (ny.cumsum(counts) - counts), counts)
+    cellpos = segstart + ny.arange(len(basinpos))
+    return basinpos, index['cells'][cellpos] - first
+
+
+def ZonalStats(index, weightpaths, varpaths, shape):
+    ''' Zonal statistics of several variable grids sharing the same weighting
+    grids, over the basins of the basin-to-cell index (BasinCellIndex()), using
+    the valid (data) cells only, as ArcGIS ZonalStatisticsAsTable "DATA".
+    varpaths lists (variable, value grid path) pairs; each value grid is
+    multiplied by the product of the weightpaths grids (eg, cell area and cell
+    fraction grids), on the fly. All grids are read in one pass, by row tiles:
+    per tile, the weighting grids are read and multiplied once, the basin
+    cells are found once (TileCells()), and each variable is gathered at those
+    cells and its basin counts and sums accumulated.
+    Return a dictionary, by variable, of dictionaries of arrays, one element
+    per basin with data cells, sorted by basin ID: 'ID', 'count', 'sum' and 'mean'.
+    '''
+    weightgrids = [OpenGridLike(filepath, shape) for filepath in weightpaths]
+    valgrids = [OpenGridLike(filepath, shape) for var, filepath in varpaths]
+    nbasins = len(index['ID'])
+    count = ny.zeros((len(varpaths), nbasins), dtype='int64')
+    total = ny.zeros((len(varpaths), nbasins))
+
+    for r0, r1 in gnraster.row_tiles(shape):
+        first = r0 * shape[1]
+        basinpos, cells = TileCells(index, first, r1 * shape[1])
+        weights, wvalid = 1.0, True
+        for grid, nodata in weightgrids:
+            window, valid = gnraster.read_window(grid, nodata, r0, r1)
+            weights, wvalid = window.ravel()[cells] * weights, valid.ravel()[cells] & wvalid
+        for i, (grid, nodata) in enumerate(valgrids):
+            window, valid = gnraster.read_window(grid, nodata, r0, r1)
+            ok = valid.ravel()[cells] & wvalid
+            count[i] += ny.bincount(basinpos[ok], minlength=nbasins)
+            total[i] += ny.bincount(basinpos[ok], minlength=nbasins, \
+                                    weights=(window.ravel()[cells] * weights)[ok])
+
+    stats_d = {}
+    for i, (var, filepath) in enumerate(varpaths):
+        withdata = count[i] > 0
+        stats_d[var] = {'ID':index['ID'][withdata], 'count':count[i][withdata], \
+                        'sum':total[i][withdata], 'mean':total[i][withdata] / count[i][withdata]}
+    return stats_d
+
+
+def GisVarGroups(doctbl_d, doc_d):
+    ''' Group the INGIS variables by weighting grids: the cell area grid (grdarea)
+    and, for 'clfr*' fieldtypes, that cell fraction grid; none if the basin
+    areas themselves are requested (BASAREA). Return a list of
+    (weighting grid paths, [(variable, value grid path), ...]), in doc_d order.
+    '''
+    groups = {}
+    for var in doc_d:
+        if doc_d[var]['fieldname'].upper() != "VALUE":
+            print("  !!! Variable %s: grid item %s; only VALUE grids are supported !!!" \
+                  % (var, doc_d[var]['fieldname']))
+            raise ValueError(var)
+        # If CREATEBASAREA is requested, no area scaling is needed
+        weightpaths = ()
+        if not BASAREA['BasinAreas']['FLAG']:
+            weightpaths = (doctbl_d['grdarea']['filepath'],)
+            if doc_d[var]['fieldtype'] != 'all':
+                weightpaths += (doctbl_d[doc_d[var]['fieldtype']]['filepath'],)
+        grd_key = doc_d[var]['srctable'][0]
+        groups.setdefault(weightpaths, []).append((var, doctbl_d[grd_key]['filepath']))
+    return list(groups.items())
+
+
 def CalcBasinStats(doctbl_d, doc_d):
+    ''' Compute the basin (zonal) statistics of each INGIS variable grid, in memory.
+    Unless the basin areas themselves are requested (BASAREA), the value grid is
+    first multiplied by the cell area grid (grdarea) and, for variables with a
+    'clfr*' fieldtype, by that cell fraction grid. All grids must have the
+    same dimensions as the basin zone grid (grdbasins); NoData cells in any of
+    them are left out. The basin zone grid is scanned once, into a basin-to-cell
+    index (BasinCellIndex()) shared by all variables. Variables sharing the same
+    weighting grids are reduced together, in one tiled pass (ZonalStats());
+    with FLAGS['ModelProcs'] > 1 (globalnews.py -j), the groups (GisVarGroups())
+    run in a pool of worker processes.
+    Return the dictionary of ZonalStats() results, by variable.
+    '''
+    index = BasinCellIndex(doctbl_d['grdbasins']['filepath'])
+    shape = tuple(int(n) for n in index['shape'])
+    print("ZONALSTATS 0:", doctbl_d['grdbasins']['filepath'], doctbl_d['grdarea']['filepath'])
+
+    groups = GisVarGroups(doctbl_d, doc_d)
+    for weightpaths, varpaths in groups:
+        print("ZONALSTATS:", ",".join(var for var, filepath in varpaths), "x", \
+              " x ".join(weightpaths) or "(no weights)")
+        # check the grids (and convert ASCII grids) before any worker reads them
+        for filepath in list(weightpaths) + [filepath for var, filepath in varpaths]:
+            OpenGridLike(filepath, shape)
+
+    procs = min(FLAGS.get('ModelProcs', 1), len(groups))
+    if procs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=procs, initializer=_gis_pool_init, \
+                                   initargs=(index, dict(FLAGS)))
+        results = list(pool.map(_gis_pool_task, [(weightpaths, varpaths, shape) \
+                                                 for weightpaths, varpaths in groups]))
+        pool.shutdown()
+    else:
+        results = [ZonalStats(index, weightpaths, varpaths, shape) for weightpaths, varpaths in groups]
+
+    stats_d = {}
+    for group_stats_d in results:
+        stats_d.update(group_stats_d)
+    return stats_d
+
+
+def _gis_pool_init(index, flags_d):
+    ''' CalcBasinStats() worker process initializer: keep the basin-to-cell index '''
+    global _gis_pool_index
+    _gis_pool_index = index
+    FLAGS.update(flags_d)
+
+
+def _gis_pool_task(task):
+    ''' Run the ZonalStats() of one CalcBasinStats() variable group '''
+    weightpaths, varpaths, shape = task
+    return ZonalStats(_gis_pool_index, weightpaths, varpaths, shape)
+
+
+def OpenGridLike(filepath, shape):
+    ''' Open grid filepath (gnraster.open_grid()), checking that it has the
+    dimensions (shape) of the basin zone grid.
+    '''
+    grid, nodata = gnraster.open_grid(filepath)
+    if grid.shape != shape:
+        print("  !!! Grid %s: dimensions %s differ from the basin grid %s !!!" \
+              % (filepath, grid.shape, shape))
+        raise ValueError(filepath)
+    return grid, nodata
+
+
+def GisGridPaths(doctbl_d, doc_d):
+    ''' Return the paths of all grids read by the zonal statistics of the INGIS
+    variables: the basin zone and cell area grids, and the value and cell
+    fraction grids of each variable.
+    '''
+    gridpaths = [doctbl_d['grdbasins']['filepath'], doctbl_d['grdarea']['filepath']]
+    for var in doc_d:
+        gridpaths.append(doctbl_d[doc_d[var]['srctable'][0]]['filepath'])
+        if doc_d[var]['fieldtype'] != 'all':
+            gridpaths.append(doctbl_d[doc_d[var]['fieldtype']]['filepath'])
+    return gridpaths
+
 
+def UseArcGIS(doctbl_d, doc_d):
+    ''' True if the zonal statistics must be computed with ArcGIS
+    (CalcBasinStatsArcGIS()): any grid is not in a format gnraster.py reads
+    (gnraster.find_grid()), eg an ArcInfo grid folder.
+    '''
+    return any(gnraster.find_grid(filepath) is None for filepath in GisGridPaths(doctbl_d, doc_d))
+
+
+def CalcBasinStatsArcGIS(doctbl_d, doc_d):
+    ''' ArcGIS (GeoProcessing) version of CalcBasinStats(), for ArcInfo grids:
+    the zonal statistics of each variable are written to <var>.dbf tables in
+    FPathTmpSpace, to be read by BasinStatsToOUTvarArrays().
+    '''
     import os, os.path, shutil
 
     # Initialize the gp object to work between versions (9x vs 8x)
@@ -184,22 +441,20 @@ def CalcBasinStats(doctbl_d, doc_d):
     del gp
 
 
-def BasinStatsToOUTvarArrays(doctbl_d, doc_d, data_d, in_data_d):
-    ''' ....
+def BasinStatsToOUTvarArrays(doctbl_d, doc_d, data_d, in_data_d, stats_d=None):
+    ''' Load the basin statistics (zonal 'sum') of each zonal statistics variable
+    into data_d (OUT), as float32 arrays in BasinID order, divided by the basin
+    area unless the basin areas themselves are requested. stats_d holds the
+    CalcBasinStats() results; if None, the CalcBasinStatsArcGIS() dbf tables are read.
     '''
     import os, os.path
-    from operator import itemgetter    
-    import dbf
 
-    # function to extract column i from 2D sequence; eg: acol2 = GetCol(a, 2)
-    GetCol = lambda seq, i: list(map(itemgetter(i), seq))
-    
     NoData = 0.0
     ExpFldsIdx = {'ID':0, 'mean':6, 'sum':8}
-    IDIdx = 0
+    stat = 'sum'
 
-    # Create set out of global BasinID's array
-    setBasinID = set(in_data_d['BasinID'])
+    # Sorted global BasinID's (unique)
+    basids = ny.unique(in_data_d['BasinID'])
 
     # Create list of OUT vars that are the result of zonalstats output
     # These varnames must be found in the IN vars as well, but can't be
@@ -209,34 +464,30 @@ def BasinStatsToOUTvarArrays(doctbl_d, doc_d, data_d, in_data_d):
     commonvars = list(SetCommon.difference(['BasinID', 'BasinArea']))
 
     for var in commonvars:
-        # Read temporary zonalstats dbf file
-        # SrcTbl[2:] holds the table data (records as rows)
-        # fieldnames = SrcTbl[0]   and     fieldspecs = SrcTbl[1]
-        f_SrcTbl = os.path.join(FPathTmpSpace, var + ".dbf")
-        f = open(f_SrcTbl, 'rb')
-        SrcTbl = list(dbf.dbfreader(f))
-        f.close()
-        # Remove dbf file and associated ArcGIS XML metadata file
-        os.remove(f_SrcTbl)
-        os.remove(f_SrcTbl + ".xml")
-
-        # Export basinid and basin stats (MEAN) fields to numpy arrays.
-        # In the list-comprehension BasFlds statement, retain only rows
-        # whose ID is found in the global BasinID's array
-        stat = 'sum'
-        BasFlds = [[row[ExpFldsIdx['ID']], float(row[ExpFldsIdx[stat]])] \
-                for row in SrcTbl[2:] if row[ExpFldsIdx['ID']] in setBasinID]
-
-        # Identify missing BasinID's, add them to array, insert corresponding
-        # NoData value for missing BasinID's, then sort by BasinID
-        basids = set(GetCol(BasFlds, IDIdx))
-        missingbasids = setBasinID.difference(basids)
-        BasFlds.extend(list(zip(missingbasids, [NoData] * len(missingbasids))))
-        BasFlds.sort(key=itemgetter(IDIdx))
-
-        # Convert to float32 numpy array and load into OUT
-        print("    ", var, type(BasFlds), len(BasFlds), len(BasFlds[0]), BasFlds[0:5])
-        data_d[var] = ny.array(GetCol(BasFlds, 1), dtype="float32")
+        if stats_d is not None:
+            zoneids, zonestat = stats_d[var]['ID'], stats_d[var][stat]
+        else:
+            import dbf
+            # Read the zone ID and stat fields of the temporary zonalstats dbf file
+            f_SrcTbl = os.path.join(FPathTmpSpace, var + ".dbf")
+            f = open(f_SrcTbl, 'rb')
+            fieldnames = dbf.dbfheader(f)[0]
+            f.seek(0)
+            names, specs, columns = dbf.dbfreader_columns(f, \
+                [fieldnames[ExpFldsIdx['ID']], fieldnames[ExpFldsIdx[stat]]])
+            f.close()
+            # Remove dbf file and associated ArcGIS XML metadata file
+            os.remove(f_SrcTbl)
+            os.remove(f_SrcTbl + ".xml")
+            zoneids, zonestat = columns[0].astype("int64"), columns[1].astype("float64")
+
+        # Retain only zones whose ID is found in the global BasinID's array;
+        # missing BasinID's get the NoData value
+        pos = ny.searchsorted(basids, zoneids).clip(0, len(basids) - 1)
+        found = basids[pos] == zoneids
+        data_d[var] = ny.full(len(basids), NoData, dtype="float32")
+        data_d[var][pos[found]] = zonestat[found]
+        print("    ", var, len(basids), "basins,", (~found).sum(), "zones not in BasinID's")
 
         # For normal arrays (not basin areas), numpy-divide by basin area
         if not BASAREA['BasinAreas']['FLAG']:
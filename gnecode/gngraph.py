@@ -0,0 +1,237 @@
+""" gngraph.py
+Global NEWS 2 model, GNE implementation.
+This module holds the dependency graph of the named intermediate quantities
+shared by the sub-model (Calc_*) functions, eg, runoff in m/yr or the
+agricultural area fraction. Each node is declared once (declare()) with
+the names of the nodes or the IN/OUT variables it is computed from, and
+is computed at most once per model run, on first use (get()).
+Node lifetimes are explicit: schedule() is given the node uses of all the
+model steps to be run, and each step hands its uses back (release()) when
+it is done; a node value is freed as soon as no remaining step or
+downstream node needs it. describe() and upstream() show the graph;
+describe_outputs() shows, for each exported OUT variable, the nodes used by
+the model step that exported it (recorded by ExportVar(), see record_output()).
+
+Node names may take a nutrient form or element parameter, in brackets
+(eg, 'FErivws[DIN]'); '{p}' in the declared dependency names is replaced
+by the parameter (eg, 'OUT.{p}FEriv' -> 'OUT.DINFEriv').
+
+AVAILABILITY, USE RESTRICTIONS, AND CONTACT INFORMATION
+-------------------------------------------------------
+The Global NEWS 2 model ("NEWS 2") and the Global NEWS modeling Environment (GNE)
+were developed by the Global NEWS group and are available at our web site:
+http://www.marine.rutgers.edu/globalnews/
+We encourage its use for research and educational (non-commercial) purposes, but
+we request that active users contact us to inform about how it is being applied.
+Such feedback and reporting will improve our continued development of the model code.
+Global NEWS is a work group of UNESCO's Intergovernmental Oceanographic Commission (IOC).
+
+Use of NEWS 2 should be ackwnowledged by citing Mayorga et al (in review);
+Beusen et al. (2009) and Billen and Garnier (2007) should also be cited if
+the DSi model and the ICEP index, respectively, are also used.
+
+For questions and additional information, please contact:
+Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
+Applied Physics Laboratory, University of Washington
+Seattle, WA  USA
+---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: Added record_output() and describe_outputs(): the nodes used by the model
+ step of each exported OUT variable, and their IN/OUT variables.
+10/18/2026: The graph run state (MEMO, REFS, STATS) belongs to the active run context.
+10/18/2026: Created.
+"""
+
+
+import numpy as ny
+
+from gncfg import *
+from gnrun import RunDict
+
+__version__ = '$Revision: 2026-10-18$'
+
+
+# Declared nodes: NODES[name] = {'deps':(dep names), 'func':callable, 'doc':str}
+NODES = {}
+
+# Run state (in the active run context, see gnrun.py): memoized node values,
+# remaining uses (reference counts) and counters
+MEMO = RunDict('GRAPH_MEMO')
+REFS = RunDict('GRAPH_REFS')
+STATS = RunDict('GRAPH_STATS')
+# OUTPUTS[OUT variable] = (model step, parameter) that exported it (see record_output())
+OUTPUTS = RunDict('GRAPH_OUTPUTS')
+
+
+def declare(name, deps, func, doc=""):
+    """ Declare node name, computed as func(*values of deps). Dependencies are
+    other node names or input/output variables ('IN.varname', 'OUT.varname').
+    """
+    NODES[name] = {'deps':tuple(deps), 'func':func, 'doc':doc}
+
+
+def split_key(key):
+    """ Split a node key into (node name, parameter or None): 'FEriv[DIN]' -> ('FEriv', 'DIN') """
+    if key.endswith(']'):
+        name, param = key[:-1].split('[', 1)
+        return name, param
+    return key, None
+
+
+def is_leaf(dep):
+    """ True if dep is an input or output variable, rather than a graph node """
+    return dep.startswith('IN.') or dep.startswith('OUT.')
+
+
+def node_deps(key):
+    """ Return the dependencies of node key, with its parameter substituted """
+    name, param = split_key(key)
+    if name not in NODES:
+        print("  !!! Graph node %s is not declared !!!" % name)
+        raise KeyError(name)
+    return [dep.replace('{p}', param or '') for dep in NODES[name]['deps']]
+
+
+def leaf_value(dep):
+    """ Return the IN or OUT array of a leaf dependency """
+    datadict, varname = dep.split('.', 1)
+    return {'IN':IN, 'OUT':OUT}[datadict][varname]
+
+
+def schedule(uses):
+    """ Start a model run: reset the graph state and count the uses of each node.
+    uses lists the node keys used by each model step to be run (a key appears
+    once per step). The dependencies of every node reachable from uses are
+    counted as used once by that node.
+    """
+    clear()
+    pending = []
+    for key in uses:
+        if key not in REFS:
+            pending.append(key)
+        REFS[key] = REFS.get(key, 0) + 1
+    while pending:
+        for dep in node_deps(pending.pop()):
+            if not is_leaf(dep):
+                if dep not in REFS:
+                    pending.append(dep)
+                REFS[dep] = REFS.get(dep, 0) + 1
+
+
+def get(key):
+    """ Return the value of node key, computing it (and its dependencies) on first use.
+    Values of scheduled nodes are memoized, as read-only arrays, until released.
+    """
+    if key in MEMO:
+        STATS['hits'] = STATS.get('hits', 0) + 1
+        return MEMO[key]
+
+    deps = node_deps(key)
+    value = NODES[split_key(key)[0]]['func']( \
+        *[leaf_value(dep) if is_leaf(dep) else get(dep) for dep in deps])
+    STATS['computed'] = STATS.get('computed', 0) + 1
+    if REFS.get(key, 0) > 0:
+        if isinstance(value, ny.ndarray):
+            value.flags.writeable = False
+        MEMO[key] = value
+        # this node holds the only use of its dependencies' values
+        release([dep for dep in deps if not is_leaf(dep)])
+
+    return value
+
+
+def release(keys):
+    """ Hand back one use of each node in keys (a model step, or a node, is done
+    with them). A node with no uses left is freed; if it was never computed,
+    the uses it held on its own dependencies are released too.
+    """
+    for key in keys:
+        if REFS.get(key, 0) <= 0:
+            continue
+        REFS[key] -= 1
+        if REFS[key] == 0:
+            del REFS[key]
+            if key in MEMO:
+                del MEMO[key]
+                STATS['freed'] = STATS.get('freed', 0) + 1
+            else:
+                release([dep for dep in node_deps(key) if not is_leaf(dep)])
+
+
+def clear():
+    """ Free all node values and reset the graph state """
+    MEMO.clear()
+    REFS.clear()
+    OUTPUTS.clear()
+    STATS.update(computed=0, hits=0, freed=0)
+
+
+def record_output(varname, step, param=None):
+    """ Record that OUT variable varname was exported by model step (function
+    name) step, run for nutrient form or element param. Only recorded when the
+    graph is shown (FLAGS['ShowGraph']).
+    """
+    if FLAGS.get('ShowGraph'):
+        OUTPUTS[varname] = (step, param)
+
+
+def upstream(key):
+    """ Return the set of IN and OUT variables that node key depends on, directly or not """
+    leaves = set()
+    for dep in node_deps(key):
+        if is_leaf(dep):
+            leaves.add(dep)
+        else:
+            leaves.update(upstream(dep))
+    return leaves
+
+
+def describe(uses=None):
+    """ Return a list of text lines describing the graph: for each node (each
+    node key in uses, or each declared node), its direct dependencies, its
+    number of scheduled uses and the IN/OUT variables it is computed from.
+    """
+    if uses is None:
+        keys = sorted(NODES)
+    else:
+        keys = []
+        for key in uses:
+            if key not in keys:
+                keys.append(key)
+    lines = []
+    for key in keys:
+        doc = NODES[split_key(key)[0]]['doc']
+        lines.append("%s: %s" % (key, doc) if doc else key)
+        lines.append("    deps:     " + ", ".join(node_deps(key)))
+        if uses is not None:
+            lines.append("    uses:     %d" % list(uses).count(key))
+        lines.append("    upstream: " + ", ".join(sorted(upstream(key))))
+    return lines
+
+
+def describe_outputs(step_uses, varnames=None):
+    """ Return a list of text lines describing, for the recorded OUT variables
+    (see record_output(); or those in varnames) grouped by the model step that
+    exported them, the nodes that step uses (step_uses(step, param) returns
+    their keys) and the IN/OUT variables each node is computed from.
+    Variables whose step uses no node are summarized in the last line.
+    """
+    if varnames is None:
+        varnames = list(OUTPUTS.keys())
+    steps, nonode = {}, []
+    for var in varnames:
+        if var in OUTPUTS:
+            steps.setdefault(OUTPUTS[var], []).append(var)
+    lines = []
+    for (step, param), stepvars in steps.items():
+        keys = step_uses(step, param)
+        if not keys:
+            nonode += stepvars
+            continue
+        lines.append("%s <- %s%s" % (", ".join(stepvars), step, "[%s]" % param if param else ""))
+        for key in keys:
+            lines.append("    %s <- %s" % (key, ", ".join(sorted(upstream(key)))))
+    if nonode:
+        lines.append("%d other output variables use no shared intermediate" % len(nonode))
+    return lines
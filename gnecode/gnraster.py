@@ -0,0 +1,303 @@
+""" gnraster.py
+Global NEWS 2 model, GNE implementation.
+This module reads the raster grids used by the GIS pre-processor
+(gis2tbls, see gngis2tbls.py) into numpy arrays, without ArcGIS.
+Grids are opened as read-only numpy memmaps (open_grid()) and read in
+windows of whole rows (row_tiles(), read_window()), so that fine
+resolution global grids are processed tile by tile, in bounded memory.
+Supported grid formats:
+- ESRI float grids: <name>.flt binary data, with a <name>.hdr header
+  (ncols, nrows, xllcorner, yllcorner, cellsize, NODATA_value, byteorder)
+- ESRI BIL grids: <name>.bil single band binary data, with a <name>.hdr
+  header (nrows, ncols, nbits, pixeltype, byteorder, skipbytes, nodata)
+- ESRI ASCII grids: <name>.asc (the .flt header, followed by the cell
+  values), converted once to a .flt grid in FPathGridCache
+A gis2tbls.cfg grid path may be given without its extension (as ArcInfo
+grids are); the first existing <path>.flt, .bil or .asc file is then used.
+
+AVAILABILITY, USE RESTRICTIONS, AND CONTACT INFORMATION
+-------------------------------------------------------
+The Global NEWS 2 model ("NEWS 2") and the Global NEWS modeling Environment (GNE)
+were developed by the Global NEWS group and are available at our web site:
+http://www.marine.rutgers.edu/globalnews/
+We encourage its use for research and educational (non-commercial) purposes, but
+we request that active users contact us to inform about how it is being applied.
+Such feedback and reporting will improve our continued development of the model code.
+Global NEWS is a work group of UNESCO's Intergovernmental Oceanographic Commission (IOC).
+
+Use of NEWS 2 should be ackwnowledged by citing Mayorga et al (in review);
+Beusen et al. (2009) and Billen and Garnier (2007) should also be cited if
+the DSi model and the ICEP index, respectively, are also used.
+
+For questions and additional information, please contact:
+Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
+Applied Physics Laboratory, University of Washington
+Seattle, WA  USA
+---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: ascii_to_flt() temporary files are named by process and thread.
+10/18/2026: Added grid_stamp() and cached_grid_hash(): grid content hashes are kept in a
+ hash index, by file sizes and modification times, so unchanged grids are not re-read.
+10/18/2026: Added find_grid(), to test whether a grid is in a supported format.
+10/18/2026: Grids are memory-mapped and read in row tiles (open_grid(), row_tiles(),
+ read_window()); added .bil grids; ASCII grids are converted once to .flt (ascii_to_flt()).
+10/18/2026: Added grid_shape() and grid_hash().
+10/18/2026: Created.
+"""
+
+
+import os, os.path
+import hashlib
+import json
+import threading
+import numpy as ny
+from gncfg import *
+import gntblio
+
+__version__ = '$Revision: 2026-10-18$'
+
+GRID_EXTENSIONS = ('.flt', '.bil', '.asc')
+
+# Header keys (lower case) and their types, of ESRI float (.flt), BIL (.bil)
+# and ASCII (.asc) grid headers
+HEADER_KEYS = {'ncols':int, 'nrows':int, 'xllcorner':float, 'yllcorner':float, \
+               'xllcenter':float, 'yllcenter':float, 'cellsize':float, \
+               'nodata_value':float, 'byteorder':str, \
+               'nbands':int, 'nbits':int, 'pixeltype':str, 'layout':str, 'skipbytes':int, \
+               'nodata':float, 'ulxmap':float, 'ulymap':float, 'xdim':float, 'ydim':float}
+
+# Header byteorder values: .flt (LSBFIRST, MSBFIRST) and .bil (I, M)
+BYTEORDERS = {'LSBFIRST':'<', 'MSBFIRST':'>', 'I':'<', 'M':'>'}
+
+# .bil (pixeltype, nbits) numpy dtype kinds; pixeltype defaults to unsigned integers
+BIL_KINDS = {'SIGNEDINT':'i', 'UNSIGNEDINT':'u', 'FLOAT':'f'}
+
+
+def find_grid(filepath):
+    """ Return the grid data file for a gis2tbls.cfg grid path: filepath itself
+    if it has a supported extension, else the first existing filepath + extension.
+    None if there is no such file (eg, filepath is an ArcInfo grid folder).
+    """
+    if os.path.splitext(filepath)[1].lower() in GRID_EXTENSIONS:
+        if os.path.exists(filepath):
+            return filepath
+    else:
+        for ext in GRID_EXTENSIONS:
+            if os.path.exists(filepath + ext):
+                return filepath + ext
+    return None
+
+
+def grid_path(filepath):
+    """ Return the grid data file for a gis2tbls.cfg grid path (see find_grid()) """
+    gridpath = find_grid(filepath)
+    if gridpath is not None:
+        return gridpath
+    print("  !!! Grid %s not found (supported formats: %s) !!!" % (filepath, ", ".join(GRID_EXTENSIONS)))
+    raise ValueError(filepath)
+
+
+def header_path(filepath):
+    """ Return the header file of a binary (.flt, .bil) grid data file """
+    return os.path.splitext(filepath)[0] + '.hdr'
+
+
+def parse_header(lines):
+    """ Parse ESRI grid header lines ("key value") into a dictionary;
+    'nheader' is the number of header lines found.
+    """
+    hdr = {'nodata_value':None, 'byteorder':'LSBFIRST', 'nheader':0}
+    for line in lines:
+        items = line.split()
+        if len(items) == 2 and items[0].lower() in HEADER_KEYS:
+            hdr[items[0].lower()] = HEADER_KEYS[items[0].lower()](items[1])
+            hdr['nheader'] += 1
+    if 'nodata' in hdr:
+        hdr['nodata_value'] = hdr['nodata']
+    return hdr
+
+
+def read_header(filepath):
+    """ Return the header dictionary of grid filepath (a .flt, .bil or .asc file) """
+    if filepath.lower().endswith('.asc'):
+        fp = open(filepath, "r")
+        hdr = parse_header([fp.readline() for i in range(6)])
+    else:
+        fp = open(header_path(filepath), "r")
+        hdr = parse_header(fp.readlines())
+    fp.close()
+    for key in ('ncols', 'nrows'):
+        if key not in hdr:
+            print("  !!! Grid %s: header has no %s !!!" % (filepath, key))
+            raise ValueError(filepath)
+    return hdr
+
+
+def grid_shape(filepath):
+    """ Return the (nrows, ncols) dimensions of grid filepath (see grid_path()) """
+    hdr = read_header(grid_path(filepath))
+    return (hdr['nrows'], hdr['ncols'])
+
+
+def grid_hash(filepath):
+    """ Content hash (sha1 hex digest) of grid filepath (see grid_path()): its
+    header and data files, read in blocks (the grid is not loaded in memory).
+    """
+    filepath = grid_path(filepath)
+    h = hashlib.sha1()
+    filepaths = [filepath]
+    if not filepath.lower().endswith('.asc'):
+        filepaths.insert(0, header_path(filepath))
+    for fpath in filepaths:
+        fp = open(fpath, "rb")
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            h.update(block)
+        fp.close()
+    return h.hexdigest()
+
+
+def grid_stamp(filepath):
+    """ Return the [size, modification time (ns)] of each file of grid filepath
+    (see grid_path()): the header (for .flt and .bil grids) and data files.
+    """
+    filepath = grid_path(filepath)
+    filepaths = [filepath]
+    if not filepath.lower().endswith('.asc'):
+        filepaths.insert(0, header_path(filepath))
+    stamp = []
+    for fpath in filepaths:
+        st = os.stat(fpath)
+        stamp += [st.st_size, st.st_mtime_ns]
+    return stamp
+
+
+def cached_grid_hash(filepath, cachedir):
+    """ grid_hash() of grid filepath, looked up in the hash index of cachedir
+    (cachedir/hashes.json), which records the grid_stamp() and content hash of
+    every grid seen: an unchanged grid (same file sizes and modification
+    times) is not read again. Otherwise the grid is hashed and the index updated.
+    """
+    indexpath = os.path.join(cachedir, "hashes.json")
+    abspath = os.path.abspath(grid_path(filepath))
+    stamp = grid_stamp(filepath)
+    try:
+        fp = open(indexpath, "r")
+        index = json.load(fp)
+        fp.close()
+    except (IOError, ValueError):
+        index = {}
+    if abspath in index and index[abspath][:-1] == stamp:
+        return index[abspath][-1]
+
+    sha1 = grid_hash(filepath)
+    index[abspath] = stamp + [sha1]
+    os.makedirs(cachedir, exist_ok=True)
+    gntblio.write_json_atomic(indexpath, index)
+    return sha1
+
+
+def ascii_to_flt(filepath):
+    """ Return the .flt grid converted from ASCII grid filepath. The conversion
+    is done once, streaming the values row by row, into FPathGridCache (keyed
+    by the ASCII grid contents hash, see cached_grid_hash()); later calls reuse
+    the converted grid.
+    """
+    fltpath = os.path.join(FPathGridCache, cached_grid_hash(filepath, FPathGridCache) + '.flt')
+    if os.path.exists(fltpath):
+        return fltpath
+
+    hdr = read_header(filepath)
+    os.makedirs(FPathGridCache, exist_ok=True)
+    tmpsuffix = ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
+    tmppath = fltpath + tmpsuffix
+    fpin, fpout = open(filepath, "r"), open(tmppath, "wb")
+    for i in range(hdr['nheader']):
+        fpin.readline()
+    ncells = 0
+    for line in fpin:
+        row = ny.array(line.split(), dtype='<f4')
+        row.tofile(fpout)
+        ncells += row.size
+    fpin.close()
+    fpout.close()
+    if ncells != hdr['nrows'] * hdr['ncols']:
+        os.remove(tmppath)
+        print("  !!! Grid %s: %d cells read, %d expected !!!" % (filepath, ncells, hdr['nrows'] * hdr['ncols']))
+        raise ValueError(filepath)
+
+    tmphdr = header_path(fltpath) + tmpsuffix
+    fp = open(tmphdr, "w")
+    for key in ('ncols', 'nrows', 'xllcorner', 'yllcorner', 'xllcenter', 'yllcenter', 'cellsize'):
+        if key in hdr:
+            fp.write("%-14s%s\n" % (key, hdr[key]))
+    if hdr['nodata_value'] is not None:
+        fp.write("%-14s%r\n" % ('NODATA_value', hdr['nodata_value']))
+    fp.write("%-14s%s\n" % ('byteorder', 'LSBFIRST'))
+    fp.close()
+    os.replace(tmphdr, header_path(fltpath))
+    os.replace(tmppath, fltpath)
+    if FLAGS.get('verbose'): print("  ASCII grid %s converted to %s" % (filepath, fltpath))
+    return fltpath
+
+
+def open_grid(filepath):
+    """ Open grid filepath (see grid_path()) as a read-only (nrows, ncols) numpy
+    memmap; no cell is read until used. ASCII grids are first converted to .flt
+    (ascii_to_flt()). Return (memmap, NoData value or None).
+    """
+    filepath = grid_path(filepath)
+    if filepath.lower().endswith('.asc'):
+        filepath = ascii_to_flt(filepath)
+    hdr = read_header(filepath)
+
+    offset = 0
+    if filepath.lower().endswith('.bil'):
+        if hdr.get('nbands', 1) != 1:
+            print("  !!! Grid %s: only single band .bil grids are supported !!!" % filepath)
+            raise ValueError(filepath)
+        kind = BIL_KINDS[hdr.get('pixeltype', 'UNSIGNEDINT').upper()]
+        dtype = BYTEORDERS[hdr['byteorder'].upper()] + kind + str(hdr.get('nbits', 8) // 8)
+        offset = hdr.get('skipbytes', 0)
+    else:
+        dtype = BYTEORDERS[hdr['byteorder'].upper()] + 'f4'
+
+    shape = (hdr['nrows'], hdr['ncols'])
+    if os.path.getsize(filepath) < offset + shape[0] * shape[1] * ny.dtype(dtype).itemsize:
+        print("  !!! Grid %s: file is smaller than its %dx%d %s cells !!!" % (filepath, shape[0], shape[1], dtype))
+        raise ValueError(filepath)
+    return ny.memmap(filepath, dtype=dtype, mode='r', offset=offset, shape=shape), hdr['nodata_value']
+
+
+def row_tiles(shape, maxcells=None):
+    """ Return the (first row, end row) windows splitting a grid of dimensions
+    shape into tiles of whole rows, of at most maxcells cells (GridTileCells)
+    unless a single row is larger.
+    """
+    if maxcells is None:
+        maxcells = GridTileCells
+    nrows = max(1, maxcells // shape[1])
+    return [(r0, min(r0 + nrows, shape[0])) for r0 in range(0, shape[0], nrows)]
+
+
+def read_window(grid, nodata, r0, r1):
+    """ Read rows r0 to r1 (excluded) of an open_grid() grid as a float64 array.
+    Return (array, valid), where valid is the boolean array of data (not NoData) cells.
+    """
+    window = ny.asarray(grid[r0:r1])
+    values = window.astype('float64')
+    valid = ~ny.isnan(values)
+    if nodata is not None:
+        valid &= values != nodata
+        if window.dtype.kind == 'f':
+            # NoData values stored at single precision, eg -3.4028235e+38
+            valid &= window != window.dtype.type(nodata)
+    return values, valid
+
+
+def read_grid(filepath):
+    """ Read all of grid filepath (see grid_path()) into a (nrows, ncols) float64 array.
+    Return (array, valid), as read_window().
+    """
+    grid, nodata = open_grid(filepath)
+    return read_window(grid, nodata, 0, grid.shape[0])
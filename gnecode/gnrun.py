@@ -0,0 +1,143 @@
+""" gnrun.py
+Global NEWS 2 model, GNE implementation.
+This module holds the model run contexts. The run state dictionaries
+declared in gncfg.py (IN, OUT, CCAL, RUN, FLAGS, INDOC, ...) are RunDict
+proxies: every access is forwarded to the dictionary of that name in the
+run context that is active in the calling thread (or asyncio task), tracked
+with a context variable. Each RunContext owns its own dictionaries, so that
+several model runs can live side by side in one process, on different
+threads, without sharing any state. When no context is active (eg, plain
+globalnews.py command-line runs) a process-wide default state is used.
+
+A context is activated with:
+    with runctx.active():
+        ... (gne code using IN, OUT, etc)
+
+AVAILABILITY, USE RESTRICTIONS, AND CONTACT INFORMATION
+-------------------------------------------------------
+The Global NEWS 2 model ("NEWS 2") and the Global NEWS modeling Environment (GNE)
+were developed by the Global NEWS group and are available at our web site:
+http://www.marine.rutgers.edu/globalnews/
+We encourage its use for research and educational (non-commercial) purposes, but
+we request that active users contact us to inform about how it is being applied.
+Such feedback and reporting will improve our continued development of the model code.
+Global NEWS is a work group of UNESCO's Intergovernmental Oceanographic Commission (IOC).
+
+Use of NEWS 2 should be ackwnowledged by citing Mayorga et al (in review);
+Beusen et al. (2009) and Billen and Garnier (2007) should also be cited if
+the DSi model and the ICEP index, respectively, are also used.
+
+For questions and additional information, please contact:
+Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
+Applied Physics Laboratory, University of Washington
+Seattle, WA  USA
+---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: Created.
+"""
+
+
+import contextvars
+from contextlib import contextmanager
+from collections.abc import MutableMapping
+
+__version__ = '$Revision: 2026-10-18$'
+
+
+# State (dictionary name -> dictionary) of the active run context, if any
+_active_state = contextvars.ContextVar('gne_run_state', default=None)
+
+# Process-wide default state, used when no run context is active
+_default_state = {}
+
+
+def current_state():
+    """ Return the state dictionary of the active run context (or the default state) """
+    state = _active_state.get()
+    return _default_state if state is None else state
+
+
+class RunDict(MutableMapping):
+    """ Proxy for the run state dictionary name of the active run context """
+    __slots__ = ('_name',)
+
+    def __init__(self, name):
+        self._name = name
+
+    def target(self):
+        """ Return the actual dictionary, in the active run context """
+        state = current_state()
+        try:
+            return state[self._name]
+        except KeyError:
+            return state.setdefault(self._name, {})
+
+    def __getitem__(self, key):
+        return self.target()[key]
+
+    def __setitem__(self, key, value):
+        self.target()[key] = value
+
+    def __delitem__(self, key):
+        del self.target()[key]
+
+    def __iter__(self):
+        return iter(self.target())
+
+    def __len__(self):
+        return len(self.target())
+
+    def __contains__(self, key):
+        return key in self.target()
+
+    def get(self, key, default=None):
+        return self.target().get(key, default)
+
+    def clear(self):
+        self.target().clear()
+
+    def update(self, *args, **kwargs):
+        self.target().update(*args, **kwargs)
+
+    def copy(self):
+        return self.target().copy()
+
+    def __repr__(self):
+        return "RunDict(%s: %r)" % (self._name, self.target())
+
+    def __reduce__(self):
+        # pickled (eg, sent to another process) as a plain dictionary snapshot
+        return (dict, (self.target().copy(),))
+
+
+class RunContext(object):
+    """ A model run state: its own set of run state dictionaries (see RunDict).
+    runctx[name] returns the actual dictionary name (eg, 'IN') of this context.
+    """
+
+    def __init__(self, **dicts):
+        self.state = {}
+        for name, d in dicts.items():
+            self.state[name] = dict(d)
+
+    def __getitem__(self, name):
+        return self.state.setdefault(name, {})
+
+    @contextmanager
+    def active(self):
+        """ Make this the active run context, in the calling thread, within a with block """
+        token = _active_state.set(self.state)
+        try:
+            yield self
+        finally:
+            _active_state.reset(token)
+
+
+def context_map(pool, func, iterable):
+    """ pool.map(func, iterable), on a concurrent.futures thread pool, with each
+    call running in (a copy of) the calling thread's context, so that worker
+    threads see the active run context.
+    """
+    calls = [(contextvars.copy_context(), item) for item in iterable]
+    return pool.map(lambda call: call[0].run(func, call[1]), calls)
@@ -0,0 +1,206 @@
+""" gnsa.py
+Global NEWS 2 model, GNE implementation.
+This module implements the sample designs and the streaming estimators
+of the global sensitivity analysis (globalnews.py --sensitivity option):
+- Sobol (variance-based) first-order and total indices, from the Saltelli
+  (2010) radial sample design [A; B; AB_1 ... AB_k], with the Saltelli (2010)
+  first-order and Jansen (1999) total effect estimators.
+- Morris elementary effects (mu, mu*, sigma), from random one-at-a-time
+  trajectories on a p-level grid.
+Samples are generated and evaluated in chunks; each chunk of model outputs,
+(n_samples, n_basins) arrays, is folded into running sums by the *_update()
+functions and discarded, so that the full sample x basin x variable array
+is never held in memory. Factor values are handled in the unit hypercube
+[0, 1]^k; use scale_unit() to map them to the factor ranges.
+
+AVAILABILITY, USE RESTRICTIONS, AND CONTACT INFORMATION
+-------------------------------------------------------
+The Global NEWS 2 model ("NEWS 2") and the Global NEWS modeling Environment (GNE)
+were developed by the Global NEWS group and are available at our web site:
+http://www.marine.rutgers.edu/globalnews/
+We encourage its use for research and educational (non-commercial) purposes, but
+we request that active users contact us to inform about how it is being applied.
+Such feedback and reporting will improve our continued development of the model code.
+Global NEWS is a work group of UNESCO's Intergovernmental Oceanographic Commission (IOC).
+
+Use of NEWS 2 should be ackwnowledged by citing Mayorga et al (in review);
+Beusen et al. (2009) and Billen and Garnier (2007) should also be cited if
+the DSi model and the ICEP index, respectively, are also used.
+
+For questions and additional information, please contact:
+Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
+Applied Physics Laboratory, University of Washington
+Seattle, WA  USA
+---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: Created.
+"""
+
+
+import numpy as ny
+
+__version__ = '$Revision: 2026-10-18$'
+
+
+def scale_unit(unit, lo, hi):
+    """ Map unit hypercube samples (n, k) to the factor ranges [lo, hi] (k each) """
+    lo, hi = ny.asarray(lo, dtype='float64'), ny.asarray(hi, dtype='float64')
+    return lo + unit * (hi - lo)
+
+
+# =====================================================================
+# SOBOL INDICES
+
+def sobol_chunk(rng, nbase, nfactors):
+    """ Draw nbase rows of the independent sample matrices A and B, and return
+    the (nbase * (nfactors + 2), nfactors) chunk of unit samples, in blocks:
+    A, B, AB_1, ..., AB_k (AB_i: A with column i taken from B).
+    """
+    A = rng.random((nbase, nfactors))
+    B = rng.random((nbase, nfactors))
+    blocks = [A, B]
+    for i in range(nfactors):
+        ABi = A.copy()
+        ABi[:, i] = B[:, i]
+        blocks.append(ABi)
+
+    return ny.concatenate(blocks)
+
+
+def sobol_init(nfactors, shape):
+    """ Running sums for the Sobol estimators, for model outputs of the given
+    per-sample shape (eg, (n_basins,)).
+    """
+    return {'n':0, 'mean':ny.zeros(shape), 'm2':ny.zeros(shape), \
+            'first':ny.zeros((nfactors,) + shape), 'total':ny.zeros((nfactors,) + shape)}
+
+
+def sobol_update(acc, fchunk):
+    """ Fold a chunk of model outputs, evaluated on a sobol_chunk() design
+    (first axis in the same block order), into the running sums acc.
+    """
+    nfactors = acc['first'].shape[0]
+    nbase = fchunk.shape[0] // (nfactors + 2)
+    fblocks = fchunk.reshape((nfactors + 2, nbase) + fchunk.shape[1:])
+    fA, fB = fblocks[0], fblocks[1]
+
+    # Total variance, from all A and B outputs: parallel (Chan et al) update
+    # of the running mean and sum of squared deviations
+    fAB = ny.concatenate((fA, fB))
+    n, nnew = acc['n'], fAB.shape[0]
+    mean_new = fAB.mean(0)
+    delta = mean_new - acc['mean']
+    acc['m2'] += ((fAB - mean_new) ** 2).sum(0) + delta ** 2 * n * nnew / (n + nnew)
+    acc['mean'] += delta * nnew / (n + nnew)
+    acc['n'] = n + nnew
+
+    for i in range(nfactors):
+        fABi = fblocks[i + 2]
+        # Saltelli et al (2010): V_i = E[f(B) (f(AB_i) - f(A))]
+        acc['first'][i] += (fB * (fABi - fA)).sum(0)
+        # Jansen (1999): VT_i = E[(f(A) - f(AB_i))^2] / 2
+        acc['total'][i] += ((fA - fABi) ** 2).sum(0)
+
+
+def sobol_indices(acc):
+    """ Return (S, ST), the first-order and total Sobol indices, (nfactors,) + shape.
+    Indices are NaN where the output variance is 0.
+    """
+    nbase = acc['n'] // 2
+    var = acc['m2'] / max(acc['n'] - 1, 1)
+    with ny.errstate(divide='ignore', invalid='ignore'):
+        S = ny.where(var > 0, (acc['first'] / nbase) / var, ny.nan)
+        ST = ny.where(var > 0, (acc['total'] / (2.0 * nbase)) / var, ny.nan)
+
+    return S, ST
+
+
+# =====================================================================
+# MORRIS ELEMENTARY EFFECTS
+
+def morris_chunk(rng, ntraj, nfactors, levels=4):
+    """ Draw ntraj random one-at-a-time trajectories on a levels-level grid.
+    Return (unit, steps): the (ntraj * (nfactors + 1), nfactors) unit samples,
+    trajectory after trajectory, and the (ntraj, nfactors) array of signed
+    steps, steps[t, j] being the factor change (+/-delta) between points j and j+1
+    of trajectory t, with the factor moved at each step in order[t, j].
+    """
+    delta = levels / (2.0 * (levels - 1))
+    # start points on the grid, such that x + delta stays within [0, 1]
+    base = rng.integers(0, levels // 2, size=(ntraj, nfactors)) / (levels - 1.0)
+    signs = rng.choice([-1.0, 1.0], size=(ntraj, nfactors))
+    # start from the upper end of the step for negative steps
+    start = ny.where(signs > 0, base, base + delta)
+    order = ny.argsort(rng.random((ntraj, nfactors)), axis=1)
+
+    points = ny.empty((ntraj, nfactors + 1, nfactors))
+    points[:, 0] = start
+    for j in range(nfactors):
+        points[:, j + 1] = points[:, j]
+        moved = order[:, j]
+        points[ny.arange(ntraj), j + 1, moved] += signs[ny.arange(ntraj), moved] * delta
+    steps = signs[ny.arange(ntraj)[:, None], order] * delta
+
+    return points.reshape(-1, nfactors), {'steps':steps, 'order':order}
+
+
+def morris_init(nfactors, shape):
+    """ Running sums of the elementary effects, for outputs of the given shape """
+    return {'n':0, 'sum':ny.zeros((nfactors,) + shape), \
+            'sumabs':ny.zeros((nfactors,) + shape), 'sumsq':ny.zeros((nfactors,) + shape)}
+
+
+def morris_update(acc, fchunk, design):
+    """ Fold a chunk of model outputs, evaluated on a morris_chunk() design,
+    into the running sums acc.
+    """
+    steps, order = design['steps'], design['order']
+    ntraj, nfactors = steps.shape
+    ftraj = fchunk.reshape((ntraj, nfactors + 1) + fchunk.shape[1:])
+    extra = (1,) * (fchunk.ndim - 1)
+    for j in range(nfactors):
+        # elementary effect of factor order[t, j], for every trajectory t
+        ee = (ftraj[:, j + 1] - ftraj[:, j]) / steps[:, j].reshape((ntraj,) + extra)
+        for i in range(nfactors):
+            sel = order[:, j] == i
+            if sel.any():
+                acc['sum'][i] += ee[sel].sum(0)
+                acc['sumabs'][i] += ny.abs(ee[sel]).sum(0)
+                acc['sumsq'][i] += (ee[sel] ** 2).sum(0)
+    acc['n'] += ntraj
+
+
+def morris_indices(acc):
+    """ Return (mu, mustar, sigma): the mean, mean absolute value and standard
+    deviation of the elementary effects of each factor, (nfactors,) + shape.
+    """
+    n = acc['n']
+    mu = acc['sum'] / n
+    mustar = acc['sumabs'] / n
+    sigma = ny.sqrt(ny.maximum(acc['sumsq'] - n * mu ** 2, 0.0) / max(n - 1, 1))
+
+    return mu, mustar, sigma
+
+
+# =====================================================================
+# REGIONAL AGGREGATES
+
+def region_means(f, weight, codes, nregions):
+    """ Weighted means of the (n_samples, n_basins) model outputs f over the
+    basins of each region (codes: region index of each basin, -1 for none),
+    plus a last, global column: (n_samples, nregions + 1).
+    Non-finite values, and the -999 no-data flag (eg, ICEP), are excluded.
+    """
+    valid = ny.isfinite(f) & (f != -999)
+    wf = ny.where(valid, f * weight, 0.0)
+    wv = ny.where(valid, weight, 0.0)
+
+    # one-hot basin-to-region matrix, with a last, all-basins column
+    member = ny.zeros((codes.size, nregions + 1))
+    inregion = codes >= 0
+    member[ny.nonzero(inregion)[0], codes[inregion]] = 1.0
+    member[:, nregions] = 1.0
+
+    with ny.errstate(divide='ignore', invalid='ignore'):
+        return (wf @ member) / (wv @ member)
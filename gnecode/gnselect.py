@@ -0,0 +1,323 @@
+""" gnselect.py
+Global NEWS 2 model, GNE implementation.
+This module implements basin selection by attribute query, vars.cfg
+[MODELRUN] basins option. The query is a boolean expression on the
+attribute columns of the BasinID source table (STN30v6ngNEWS.csv), eg:
+    basins = continent == 'Africa' and area > 10000
+    basins = ocean in ('Atlantic Ocean', 'Arctic Ocean') and not basinorder < 3
+Supported: field names, numbers and quoted strings; comparisons
+(==, !=, <, <=, >, >=, chained comparisons), in / not in a list or tuple
+of constants, and, or, not, and parentheses. Nothing else is evaluated.
+Numeric fields are compared as numpy arrays; text fields are compared
+through a categorical index (sorted labels plus int32 codes), stored in
+the table cache (see gntblio.py) and reused on later runs.
+
+AVAILABILITY, USE RESTRICTIONS, AND CONTACT INFORMATION
+-------------------------------------------------------
+The Global NEWS 2 model ("NEWS 2") and the Global NEWS modeling Environment (GNE)
+were developed by the Global NEWS group and are available at our web site:
+http://www.marine.rutgers.edu/globalnews/
+We encourage its use for research and educational (non-commercial) purposes, but
+we request that active users contact us to inform about how it is being applied.
+Such feedback and reporting will improve our continued development of the model code.
+Global NEWS is a work group of UNESCO's Intergovernmental Oceanographic Commission (IOC).
+
+Use of NEWS 2 should be ackwnowledged by citing Mayorga et al (in review);
+Beusen et al. (2009) and Billen and Garnier (2007) should also be cited if
+the DSi model and the ICEP index, respectively, are also used.
+
+For questions and additional information, please contact:
+Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
+Applied Physics Laboratory, University of Washington
+Seattle, WA  USA
+---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: Added basin_attr_codes(), basin region codes for regional aggregates.
+10/18/2026: Created.
+"""
+
+
+import os.path
+import ast
+import operator
+import numpy as ny
+from gncfg import *
+import gntblio
+
+__version__ = '$Revision: 2026-10-18$'
+
+
+# comparison operators allowed in basin queries
+QUERY_CMPOPS = {ast.Eq:operator.eq, ast.NotEq:operator.ne, \
+                ast.Lt:operator.lt, ast.LtE:operator.le, \
+                ast.Gt:operator.gt, ast.GtE:operator.ge}
+
+# operator to use when the operands of a comparison are swapped
+QUERY_CMPOPS_SWAP = {ast.Eq:ast.Eq, ast.NotEq:ast.NotEq, \
+                     ast.Lt:ast.Gt, ast.LtE:ast.GtE, \
+                     ast.Gt:ast.Lt, ast.GtE:ast.LtE}
+
+
+def _query_error(querystr, msg):
+    print("  !!! Basin query '%s': %s !!!\n" % (querystr, msg))
+    raise ValueError(querystr)
+
+
+def parse_basin_query(querystr):
+    """ Parse and validate basin query string querystr.
+    Return (tree, fldnames): the parsed expression and the list of field names used.
+    """
+    try:
+        tree = ast.parse(querystr.strip(), mode='eval')
+    except SyntaxError:
+        _query_error(querystr, "invalid syntax")
+
+    fldnames = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id not in fldnames:
+                fldnames.append(node.id)
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or \
+               not isinstance(node.value, (int, float, str)):
+                _query_error(querystr, "constant %r not supported" % (node.value,))
+        elif isinstance(node, ast.Compare):
+            for op in node.ops:
+                if type(op) not in QUERY_CMPOPS and not isinstance(op, (ast.In, ast.NotIn)):
+                    _query_error(querystr, "operator %s not supported" % type(op).__name__)
+        elif isinstance(node, ast.UnaryOp):
+            # not, or the sign of a number
+            if not isinstance(node.op, ast.Not) and not (isinstance(node.op, ast.USub) \
+               and isinstance(node.operand, ast.Constant) \
+               and isinstance(node.operand.value, (int, float))):
+                _query_error(querystr, "unary operator %s not supported" % type(node.op).__name__)
+        elif not isinstance(node, (ast.Expression, ast.BoolOp, ast.Tuple, ast.List, \
+                                   ast.boolop, ast.cmpop, ast.unaryop, ast.expr_context)):
+            _query_error(querystr, "%s not supported" % type(node).__name__)
+
+    return tree, fldnames
+
+
+def read_attr_columns(filepath, fldnames, tblformat='csv'):
+    """ Read attribute fields fldnames from a basin table, in table row order.
+    Numeric fields are returned as numpy arrays (int32 if all values are
+    integers, otherwise float64); text fields as categorical dictionaries,
+    {'labels': sorted unique values, 'codes': int32 index into labels}.
+    For csv tables, parsed columns and categorical indices are kept
+    in the table cache.
+    Return attrs_d[fldname].
+    """
+    attrs_d = {}
+    if tblformat == 'columnar':
+        schema = gntblio.read_columnar_schema(filepath)
+        dtypes_d = dict((col['name'], ny.dtype(col['dtype'])) for col in schema['columns'])
+        _check_attr_fldnames(filepath, list(dtypes_d.keys()), fldnames)
+        for fld in fldnames:
+            if dtypes_d[fld].kind in 'iuf':
+                fldtype = 'int' if dtypes_d[fld].kind in 'iu' else 'double'
+                attrs_d[fld] = gntblio.read_columnar_columns(filepath, [fld], [fldtype])[fld]
+            else:
+                attrs_d[fld] = categorical_index(_read_columnar_text(filepath, schema, fld))
+        return attrs_d
+
+    entry = gntblio.tbl_cache_entry(filepath)
+    fld_names = gntblio.tbl_cache_load_header(entry)
+    rows = None
+    if fld_names is None:
+        fld_names, rows = gntblio.read_csv_rows(filepath)
+        gntblio.tbl_cache_save_header(entry, fld_names)
+    _check_attr_fldnames(filepath, fld_names, fldnames)
+
+    for fld in fldnames:
+        for fldtype in ('int', 'double'):
+            attrs_d[fld] = gntblio.tbl_cache_load_column(entry, fld, fldtype)
+            if attrs_d[fld] is not None:
+                break
+        if attrs_d[fld] is None:
+            codes = gntblio.tbl_cache_load_column(entry, fld, 'catcodes')
+            labels = gntblio.tbl_cache_load_column(entry, fld, 'catlabels')
+            if codes is not None and labels is not None:
+                attrs_d[fld] = {'labels':labels, 'codes':codes}
+        if attrs_d[fld] is not None:
+            continue
+
+        if rows is None:
+            fld_names, rows = gntblio.read_csv_rows(filepath)
+        fldidx = fld_names.index(fld)
+        for fldtype in ('int', 'double'):
+            try:
+                attrs_d[fld] = gntblio.parse_csv_column(rows, fldidx, fldtype)
+                gntblio.tbl_cache_save_column(entry, fld, fldtype, attrs_d[fld])
+                break
+            except (ValueError, OverflowError):
+                pass
+        if attrs_d[fld] is None:
+            attrs_d[fld] = categorical_index([row[fldidx] for row in rows])
+            gntblio.tbl_cache_save_column(entry, fld, 'catcodes', attrs_d[fld]['codes'])
+            gntblio.tbl_cache_save_column(entry, fld, 'catlabels', attrs_d[fld]['labels'])
+
+    return attrs_d
+
+
+def _check_attr_fldnames(tblname, fld_names, fldnames):
+    for fld in fldnames:
+        if fld not in fld_names:
+            print("  !!! Basin query field %s not found in table %s !!!" % (fld, tblname))
+            print("      Available fields: %s\n" % ','.join(fld_names))
+            raise KeyError(fld)
+
+
+def _read_columnar_text(dirpath, schema, fld):
+    col = [col for col in schema['columns'] if col['name'] == fld][0]
+    if schema['nrows'] == 0:
+        return ny.zeros(0, dtype=col['dtype'])
+    return ny.memmap(os.path.join(dirpath, col['file']), dtype=col['dtype'], \
+                     mode='r', shape=(schema['nrows'],))
+
+
+def categorical_index(values):
+    """ Categorical index of the text values: sorted unique labels and
+    the int32 code (label index) of each value. Because labels are sorted,
+    comparisons of values against a string map to comparisons of codes.
+    """
+    labels, codes = ny.unique(ny.asarray(values, dtype=str), return_inverse=True)
+    return {'labels':labels, 'codes':codes.astype('int32').ravel()}
+
+
+def _eval_node(node, attrs_d, querystr):
+    """ Evaluate a (validated) query expression node. Return a boolean array,
+    a numeric array, a categorical dictionary or a constant (or list of constants).
+    """
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body, attrs_d, querystr)
+    elif isinstance(node, ast.Name):
+        return attrs_d[node.id]
+    elif isinstance(node, ast.Constant):
+        return node.value
+    elif isinstance(node, (ast.Tuple, ast.List)):
+        vals = [_eval_node(elt, attrs_d, querystr) for elt in node.elts]
+        if not all(isinstance(val, (int, float, str)) for val in vals):
+            _query_error(querystr, "lists may only hold constants")
+        return vals
+    elif isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, ast.USub):
+            return -node.operand.value
+        return ~_as_mask(_eval_node(node.operand, attrs_d, querystr), querystr)
+    elif isinstance(node, ast.BoolOp):
+        masks = [_as_mask(_eval_node(val, attrs_d, querystr), querystr) for val in node.values]
+        combine = ny.logical_and if isinstance(node.op, ast.And) else ny.logical_or
+        mask = masks[0]
+        for m in masks[1:]:
+            mask = combine(mask, m)
+        return mask
+    elif isinstance(node, ast.Compare):
+        # chained comparisons: a < b < c is (a < b) and (b < c)
+        left = _eval_node(node.left, attrs_d, querystr)
+        mask = None
+        for op, rnode in zip(node.ops, node.comparators):
+            right = _eval_node(rnode, attrs_d, querystr)
+            m = _compare(op, left, right, querystr)
+            mask = m if mask is None else ny.logical_and(mask, m)
+            left = right
+        return mask
+
+
+def _as_mask(val, querystr):
+    if not (isinstance(val, ny.ndarray) and val.dtype == bool):
+        _query_error(querystr, "and, or, not need comparisons as operands")
+    return val
+
+
+def _compare(op, left, right, querystr):
+    """ Compare two operands: field (numeric or categorical) against field
+    or constant, or numeric/categorical field in (or not in) a constant list.
+    """
+    if isinstance(op, (ast.In, ast.NotIn)):
+        if not isinstance(right, list) or isinstance(left, (list, int, float, str)):
+            _query_error(querystr, "in / not in need a field and a list of constants")
+        if isinstance(left, dict):
+            vals = [v for v in right if isinstance(v, str)]
+            if len(vals) < len(right):
+                _query_error(querystr, "text field compared to a number")
+            codes = [_label_code(left['labels'], v) for v in vals]
+            mask = ny.isin(left['codes'], [c for c in codes if c is not None])
+        else:
+            if any(isinstance(v, str) for v in right):
+                _query_error(querystr, "numeric field compared to a text value")
+            mask = ny.isin(left, right)
+        return ~mask if isinstance(op, ast.NotIn) else mask
+
+    if isinstance(left, list) or isinstance(right, list):
+        _query_error(querystr, "lists can only be used with in / not in")
+
+    optype = type(op)
+    # put the categorical field (if any) on the left side
+    if isinstance(right, dict) and not isinstance(left, dict):
+        left, right, optype = right, left, QUERY_CMPOPS_SWAP[optype]
+
+    if isinstance(left, dict):
+        if not isinstance(right, str):
+            _query_error(querystr, "text fields can only be compared to text values")
+        # labels are sorted, so label order is code order
+        labels, codes = left['labels'], left['codes']
+        if optype in (ast.Eq, ast.NotEq):
+            code = _label_code(labels, right)
+            mask = codes == code if code is not None else ny.zeros(codes.shape, dtype=bool)
+            return ~mask if optype == ast.NotEq else mask
+        elif optype == ast.Lt:
+            return codes < ny.searchsorted(labels, right, 'left')
+        elif optype == ast.LtE:
+            return codes < ny.searchsorted(labels, right, 'right')
+        elif optype == ast.Gt:
+            return codes >= ny.searchsorted(labels, right, 'right')
+        else:
+            return codes >= ny.searchsorted(labels, right, 'left')
+
+    if isinstance(left, str) or isinstance(right, str):
+        _query_error(querystr, "numeric field compared to a text value")
+    if not (isinstance(left, ny.ndarray) or isinstance(right, ny.ndarray)):
+        _query_error(querystr, "comparison without a field")
+    return ny.asarray(QUERY_CMPOPS[optype](left, right), dtype=bool)
+
+
+def _label_code(labels, value):
+    """ Code of value in the sorted categorical labels, or None if absent """
+    idx = int(ny.searchsorted(labels, value))
+    if idx < labels.size and labels[idx] == value:
+        return idx
+    return None
+
+
+def basin_attr_codes(filepath, fldname, idfldname, basinids, tblformat='csv'):
+    """ Categorical codes of attribute field fldname of basin table filepath
+    (eg, continent), aligned to the master basin ID array basinids by the
+    table basin ID field idfldname. Numeric fields are indexed by value.
+    Return (codes, labels); codes are -1 for basins missing from the table.
+    """
+    attrs_d = read_attr_columns(filepath, [fldname], tblformat)
+    tblids = gntblio.read_tbl_columns(filepath, [idfldname], ['int'], None, tblformat)[idfldname]
+    attr = attrs_d[fldname]
+    if not isinstance(attr, dict):
+        labels, codes = ny.unique(attr, return_inverse=True)
+        attr = {'labels':labels, 'codes':codes.ravel()}
+
+    tblrow, missing = gntblio.join_basin_rows(gntblio.basin_join_index(basinids), \
+                                              tblids, filepath)
+    codes = attr['codes'] if tblrow is None else attr['codes'][tblrow]
+    if missing is not None:
+        codes = ny.where(missing, -1, codes)
+
+    return ny.asarray(codes).ravel(), attr['labels']
+
+
+def select_basin_rows(filepath, querystr, tblformat='csv'):
+    """ Evaluate basin query querystr (see above) on the attribute fields
+    of basin table filepath. Return the sorted integer positions of the
+    selected table rows.
+    """
+    tree, fldnames = parse_basin_query(querystr)
+    attrs_d = read_attr_columns(filepath, fldnames, tblformat)
+    mask = _as_mask(_eval_node(tree, attrs_d, querystr), querystr)
+
+    return ny.flatnonzero(mask)
@@ -0,0 +1,239 @@
+""" gnstate.py
+Global NEWS 2 model, GNE implementation.
+This module implements the persistent model run-state store used by
+incremental runs (globalnews.py --incremental option). A run state records,
+for each model unit (a dissolved nutrient form, the particulate forms, the
+'All-Forms' model), the signature of everything its results depend on:
+content hashes of its input columns and constants, the basin set and the
+model code version. The unit outputs (OUT variables) are stored alongside,
+with content hashes of each output, in one npz archive per unit.
+On the next run, only the units whose signature changed are recomputed;
+the outputs of the other units are reloaded from the store.
+It also holds the content-addressed result cache of whole model runs
+(run_cache_lookup(), run_cache_store()): each entry holds the OUT variables
+of a run, keyed by the hash of its resolved configuration, input column
+contents and model code version, with size-bounded LRU eviction.
+
+State directory layout:
+    <statedir>/state.json      units[unit] = {'sig', 'file', 'outhashes'}
+                               'writesig', outfiles[table path] = path_hash()
+                               of the output tables last written
+    <statedir>/<unit>.npz      unit OUT variables (plus '__labels__<var>' code tables)
+Result cache layout:
+    <cachedir>/<key>/out.npz   run OUT variables (same npz layout)
+    <cachedir>/<key>/accuracy.npz  accuracy report columns of a reduced precision run
+
+AVAILABILITY, USE RESTRICTIONS, AND CONTACT INFORMATION
+-------------------------------------------------------
+The Global NEWS 2 model ("NEWS 2") and the Global NEWS modeling Environment (GNE)
+were developed by the Global NEWS group and are available at our web site:
+http://www.marine.rutgers.edu/globalnews/
+We encourage its use for research and educational (non-commercial) purposes, but
+we request that active users contact us to inform about how it is being applied.
+Such feedback and reporting will improve our continued development of the model code.
+Global NEWS is a work group of UNESCO's Intergovernmental Oceanographic Commission (IOC).
+
+Use of NEWS 2 should be ackwnowledged by citing Mayorga et al (in review);
+Beusen et al. (2009) and Billen and Garnier (2007) should also be cited if
+the DSi model and the ICEP index, respectively, are also used.
+
+For questions and additional information, please contact:
+Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
+Applied Physics Laboratory, University of Washington
+Seattle, WA  USA
+---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: Result cache temporary entries are named by process and thread.
+10/18/2026: The result cache stores the accuracy report of reduced precision runs.
+10/18/2026: Added path_hash(), to record the contents of the written output tables.
+10/18/2026: Added the whole-run result cache (run_cache_lookup(), run_cache_store()).
+10/18/2026: Created.
+"""
+
+
+import os, os.path
+import shutil
+import threading
+import json
+import hashlib
+import numpy as ny
+from gncfg import *
+import gntblio
+
+__version__ = '$Revision: 2026-10-18$'
+
+STATE_FILE = "state.json"
+LABELS_PREFIX = "__labels__"
+RUN_CACHE_FILE = "out.npz"
+REPORT_CACHE_FILE = "accuracy.npz"
+REPORT_COLUMNS = ['variable', 'max_abs_error', 'max_rel_error', 'n_nonfinite_diff']
+
+
+def array_hash(arr):
+    """ Content hash (sha1 hex digest) of a numpy array: dtype, shape and data """
+    arr = ny.ascontiguousarray(arr)
+    h = hashlib.sha1(("%s%s" % (arr.dtype.str, arr.shape)).encode())
+    h.update(arr.view('uint8').data if arr.dtype.kind != 'O' else repr(arr.tolist()).encode())
+    return h.hexdigest()
+
+
+def value_hash(value):
+    """ Content hash of a constant: a numpy array, or a python scalar (by repr) """
+    if isinstance(value, ny.ndarray):
+        return array_hash(value)
+    return hashlib.sha1(repr(value).encode()).hexdigest()
+
+
+def signature(parts):
+    """ Hash of a json-serializable structure of hashes and settings """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def code_hash(filepaths):
+    """ Hash of the contents of the model code files (the model code version) """
+    h = hashlib.sha1()
+    for filepath in filepaths:
+        fp = open(filepath, "rb")
+        h.update(fp.read())
+        fp.close()
+    return h.hexdigest()
+
+
+def path_hash(filepath):
+    """ Content hash of an output table: a file, or a folder of files (eg, a
+    columnar table), read in blocks. None if filepath does not exist.
+    """
+    if os.path.isdir(filepath):
+        filepaths = [os.path.join(filepath, name) for name in sorted(os.listdir(filepath))]
+    elif os.path.exists(filepath):
+        filepaths = [filepath]
+    else:
+        return None
+    h = hashlib.sha1()
+    for fpath in filepaths:
+        h.update(os.path.basename(fpath).encode())
+        fp = open(fpath, "rb")
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            h.update(block)
+        fp.close()
+    return h.hexdigest()
+
+
+def state_dir(basedir, key):
+    """ Return the state directory for key (eg, the output table paths) under basedir """
+    return os.path.join(basedir, signature(key)[:16])
+
+
+def load_state(statedir):
+    """ Load the run state of statedir; an empty state if there is none """
+    statepath = os.path.join(statedir, STATE_FILE)
+    if not os.path.exists(statepath):
+        return {'units':{}}
+    fp = open(statepath, "r")
+    state = json.load(fp)
+    fp.close()
+    return state
+
+
+def save_state(statedir, state):
+    os.makedirs(statedir, exist_ok=True)
+    gntblio.write_json_atomic(os.path.join(statedir, STATE_FILE), state)
+
+
+def load_unit(statedir, state, unit, sig):
+    """ Return the stored (out_d, codes_d) of unit if its signature is sig,
+    otherwise (or if the stored outputs are missing) None.
+    """
+    entry = state['units'].get(unit)
+    if entry is None or entry['sig'] != sig:
+        return None
+    filepath = os.path.join(statedir, entry['file'])
+    if not os.path.exists(filepath):
+        return None
+
+    return read_out_npz(filepath)
+
+
+def save_unit(statedir, state, unit, sig, out_d, codes_d):
+    """ Store the outputs of unit (computed with signature sig) and record them
+    in state. Return the list of output variables whose contents changed since
+    the previously stored outputs of unit (all of them, if there were none).
+    """
+    os.makedirs(statedir, exist_ok=True)
+    entry = state['units'].get(unit, {})
+    oldhashes = entry.get('outhashes', {})
+    outhashes = dict((var, array_hash(out_d[var])) for var in out_d)
+
+    filename = unit + ".npz"
+    write_out_npz(os.path.join(statedir, filename), out_d, codes_d)
+    state['units'][unit] = {'sig':sig, 'file':filename, 'outhashes':outhashes}
+
+    return [var for var in out_d if oldhashes.get(var) != outhashes[var]]
+
+
+def write_out_npz(filepath, out_d, codes_d):
+    """ Write OUT variables (out_d) and their code tables (codes_d, see OUTCODES) to an npz archive """
+    arrays = dict(out_d)
+    for var in codes_d:
+        arrays[LABELS_PREFIX + var] = codes_d[var]
+    gntblio.write_npz_columns(filepath, list(arrays.keys()), list(arrays.values()))
+
+
+def read_out_npz(filepath):
+    """ Read the (out_d, codes_d) stored with write_out_npz() """
+    out_d, codes_d = {}, {}
+    npz = ny.load(filepath)
+    for var in npz.files:
+        if var.startswith(LABELS_PREFIX):
+            codes_d[var[len(LABELS_PREFIX):]] = npz[var]
+        else:
+            out_d[var] = npz[var]
+    npz.close()
+    return out_d, codes_d
+
+
+# =====================================================================
+# WHOLE-RUN RESULT CACHE
+
+def run_cache_lookup(cachedir, key):
+    """ Return the cached (out_d, codes_d, report) of the run with hash key, or None.
+    report is the accuracy report (varnames, columns) of a reduced precision run
+    (see globalnews.accuracy_report()), or None if the entry has none.
+    A hit refreshes the last use time of the entry (for the LRU eviction).
+    """
+    entry = os.path.join(cachedir, key)
+    filepath = os.path.join(entry, RUN_CACHE_FILE)
+    if not os.path.exists(filepath):
+        return None
+    os.utime(entry, None)
+    out_d, codes_d = read_out_npz(filepath)
+
+    report = None
+    fpath_report = os.path.join(entry, REPORT_CACHE_FILE)
+    if os.path.exists(fpath_report):
+        with ny.load(fpath_report) as npz:
+            report = (list(npz[REPORT_COLUMNS[0]]), [npz[col] for col in REPORT_COLUMNS[1:]])
+    return out_d, codes_d, report
+
+
+def run_cache_store(cachedir, key, out_d, codes_d, maxmb, report=None):
+    """ Store the results of the run with hash key (and its accuracy report, if
+    any), then evict the least recently used entries until the cache is within
+    maxmb. The entry is written to a temporary folder first, so that a
+    concurrent run (process or thread) never reads it half written.
+    """
+    entry = os.path.join(cachedir, key)
+    tmpentry = "%s.%d.%d.tmp" % (entry, os.getpid(), threading.get_ident())
+    os.makedirs(tmpentry, exist_ok=True)
+    write_out_npz(os.path.join(tmpentry, RUN_CACHE_FILE), out_d, codes_d)
+    if report is not None:
+        varnames, columns = report
+        gntblio.write_npz_columns(os.path.join(tmpentry, REPORT_CACHE_FILE), REPORT_COLUMNS, \
+                                  [ny.array(varnames)] + list(columns))
+    try:
+        os.replace(tmpentry, entry)
+    except OSError:
+        # another run stored the same entry first
+        shutil.rmtree(tmpentry, ignore_errors=True)
+    gntblio.evict_cache(cachedir, maxmb, keep=(entry,))
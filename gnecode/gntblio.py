@@ -0,0 +1,680 @@
+""" gntblio.py
+Global NEWS 2 model, GNE implementation.
+This module implements the low-level table input/output functionality
+(csv parsing of basin input tables into numpy arrays) used by
+load_var_arrays() in gncore.py and globalnews.py.
+
+AVAILABILITY, USE RESTRICTIONS, AND CONTACT INFORMATION
+-------------------------------------------------------
+The Global NEWS 2 model ("NEWS 2") and the Global NEWS modeling Environment (GNE)
+were developed by the Global NEWS group and are available at our web site:
+http://www.marine.rutgers.edu/globalnews/
+We encourage its use for research and educational (non-commercial) purposes, but
+we request that active users contact us to inform about how it is being applied.
+Such feedback and reporting will improve our continued development of the model code.
+Global NEWS is a work group of UNESCO's Intergovernmental Oceanographic Commission (IOC).
+
+Use of NEWS 2 should be ackwnowledged by citing Mayorga et al (in review);
+Beusen et al. (2009) and Billen and Garnier (2007) should also be cited if
+the DSi model and the ICEP index, respectively, are also used.
+
+For questions and additional information, please contact:
+Emilio Mayorga, Ph.D.          mayorga@apl.washington.edu
+Applied Physics Laboratory, University of Washington
+Seattle, WA  USA
+---------------------------------------
+RECENT MODIFICATION HISTORY
+
+10/18/2026: Columnar output tables keep integer-coded fields as codes, with their labels in the schema.
+10/18/2026: write_csv_columns() writes float32 columns with their shortest float32 representation.
+10/18/2026: read_tbls_columns() worker threads run in the caller's run context (gnrun.py).
+10/18/2026: Added binary output table formats, npz and columnar (write_tbl_columns()).
+10/18/2026: Added write_csv_columns(), a streaming output table writer that formats
+the ordered output columns in chunks of basins (see write_var_arrays()).
+10/18/2026: Added the 'columnar' input table source format: a directory of fixed-dtype
+column files plus a json schema, opened with numpy.memmap (zero-copy), and
+pack_csv_table(), the csv to columnar table converter.
+10/18/2026: Input tables are joined to the master BasinID array by basin ID, through
+a sorted join index (argsort + searchsorted), instead of assuming that every
+table lists the basins in the BasinID table order. Tables may have a different
+row order and basin coverage; missing basins are filled with TblNoData (gncfg.py),
+and missing and duplicate basin ID's are reported.
+10/18/2026: Added read_tbls_columns(), to read and parse several input tables
+concurrently with a bounded pool of threads (overlapping the I/O latency of
+network-mounted input folders). Table cache index updates are thread-safe.
+10/18/2026: Added the binary columnar cache for input tables. Parsed, typed columns
+are stored as .npy files under FPathTblCache (gncfg.py), in one entry per table
+keyed by the sha1 hash of the file contents, and are reloaded memory-mapped
+(copy-on-write) on later runs. The cache size is capped (TblCacheMaxMB) by
+evicting the least recently used entries.
+10/18/2026: Created. Column-indexed csv table reader: field indices are
+extracted once from the header row, each requested field is parsed in a
+single typed pass into a preallocated numpy array, and basin sub-setting
+is applied as a vectorized mask instead of a per-row set test.
+"""
+
+
+import os, os.path
+import csv
+import json
+import hashlib
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from urllib.parse import quote
+import numpy as ny
+from gncfg import *
+import gnrun
+
+__version__ = '$Revision: 2026-10-18$'
+
+
+# numpy dtypes and python parsers corresponding to vars.cfg field types
+FLDTYPE_DTYPE = {'double':'float64', 'int':'int32'}
+FLDTYPE_PARSE = {'double':float, 'int':int}
+
+# list of expected basin id field names in input tables
+ID_FLDNAMES = ('basinid', 'BASINID')
+
+# Table cache layout version; cached entries from other versions are never reused
+TBLCACHE_VERSION = 1
+
+# Serializes table cache index updates among table-reading threads
+_tblcache_lock = threading.Lock()
+
+
+def basinid_fldname(fld_names):
+    """ Return the basin id field name found in the header list fld_names,
+    or None if the table does not have a valid basin ID column name.
+    """
+    for fld in ID_FLDNAMES:
+        if fld in fld_names:
+            return fld
+    return None
+
+
+def read_csv_rows(filepath):
+    """ Read a csv table, opening the file once.
+    Return (fld_names, rows): the header row and the list of data rows.
+    """
+    fp = open(filepath, "r", newline='')
+    csvreader = csv.reader(fp)
+    fld_names = next(csvreader)
+    rows = list(csvreader)
+    fp.close()
+
+    return fld_names, rows
+
+
+def parse_csv_column(rows, fldidx, fldtype):
+    """ Parse column fldidx of the csv rows in a single typed pass
+    into a preallocated numpy array.
+    """
+    return ny.fromiter(map(FLDTYPE_PARSE[fldtype], map(itemgetter(fldidx), rows)), \
+                       dtype=FLDTYPE_DTYPE[fldtype], count=len(rows))
+
+
+def read_csv_columns(filepath, fldnames, fldtypes, joinidx=None):
+    """ Read the requested fields (columns) from a basin csv table.
+    fldnames: list of field names; fldtypes: matching list of 'double' or 'int'.
+    If joinidx (see basin_join_index()) is not None, table rows are aligned
+    to the master BasinID order by basin ID: rows whose basin ID is not in
+    the master BasinID array are dropped, and master basins missing from
+    the table are filled with TblNoData (see join_basin_rows()).
+    Columns are taken from the table cache when available; the csv file
+    is read (at most once) only for the columns that are not cached.
+    Return coldata_d[fldname] numpy arrays.
+    """
+
+    entry = tbl_cache_entry(filepath)
+    fld_names = tbl_cache_load_header(entry)
+    rows = None
+    if fld_names is None:
+        fld_names, rows = read_csv_rows(filepath)
+        tbl_cache_save_header(entry, fld_names)
+
+    readflds, readtypes, id_fld = _tbl_readflds(filepath, fld_names, fldnames, \
+                                                fldtypes, joinidx)
+
+    coldata_d = {}
+    for fld, fldtype in zip(readflds, readtypes):
+        coldata_d[fld] = tbl_cache_load_column(entry, fld, fldtype)
+        if coldata_d[fld] is None:
+            if rows is None:
+                fld_names, rows = read_csv_rows(filepath)
+            coldata_d[fld] = parse_csv_column(rows, fld_names.index(fld), fldtype)
+            tbl_cache_save_column(entry, fld, fldtype, coldata_d[fld])
+
+    return _tbl_join_columns(filepath, coldata_d, fldnames, id_fld, joinidx)
+
+
+def read_tbl_columns(filepath, fldnames, fldtypes, joinidx=None, tblformat='csv'):
+    """ Read the requested fields from a basin input table of source format
+    tblformat ('csv' or 'columnar'; see read_csv_columns() and
+    read_columnar_columns()). Return coldata_d[fldname] numpy arrays.
+    """
+    if tblformat == 'columnar':
+        return read_columnar_columns(filepath, fldnames, fldtypes, joinidx)
+    else:
+        return read_csv_columns(filepath, fldnames, fldtypes, joinidx)
+
+
+def _tbl_readflds(tblname, fld_names, fldnames, fldtypes, joinidx):
+    """ Check that the requested fields are found in the table field names
+    fld_names, adding the basin id field if the table is to be joined.
+    Return (readflds, readtypes, id_fld).
+    """
+    readflds, readtypes, id_fld = list(fldnames), list(fldtypes), None
+    if joinidx is not None:
+        id_fld = basinid_fldname(fld_names)
+        if id_fld is None:
+            print("  !!! Input table does not have a valid basin ID column name !!!\n")
+            raise KeyError(ID_FLDNAMES)
+        if id_fld not in readflds:
+            readflds.append(id_fld)
+            readtypes.append('int')
+
+    missing = [fld for fld in readflds if fld not in fld_names]
+    if missing:
+        print("  !!! Input table %s does not have the requested field(s): %s !!!\n" \
+              % (tblname, ','.join(missing)))
+        raise KeyError(missing)
+
+    return readflds, readtypes, id_fld
+
+
+def _tbl_join_columns(tblname, coldata_d, fldnames, id_fld, joinidx):
+    """ Basin sub-setting and alignment of table columns to the
+    master BasinID order (see join_basin_rows()).
+    """
+    if joinidx is not None:
+        tblrow, missing = join_basin_rows(joinidx, coldata_d[id_fld], tblname)
+        if tblrow is not None:
+            for fld in fldnames:
+                coldata_d[fld] = coldata_d[fld][tblrow]
+                if missing is not None:
+                    coldata_d[fld][missing] = TblNoData
+
+    return dict((fld, coldata_d[fld]) for fld in fldnames)
+
+
+# =====================================================================
+# OUTPUT TABLES
+
+# Number of basin rows formatted and written out at a time by write_csv_columns()
+WRITE_CHUNK_ROWS = 8192
+
+
+def _csv_quote(values):
+    """ Quote string values holding csv delimiters or quotes, as csv.writer does.
+    """
+    return [('"' + v.replace('"', '""') + '"') if (',' in v or '"' in v or \
+            '\n' in v or '\r' in v) else v for v in values]
+
+
+def write_csv_columns(filepath, fldnames, columns, chunkrows=WRITE_CHUNK_ROWS):
+    """ Write equal-length numpy arrays (columns) to csv table filepath,
+    with header fldnames, streaming the table out in chunks of chunkrows basins.
+    Within a chunk, each column is converted to python values in one call
+    (ndarray.tolist()) and formatted column-wise, then rows are joined;
+    floats are written with their shortest exact representation, as
+    csv.writer does (for float32 columns, the shortest float32 representation).
+    Byte-string (label) columns are written as text.
+    """
+    nrows = len(columns[0]) if columns else 0
+    isstr = [col.dtype.kind in ('S', 'U') or col.dtype == ny.float32 for col in columns]
+
+    fp = open(filepath, "w", newline='')
+    csv.writer(fp).writerow(fldnames)
+    for r0 in range(0, nrows, chunkrows):
+        chunk = []
+        for col, colisstr in zip(columns, isstr):
+            if colisstr:
+                chunk.append(_csv_quote(col[r0:r0+chunkrows].astype(str).tolist()))
+            else:
+                chunk.append(list(map(str, col[r0:r0+chunkrows].tolist())))
+        fp.write("\r\n".join(map(",".join, zip(*chunk))) + "\r\n")
+    fp.close()
+
+
+def write_npz_columns(filepath, fldnames, columns):
+    """ Write equal-length numpy arrays (columns) to an (uncompressed) numpy
+    .npz archive, one array per field, keeping dtypes and the field order.
+    Load with: tbl = numpy.load(filepath); tbl.files; tbl[fldname]
+    """
+    # open the file explicitly, so that numpy doesn't append a .npz extension
+    fp = open(filepath, "wb")
+    ny.savez(fp, **dict(list(zip(fldnames, columns))))
+    fp.close()
+
+
+def write_tbl_columns(filepath, fldnames, columns, tblformat='csv', codetables=None):
+    """ Write an output table in format tblformat: 'csv', 'npz' or 'columnar'
+    (see write_csv_columns(), write_npz_columns() and write_columnar_columns()).
+    codetables (columnar only): label arrays of the integer-coded fields.
+    """
+    if tblformat == 'npz':
+        write_npz_columns(filepath, fldnames, columns)
+    elif tblformat == 'columnar':
+        write_columnar_columns(filepath, fldnames, columns, codetables=codetables)
+    else:
+        write_csv_columns(filepath, fldnames, columns)
+
+
+# =====================================================================
+# MEMORY-MAPPED COLUMNAR TABLES
+# A columnar table is a directory holding one raw binary file per field
+# (fixed numpy dtype, explicit byte order) plus a json schema file:
+# {"format": "gne-columnar", "version": 1, "nrows": n,
+#  "columns": [{"name": fldname, "dtype": "<f8", "file": "fldname.bin"}, ...]}
+
+COLUMNAR_SCHEMA = "schema.json"
+COLUMNAR_VERSION = 1
+
+
+def read_columnar_schema(dirpath):
+    fp = open(os.path.join(dirpath, COLUMNAR_SCHEMA), "r")
+    schema = json.load(fp)
+    fp.close()
+    if schema.get('format') != 'gne-columnar' or schema.get('version') != COLUMNAR_VERSION:
+        print("  !!! %s is not a version %d gne-columnar table !!!\n" % (dirpath, COLUMNAR_VERSION))
+        raise ValueError(dirpath)
+
+    return schema
+
+
+def read_columnar_columns(dirpath, fldnames, fldtypes, joinidx=None):
+    """ Read the requested fields from a columnar table directory (see above).
+    Columns are opened with numpy.memmap in copy-on-write mode, so that
+    data_d[varname] is a zero-copy view of the file (unless the table must
+    be re-ordered by basin ID, or the stored dtype differs from fldtype).
+    Otherwise, same as read_csv_columns().
+    """
+    schema = read_columnar_schema(dirpath)
+    cols_d = dict((col['name'], col) for col in schema['columns'])
+    readflds, readtypes, id_fld = _tbl_readflds(dirpath, [col['name'] for col in \
+                                    schema['columns']], fldnames, fldtypes, joinidx)
+
+    coldata_d = {}
+    for fld, fldtype in zip(readflds, readtypes):
+        col = cols_d[fld]
+        colpath = os.path.join(dirpath, col['file'])
+        if schema['nrows'] > 0:
+            coldata = ny.memmap(colpath, dtype=col['dtype'], mode='c', shape=(schema['nrows'],))
+        else:
+            coldata = ny.zeros(0, dtype=col['dtype'])
+        if coldata.dtype != ny.dtype(FLDTYPE_DTYPE[fldtype]):
+            coldata = coldata.astype(FLDTYPE_DTYPE[fldtype])
+        coldata_d[fld] = coldata
+
+    return _tbl_join_columns(dirpath, coldata_d, fldnames, id_fld, joinidx)
+
+
+def pack_csv_table(csvpath, dirpath, fldtypes_d={}):
+    """ Convert csv table csvpath into a columnar table directory dirpath.
+    Every field is stored: with the type in fldtypes_d[fldname] ('double' or 'int')
+    if given, otherwise as int32 if all its values are integers, float64 if all
+    are numbers, or as a fixed-width unicode string field.
+    Return the number of rows written.
+    """
+    fld_names, rows = read_csv_rows(csvpath)
+
+    columns = []
+    for fldidx, fld in enumerate(fld_names):
+        coldata = None
+        for fldtype in ([fldtypes_d[fld]] if fld in fldtypes_d else ['int', 'double']):
+            try:
+                coldata = parse_csv_column(rows, fldidx, fldtype)
+                break
+            except (ValueError, OverflowError):
+                pass
+        if coldata is None:
+            coldata = ny.array([row[fldidx] for row in rows], dtype=str)
+        columns.append(coldata)
+
+    write_columnar_columns(dirpath, fld_names, columns, os.path.basename(csvpath))
+
+    return len(rows)
+
+
+def write_columnar_columns(dirpath, fldnames, columns, source=None, codetables=None):
+    """ Write equal-length numpy arrays (columns) to columnar table directory
+    dirpath (see above), one file per field, with fldnames as field names.
+    The code tables of integer-coded (categorical) fields, codetables[fldname],
+    are stored in the schema column entries as 'labels' (label = labels[code]).
+    """
+    os.makedirs(dirpath, exist_ok=True)
+
+    schemacols = []
+    for fld, coldata in zip(fldnames, columns):
+        # explicit byte order, so that the files are portable
+        coldata = ny.asarray(coldata)
+        coldata = coldata.astype(coldata.dtype.newbyteorder('<'))
+        colfile = quote(fld, safe='') + ".bin"
+        coldata.tofile(os.path.join(dirpath, colfile))
+        schemacols.append({'name':fld, 'dtype':coldata.dtype.str, 'file':colfile})
+        if codetables and fld in codetables:
+            schemacols[-1]['labels'] = ny.asarray(codetables[fld]).astype(str).tolist()
+
+    schema = {'format':'gne-columnar', 'version':COLUMNAR_VERSION, \
+              'nrows':len(columns[0]) if columns else 0, 'columns':schemacols}
+    if source:
+        schema['source'] = source
+    write_json_atomic(os.path.join(dirpath, COLUMNAR_SCHEMA), schema)
+
+
+def basin_join_index(basinids):
+    """ Build the sorted join index for the master basin ID array
+    (IN['BasinID']), used to align every input table to the master basin order.
+    Built once per run, in O(n log n).
+    """
+    order = ny.argsort(basinids, kind='stable')
+    sortedids = basinids[order]
+
+    dupids = ny.unique(sortedids[1:][sortedids[1:] == sortedids[:-1]])
+    if dupids.size:
+        print("  !!! BasinID table has %d duplicate basin ID's: %s !!!" \
+              % (dupids.size, _idlst_str(dupids)))
+
+    # Position of the (first) sorted entry for each master basin
+    sortedpos = ny.searchsorted(sortedids, basinids)
+
+    return {'basinids':basinids, 'sortedids':sortedids, 'sortedpos':sortedpos}
+
+
+def join_basin_rows(joinidx, tblids, tblname=''):
+    """ Map the rows of an input table, with basin ID's tblids, onto the master
+    basin ID order of joinidx (see basin_join_index()).
+    Return (tblrow, missing): tblrow[i] is the table row for master basin i,
+    and missing is the boolean mask of master basins not found in the table
+    (None if there are none). tblrow is None when the table already lists
+    exactly the master basins, in the same order.
+    If a basin ID is repeated in the table, its first row is used.
+    Missing and duplicate basin ID's are reported.
+    """
+    basinids, sortedids = joinidx['basinids'], joinidx['sortedids']
+    nbasins = basinids.size
+
+    if ny.array_equal(tblids, basinids):
+        return None, None
+
+    # Locate table basin ID's in the sorted master index
+    tpos = ny.searchsorted(sortedids, tblids)
+    found = tpos < nbasins
+    found[found] = sortedids[tpos[found]] == tblids[found]
+
+    # First table row for each matched basin
+    upos, first = ny.unique(tpos[found], return_index=True)
+    rows = ny.nonzero(found)[0][first]
+    ndup = ny.count_nonzero(found) - upos.size
+    if ndup:
+        dupids = ny.unique(tblids[found][ny.setdiff1d(ny.arange(found.sum()), first)])
+        print("  !!! Table %s: %d duplicate basin ID rows ignored: %s !!!" \
+              % (tblname, ndup, _idlst_str(dupids)))
+
+    rowof = ny.full(nbasins, -1, dtype=ny.intp)
+    rowof[upos] = rows
+    tblrow = rowof[joinidx['sortedpos']]
+
+    missing = tblrow < 0
+    if missing.any():
+        print("  !!! Table %s: %d basin ID's missing, filled with %s: %s !!!" \
+              % (tblname, ny.count_nonzero(missing), TblNoData, \
+                 _idlst_str(basinids[missing])))
+        tblrow[missing] = 0
+    else:
+        missing = None
+
+    return tblrow, missing
+
+
+def _idlst_str(ids, maxids=10):
+    idlst = [str(i) for i in ids[:maxids]]
+    if len(ids) > maxids:
+        idlst.append('...')
+    return ','.join(idlst)
+
+
+def read_tbls_columns(tbljobs, basinids=None, workers=1):
+    """ Read the requested fields from several basin csv tables, in parallel
+    using a pool of (at most) workers threads; workers=1 reads them serially.
+    tbljobs: list of (filepath, fldnames, fldtypes, tblformat) tuples.
+    If basinids is not None, every table is aligned to the basinids
+    order through a single basin join index (see read_csv_columns()).
+    Return the list of coldata_d dictionaries (see read_csv_columns()),
+    in the same (deterministic) order as tbljobs.
+    """
+
+    joinidx = basin_join_index(basinids) if basinids is not None else None
+    readtbl = lambda job: read_tbl_columns(job[0], job[1], job[2], joinidx, job[3])
+    if workers > 1 and len(tbljobs) > 1:
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(tbljobs)))
+        coldata_lst = list(gnrun.context_map(pool, readtbl, tbljobs))
+        pool.shutdown()
+    else:
+        coldata_lst = [readtbl(job) for job in tbljobs]
+
+    # Enforce the cache size cap once all tables are loaded
+    if tbl_cache_enabled():
+        evict_cache(FPathTblCache, TblCacheMaxMB)
+
+    return coldata_lst
+
+
+# =====================================================================
+# BINARY COLUMNAR TABLE CACHE
+
+def tbl_cache_enabled():
+    """ The table cache is used unless FPathTblCache is None
+    or it was disabled at run time (FLAGS['TblCache'] = False).
+    """
+    return FPathTblCache is not None and FLAGS.get('TblCache', True)
+
+
+def file_sha1(filepath):
+    """ Return the sha1 hex digest of the contents of file filepath.
+    """
+    sha = hashlib.sha1()
+    fp = open(filepath, "rb")
+    for block in iter(lambda: fp.read(1 << 20), b''):
+        sha.update(block)
+    fp.close()
+
+    return sha.hexdigest()
+
+
+def write_json_atomic(filepath, obj):
+    """ Write obj to a json file via a temporary file, so that
+    concurrent model runs never read a partially written file.
+    """
+    tmppath = "%s.%d.%d.tmp" % (filepath, os.getpid(), threading.get_ident())
+    fp = open(tmppath, "w")
+    json.dump(obj, fp, indent=1, sort_keys=True)
+    fp.close()
+    os.replace(tmppath, filepath)
+
+
+def tbl_cache_entry(filepath):
+    """ Return the cache entry directory for table filepath, or None if the
+    table cache is disabled. The entry is keyed by the content hash of the file.
+    The cache index, FPathTblCache/index.json, records the file size, modification
+    time and content hash of every table seen, so that unchanged files are
+    not re-hashed on every run.
+    """
+    if not tbl_cache_enabled():
+        return None
+
+    os.makedirs(FPathTblCache, exist_ok=True)
+    indexpath = os.path.join(FPathTblCache, "index.json")
+
+    abspath = os.path.abspath(filepath)
+    st = os.stat(filepath)
+    stamp = [st.st_size, st.st_mtime_ns]
+    with _tblcache_lock:
+        index = _tbl_cache_read_index(indexpath)
+    if abspath in index and index[abspath][:2] == stamp:
+        sha1 = index[abspath][2]
+    else:
+        # hash outside of the lock, so that tables are hashed concurrently
+        sha1 = file_sha1(filepath)
+        with _tblcache_lock:
+            index = _tbl_cache_read_index(indexpath)
+            index[abspath] = stamp + [sha1]
+            write_json_atomic(indexpath, index)
+
+    entry = os.path.join(FPathTblCache, "%s.v%d" % (sha1, TBLCACHE_VERSION))
+    if not os.path.isdir(entry):
+        os.makedirs(entry, exist_ok=True)
+    else:
+        # mark entry as recently used, for LRU eviction
+        os.utime(entry, None)
+    if FLAGS.get('verbose'): print("  table cache entry for %s: %s" % (filepath, entry))
+
+    return entry
+
+
+def _tbl_cache_read_index(indexpath):
+    try:
+        fp = open(indexpath, "r")
+        index = json.load(fp)
+        fp.close()
+    except (IOError, ValueError):
+        index = {}
+
+    return index
+
+
+def tbl_cache_load_header(entry):
+    """ Return the cached header (field names) list, or None.
+    """
+    if entry is None or not os.path.exists(os.path.join(entry, "header.json")):
+        return None
+    fp = open(os.path.join(entry, "header.json"), "r")
+    fld_names = json.load(fp)
+    fp.close()
+
+    return fld_names
+
+
+def tbl_cache_save_header(entry, fld_names):
+    if entry is not None:
+        write_json_atomic(os.path.join(entry, "header.json"), fld_names)
+
+
+def _tbl_cache_colpath(entry, fld, fldtype):
+    return os.path.join(entry, "%s.%s.npy" % (quote(fld, safe=''), fldtype))
+
+
+def tbl_cache_load_column(entry, fld, fldtype):
+    """ Return the cached column as a zero-copy, memory-mapped array, or None.
+    Copy-on-write mode is used: in-place changes made by model code
+    stay in memory and never reach the cache file.
+    """
+    if entry is None:
+        return None
+    colpath = _tbl_cache_colpath(entry, fld, fldtype)
+    if not os.path.exists(colpath):
+        return None
+
+    try:
+        return ny.load(colpath, mmap_mode='c')
+    except ValueError:
+        # zero-length columns can't be memory-mapped
+        return ny.load(colpath)
+
+
+def tbl_cache_save_column(entry, fld, fldtype, coldata):
+    if entry is None:
+        return
+    colpath = _tbl_cache_colpath(entry, fld, fldtype)
+    tmppath = "%s.%d.%d.tmp" % (colpath, os.getpid(), threading.get_ident())
+    fp = open(tmppath, "wb")
+    ny.save(fp, coldata)
+    fp.close()
+    os.replace(tmppath, colpath)
+
+
+def evict_cache(cachedir, maxmb, keep=()):
+    """ Enforce a size cap (in MB) on a cache directory made of entry
+    sub-directories, removing the least recently used entries first.
+    Entries listed in keep are never removed.
+    """
+    if cachedir is None or maxmb is None or not os.path.isdir(cachedir):
+        return
+
+    entries = []
+    for name in os.listdir(cachedir):
+        path = os.path.join(cachedir, name)
+        if os.path.isdir(path):
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+
+    totalsize = sum(size for mtime, size, path in entries)
+    for mtime, size, path in sorted(entries):
+        if totalsize <= maxmb * 1024 * 1024:
+            break
+        if path not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+            totalsize -= size
+            if FLAGS.get('verbose'): print("  cache entry evicted: %s" % path)
+
+
+def clear_cache(cachedir):
+    """ Remove all entries (invalidate) a cache directory.
+    """
+    if cachedir is not None and os.path.isdir(cachedir):
+        shutil.rmtree(cachedir)
+
+
+def _read_csv_columns_rowwise(filepath, fldnames, fldtypes, basinids):
+    """ Legacy (pre 10/18/2026) row-by-row loader, kept for benchmarking only.
+    """
+    setBasinID = set(basinids)
+    coldata_d = dict((fld, ny.array([], dtype=FLDTYPE_DTYPE[fldtype])) \
+                     for fld, fldtype in zip(fldnames, fldtypes))
+    fldtype_d = dict(list(zip(fldnames, fldtypes)))
+
+    fp = open(filepath, "r")
+    fld_names = next(csv.reader(fp))
+    fp.close()
+    id_fld = basinid_fldname(fld_names)
+
+    fp = open(filepath, "r")
+    for row in csv.DictReader(fp):
+        for fld,v in list(row.items()):
+            if int(row[id_fld]) in setBasinID and fld in list(fldtype_d.keys()):
+                coldata_d[fld] = ny.r_[coldata_d[fld], FLDTYPE_PARSE[fldtype_d[fld]](v)]
+    fp.close()
+
+    return coldata_d
+
+
+if __name__ == '__main__':
+    # Benchmark of the column-indexed loader against the legacy row-wise loader.
+    # Usage: python gntblio.py table.csv [fldname1 fldname2 ...]
+    # Without field names, all fields other than the basin ID are read as 'double'.
+    import sys, time
+
+    FLAGS['verbose'] = False
+    FLAGS['TblCache'] = False
+    filepath = sys.argv[1]
+    fld_names = read_csv_rows(filepath)[0]
+    id_fld = basinid_fldname(fld_names)
+    fldnames = sys.argv[2:] or [fld for fld in fld_names if fld != id_fld]
+    fldtypes = ['double'] * len(fldnames)
+
+    # use every other basin id, to exercise basin sub-setting
+    basinids = read_csv_columns(filepath, [id_fld], ['int'])[id_fld][::2]
+
+    t0 = time.time()
+    new_d = read_csv_columns(filepath, fldnames, fldtypes, basin_join_index(basinids))
+    t1 = time.time()
+    old_d = _read_csv_columns_rowwise(filepath, fldnames, fldtypes, basinids)
+    t2 = time.time()
+
+    identical = all(ny.array_equal(new_d[fld], old_d[fld]) for fld in fldnames)
+    print("%s: %d fields, %d basins" % (filepath, len(fldnames), basinids.size))
+    print("  column-indexed: %8.3f s" % (t1 - t0))
+    print("  legacy rowwise: %8.3f s" % (t2 - t1))
+    print("  identical results: %s" % identical)
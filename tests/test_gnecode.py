@@ -0,0 +1,262 @@
+""" test_gnecode.py
+Global NEWS 2 model, GNE implementation.
+Tests of the gnecode modules that have closed-form or brute-force answers:
+the tiled, basin-to-cell index (CSR) zonal statistics of the GIS pre-processor
+(gngis2tbls.py, gnraster.py), the DBF reader and writer (dbf.py), and the
+Sobol and Morris sensitivity estimators (gnsa.py).
+Run from the repository folder with:  python -m pytest tests
+"""
+
+import os, os.path
+import sys
+import io
+import datetime
+import numpy as ny
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'gnecode'))
+
+import gnraster
+import gngis2tbls
+import dbf
+import gnsa
+
+
+NODATA = -9999.0
+
+
+# =====================================================================
+# ZONAL STATISTICS
+
+def write_asc(filepath, grid):
+    """ Write grid (NaN cells as NODATA) as an ESRI ASCII grid """
+    fp = open(filepath, "w")
+    fp.write("ncols %d\nnrows %d\n" % (grid.shape[1], grid.shape[0]))
+    fp.write("xllcorner 0.0\nyllcorner 0.0\ncellsize 1.0\nNODATA_value %r\n" % NODATA)
+    for row in ny.where(ny.isnan(grid), NODATA, grid):
+        fp.write(" ".join(["%r" % float(v) for v in row]) + "\n")
+    fp.close()
+
+
+def write_flt(filepath, grid, byteorder='LSBFIRST'):
+    """ Write grid (NaN cells as NODATA) as an ESRI .flt grid and its .hdr header """
+    fp = open(os.path.splitext(filepath)[0] + ".hdr", "w")
+    fp.write("ncols %d\nnrows %d\n" % (grid.shape[1], grid.shape[0]))
+    fp.write("xllcorner 0.0\nyllcorner 0.0\ncellsize 1.0\nNODATA_value %r\n" % NODATA)
+    fp.write("byteorder %s\n" % byteorder)
+    fp.close()
+    dtype = {'LSBFIRST':'<f4', 'MSBFIRST':'>f4'}[byteorder]
+    ny.where(ny.isnan(grid), NODATA, grid).astype(dtype).tofile(filepath)
+
+
+def random_grid(rng, shape, lo, hi, nodatafrac, integers=False):
+    """ Random float32-exact grid of values in [lo, hi), with NaN (NoData) cells """
+    if integers:
+        grid = rng.integers(lo, hi, size=shape).astype('float64')
+    else:
+        grid = ny.round(rng.uniform(lo, hi, size=shape) * 8) / 8
+    grid[rng.random(shape) < nodatafrac] = ny.nan
+    return grid
+
+
+@pytest.fixture
+def grids(tmp_path, monkeypatch):
+    """ A zone grid (.asc) and weighting and value grids (big-endian .flt,
+    little-endian .flt and .asc), all with NoData cells; returns the grid
+    paths and the arrays.
+    """
+    monkeypatch.setattr(gngis2tbls, 'FPathZoneIndex', str(tmp_path / "zoneidx"))
+    monkeypatch.setattr(gnraster, 'FPathGridCache', str(tmp_path / "grids"))
+    rng = ny.random.default_rng(7)
+    shape = (9, 13)
+    arrays = {'zone':random_grid(rng, shape, 1, 7, 0.15, integers=True), \
+              'area':random_grid(rng, shape, 0.5, 4.0, 0.1), \
+              'frac':random_grid(rng, shape, 0.0, 1.0, 0.05), \
+              'v1':random_grid(rng, shape, -5.0, 20.0, 0.1), \
+              'v2':random_grid(rng, shape, 0.0, 100.0, 0.2)}
+    paths = dict((name, str(tmp_path / name)) for name in arrays)
+    write_asc(paths['zone'] + ".asc", arrays['zone'])
+    write_flt(paths['area'] + ".flt", arrays['area'], 'MSBFIRST')
+    write_flt(paths['frac'] + ".flt", arrays['frac'])
+    write_flt(paths['v1'] + ".flt", arrays['v1'], 'MSBFIRST')
+    write_asc(paths['v2'] + ".asc", arrays['v2'])
+    return paths, arrays
+
+
+def naive_stats(zone, weights, values):
+    """ Zonal count, sum and mean of values * product(weights) over the cells
+    where the zone, weights and values all have data, by bincount.
+    """
+    product = values.copy()
+    for w in weights:
+        product = product * w
+    ok = ~ny.isnan(zone) & ~ny.isnan(product)
+    zones = zone[ok].astype('int64')
+    ids = ny.unique(zones)
+    count = ny.bincount(zones, minlength=ids.max() + 1)[ids]
+    total = ny.bincount(zones, weights=product[ok], minlength=ids.max() + 1)[ids]
+    return ids, count, total
+
+
+@pytest.mark.parametrize("tilecells", [5, 13, 40, 10**6])
+def test_zonal_stats_match_bincount(grids, monkeypatch, tilecells):
+    # 5 cells: tiles smaller than a row (13 cells) hold a single row
+    monkeypatch.setattr(gnraster, 'GridTileCells', tilecells)
+    paths, arrays = grids
+    index = gngis2tbls.BasinCellIndex(paths['zone'])
+    shape = tuple(index['shape'])
+    stats_d = gngis2tbls.ZonalStats(index, [paths['area'], paths['frac']], \
+                                    [('v1', paths['v1']), ('v2', paths['v2'])], shape)
+
+    for var in ('v1', 'v2'):
+        ids, count, total = naive_stats(arrays['zone'], [arrays['area'], arrays['frac']], arrays[var])
+        assert ny.array_equal(stats_d[var]['ID'], ids)
+        assert ny.array_equal(stats_d[var]['count'], count)
+        assert ny.allclose(stats_d[var]['sum'], total, rtol=1e-12, atol=1e-12)
+        assert ny.allclose(stats_d[var]['mean'], total / count, rtol=1e-12, atol=1e-12)
+
+
+def test_basin_cell_index_is_reused(grids):
+    paths, arrays = grids
+    index = gngis2tbls.BasinCellIndex(paths['zone'])
+    stored = gngis2tbls.BasinCellIndex(paths['zone'])
+    for key in index:
+        assert ny.array_equal(index[key], stored[key])
+    # every data cell of the zone grid, once, under its zone
+    zone = arrays['zone'].ravel()
+    assert index['cells'].size == ny.count_nonzero(~ny.isnan(zone))
+    for i, ID in enumerate(index['ID']):
+        cells = index['cells'][index['offsets'][i]:index['offsets'][i + 1]]
+        assert ny.all(ny.diff(cells) > 0)
+        assert ny.all(zone[cells] == ID)
+
+
+def test_big_endian_flt_values(grids):
+    paths, arrays = grids
+    grid, nodata = gnraster.open_grid(paths['area'])
+    window, valid = gnraster.read_window(grid, nodata, 0, grid.shape[0])
+    assert ny.array_equal(valid, ~ny.isnan(arrays['area']))
+    assert ny.array_equal(window[valid], arrays['area'][valid])
+
+
+# =====================================================================
+# DBF TABLES
+
+FIELDNAMES = ['BASINID', 'AREA', 'FRAC', 'NAME', 'DATE', 'FLAG']
+FIELDSPECS = [('N', 8, 0), ('N', 12, 3), ('F', 10, 4), ('C', 12, 0), ('D', 8, 0), ('L', 1, 0)]
+RECORDS = [[1, 1234.5, 0.25, 'Amazon', datetime.date(2010, 1, 18), 'T'], \
+           [22, -0.125, 1.0, 'Rhine', datetime.date(1999, 12, 31), 'F'], \
+           [333, 0.0, -0.0625, '', datetime.date(2026, 10, 18), '?']]
+
+
+def test_dbf_records_round_trip():
+    f = io.BytesIO()
+    dbf.dbfwriter(f, FIELDNAMES, FIELDSPECS, RECORDS)
+    f.seek(0)
+    rows = list(dbf.dbfreader(f))
+    assert rows[0] == FIELDNAMES
+    assert rows[1] == FIELDSPECS
+    assert rows[2:] == RECORDS
+
+
+def test_dbf_columns_round_trip():
+    columns = [ny.array([1, 22, 333]), ny.array([1234.5, -0.125, 0.0]), \
+               ny.array([0.25, 1.0, -0.0625]), ny.array(['Amazon', 'Rhine', '']), \
+               ny.array(['2010-01-18', '1999-12-31', '2026-10-18'], dtype='datetime64[D]'), \
+               ny.array(['T', 'F', '?'])]
+    f = io.BytesIO()
+    dbf.dbfwriter_columns(f, FIELDNAMES, FIELDSPECS, columns)
+    f.seek(0)
+    names, specs, readcols = dbf.dbfreader_columns(f, ['FLAG', 'AREA', 'BASINID'])
+    assert names == ['FLAG', 'AREA', 'BASINID']
+    assert specs == [FIELDSPECS[5], FIELDSPECS[1], FIELDSPECS[0]]
+    assert readcols[2].dtype.kind == 'i' and ny.array_equal(readcols[2], columns[0])
+    assert readcols[1].dtype.kind == 'f' and ny.array_equal(readcols[1], columns[1])
+    assert ny.array_equal(readcols[0], columns[5])
+
+    f.seek(0)
+    names, specs, readcols = dbf.dbfreader_columns(f)
+    for col, readcol in zip(columns, readcols):
+        assert ny.array_equal(readcol, col)
+
+
+def test_dbf_deleted_records_are_skipped():
+    f = io.BytesIO()
+    dbf.dbfwriter(f, FIELDNAMES, FIELDSPECS, RECORDS)
+    data = bytearray(f.getvalue())
+    lenheader = len(FIELDSPECS) * 32 + 33
+    lenrecord = sum(size for typ, size, deci in FIELDSPECS) + 1
+    data[lenheader + lenrecord] = ord('*')
+    rows = list(dbf.dbfreader(io.BytesIO(bytes(data))))
+    assert rows[2:] == [RECORDS[0], RECORDS[2]]
+
+
+# =====================================================================
+# SENSITIVITY ESTIMATORS
+
+def ishigami(x, a=7.0, b=0.1):
+    """ Ishigami function of the (n, 3) samples x, in [-pi, pi] """
+    return ny.sin(x[:, 0]) + a * ny.sin(x[:, 1]) ** 2 + b * x[:, 2] ** 4 * ny.sin(x[:, 0])
+
+
+def ishigami_indices(a=7.0, b=0.1):
+    """ Analytic first-order and total Sobol indices of ishigami() """
+    V1 = 0.5 * (1 + b * ny.pi ** 4 / 5) ** 2
+    V2 = a ** 2 / 8
+    V13 = b ** 2 * ny.pi ** 8 * (1.0 / 18 - 1.0 / 50)
+    V = V1 + V2 + V13
+    return ny.array([V1, V2, 0.0]) / V, ny.array([V1 + V13, V2, V13]) / V
+
+
+def test_sobol_ishigami():
+    rng = ny.random.default_rng(1)
+    nfactors, lo, hi = 3, -ny.pi, ny.pi
+    acc = gnsa.sobol_init(nfactors, (1,))
+    # streamed in chunks, as in runsensitivity()
+    for chunk in range(8):
+        unit = gnsa.sobol_chunk(rng, 4096, nfactors)
+        f = ishigami(gnsa.scale_unit(unit, [lo] * 3, [hi] * 3))
+        gnsa.sobol_update(acc, f.reshape(-1, 1))
+    S, ST = gnsa.sobol_indices(acc)
+    S_exact, ST_exact = ishigami_indices()
+    assert acc['n'] == 2 * 8 * 4096
+    assert ny.allclose(S[:, 0], S_exact, atol=0.03)
+    assert ny.allclose(ST[:, 0], ST_exact, atol=0.03)
+
+
+def test_sobol_product_of_two_uniforms():
+    # f = x1 * x2, x uniform in [0, 1]: V = 7/144, V1 = V2 = 3/144, VT1 = VT2 = 4/144
+    rng = ny.random.default_rng(2)
+    acc = gnsa.sobol_init(2, (1,))
+    unit = gnsa.sobol_chunk(rng, 50000, 2)
+    gnsa.sobol_update(acc, (unit[:, 0] * unit[:, 1]).reshape(-1, 1))
+    S, ST = gnsa.sobol_indices(acc)
+    assert ny.allclose(S[:, 0], 3.0 / 7, atol=0.02)
+    assert ny.allclose(ST[:, 0], 4.0 / 7, atol=0.02)
+
+
+def test_sobol_constant_output_is_nan():
+    rng = ny.random.default_rng(3)
+    acc = gnsa.sobol_init(2, (2,))
+    unit = gnsa.sobol_chunk(rng, 16, 2)
+    gnsa.sobol_update(acc, ny.column_stack((unit[:, 0], ny.ones(unit.shape[0]))))
+    S, ST = gnsa.sobol_indices(acc)
+    assert ny.all(ny.isnan(S[:, 1])) and ny.all(ny.isnan(ST[:, 1]))
+    assert ny.all(ny.isfinite(S[:, 0]))
+
+
+def test_morris_linear_function():
+    # elementary effects of a linear function are its coefficients (per unit change)
+    rng = ny.random.default_rng(4)
+    coefs = ny.array([[2.0, -3.0, 0.0, 0.5], [1.0, 1.0, 1.0, 1.0]])
+    acc = gnsa.morris_init(4, (2,))
+    for chunk in range(3):
+        unit, design = gnsa.morris_chunk(rng, 10, 4, levels=4)
+        assert unit.min() >= 0.0 and unit.max() <= 1.0
+        gnsa.morris_update(acc, unit.dot(coefs.T), design)
+    mu, mustar, sigma = gnsa.morris_indices(acc)
+    assert acc['n'] == 30
+    assert ny.allclose(mu, coefs.T)
+    assert ny.allclose(mustar, ny.abs(coefs.T))
+    # sigma is the square root of a roundoff-sized variance
+    assert ny.allclose(sigma, 0.0, atol=1e-6)